@@ -1,26 +1,49 @@
 # app/agent_service.py
+import asyncio
 import json
+import os
 import re # MỚI: Import thư viện regex
+import time
+from dataclasses import dataclass, field
 from typing import AsyncGenerator, List
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import ScoredPoint
-from sentence_transformers import SentenceTransformer
-from sentence_transformers.cross_encoder import CrossEncoder
-from langchain_community.chat_models.ollama import ChatOllama
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.http.models import Record, ScoredPoint
+import numpy as np
 import structlog
 
 # MỚI: Import module tools
-from . import tools
+from . import metrics, tools
+from .bm25 import BM25IndexFile, reciprocal_rank_fusion
+from .coalescing import StreamCoalescer, SubscriberLaggedError, coalescing_key
+from .context_assembler import ContextAssembler
+from .inference import InferenceExecutor, MicroBatcher
+from .llm_scheduler import LLMOverloadedError, LLMScheduler
+from .model_backends import CROSS_ENCODER_BACKEND, EMBEDDING_BACKEND, load_cross_encoder, load_embedding_model
+from .qdrant_profiles import get_profile
+from .reranking import AdaptiveReranker
+from .router import ADDRESS_PATTERN, RouteDecision, TieredRouter
+from .semantic_cache import SemanticAnswerCache, split_for_replay
+from .streaming import ErrorEvent, StatusEvent
 
 # --- CẤU HÌNH ---
-LLM_MODEL_NAME = "llama3:8b-instruct-q4_K_M"
-EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+LLM_MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3:8b-instruct-q4_K_M")
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 COLLECTION_NAME = "blockchain_knowledge"
-CROSS_ENCODER_MODEL_NAME = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+CROSS_ENCODER_MODEL_NAME = os.getenv("CROSS_ENCODER_MODEL", 'cross-encoder/ms-marco-MiniLM-L-6-v2')
 RETRIEVAL_CANDIDATE_COUNT = 10
 FINAL_CONTEXT_COUNT = 3
+# "dense": chỉ tìm kiếm vector trong Qdrant. "hybrid": thêm chỉ mục BM25 (khớp chính xác tên hợp đồng,
+# ticker, mã anomaly...) và gộp hai danh sách ứng viên bằng reciprocal-rank fusion trước khi re-rank.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").lower()
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Chạy truy vấn KB song song với router (speculative). Bật theo từng môi trường triển khai.
+SPECULATIVE_KB_RETRIEVAL = os.getenv("SPECULATIVE_KB_RETRIEVAL", "false").lower() == "true"
+
+# Ngữ cảnh trả về khi KB không có tài liệu phù hợp (KB rỗng hoặc chưa ingest xong). Câu trả lời dựa trên chúng
+# không được lưu vào semantic cache, nếu không cache sẽ phát lại "không tìm thấy" cho tới lần ingest sau.
+KB_NO_RESULTS = "Không tìm thấy tài liệu nào trong cơ sở tri thức cho truy vấn này."
+KB_NO_RELEVANT_RESULTS = "Không tìm thấy tài liệu liên quan sau khi xếp hạng lại."
 
 logger = structlog.get_logger(__name__)
 
@@ -74,27 +97,71 @@ def _extract_address(query: str) -> str | None:
     """
     Một helper đơn giản để trích xuất địa chỉ Ethereum bằng regex.
     """
-    match = re.search(r'(0x[a-fA-F0-9]{40})', query)
+    match = ADDRESS_PATTERN.search(query)
     if match:
         return match.group(1)
     return None
 
+@dataclass
+class _SpeculativeRetrieval:
+    """Một lần truy vấn KB được khởi chạy trước khi router ra quyết định."""
+    question: str
+    task: asyncio.Task
+    started_at: float = field(default_factory=time.perf_counter)
+    used: bool = False
+
 class AgentService:
-    def __init__(self, qdrant_client: QdrantClient):
+    @staticmethod
+    def preload():
+        """
+        Phần khởi tạo nặng và đồng bộ: import langchain/sentence_transformers và nạp hai mô hình vào cache của
+        model_backends. Gọi trong thread (lifespan) hoặc ở tiến trình cha trước khi fork worker (app/serve.py);
+        __init__ sau đó chỉ lấy lại các mô hình đã nạp.
+        """
+        import langchain_community.chat_models.ollama  # noqa: F401
+        import langchain_core.output_parsers  # noqa: F401
+        import langchain_core.prompts  # noqa: F401
+
+        load_embedding_model(EMBEDDING_MODEL_NAME)
+        load_cross_encoder(CROSS_ENCODER_MODEL_NAME)
+
+    def __init__(self, qdrant_client: AsyncQdrantClient, inference_executor: InferenceExecutor | None = None):
+        # Import muộn: giữ `import app.main` nhẹ để server mở cổng (và /health) ngay, trước khi nạp xong mô hình.
+        from langchain_community.chat_models.ollama import ChatOllama
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
+
         logger.info("Initializing AgentService...")
         self.qdrant_client = qdrant_client
+        # Profile của collection (QDRANT_COLLECTION_PROFILE, phải trùng với profile lúc ingest).
+        self.collection_profile = get_profile()
+        self.search_params = self.collection_profile.search_params()
+        # Embedding và re-ranking chạy trong executor riêng để không chặn event loop.
+        self.inference_executor = inference_executor or InferenceExecutor()
         
         logger.info("Loading models...", 
                     embedding_model=EMBEDDING_MODEL_NAME, 
-                    cross_encoder_model=CROSS_ENCODER_MODEL_NAME)
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-        self.cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL_NAME)
+                    cross_encoder_model=CROSS_ENCODER_MODEL_NAME,
+                    embedding_backend=EMBEDDING_BACKEND,
+                    cross_encoder_backend=CROSS_ENCODER_BACKEND)
+        self.embedding_model = load_embedding_model(EMBEDDING_MODEL_NAME)
+        self.cross_encoder = load_cross_encoder(CROSS_ENCODER_MODEL_NAME)
+
+        # Gom các lời gọi encode/predict từ nhiều request đồng thời thành một lần forward.
+        self.embedding_batcher = MicroBatcher(
+            "embedding", self._encode_batch, self.inference_executor
+        )
+        self.rerank_batcher = MicroBatcher(
+            "rerank", self._predict_batch, self.inference_executor, item_size=len
+        )
         
         self.llm = ChatOllama(
-            base_url="http://host.docker.internal:11434",
+            base_url=OLLAMA_BASE_URL,
             model=LLM_MODEL_NAME,
             temperature=0.1
         )
+        # Giới hạn số lời gọi đồng thời tới Ollama; router được ưu tiên hơn tổng hợp câu trả lời.
+        self.llm_scheduler = LLMScheduler()
         
         # THAY ĐỔI: Sử dụng prompt router mới và mạnh mẽ hơn
         self.router_prompt_template = ChatPromptTemplate.from_template(ROUTER_PROMPT)
@@ -117,57 +184,199 @@ TRẢ LỜI:"""
         
         self.router_chain = self.router_prompt_template | self.llm | StrOutputParser()
         self.synthesizer_chain = self.synthesizer_prompt_template | self.llm | StrOutputParser()
+
+        # Router nhiều tầng: chỉ gọi LLM router khi luật và embedding đều không đủ tự tin.
+        self.router = TieredRouter(encode=self.embedding_batcher.submit)
+
+        # Cache câu trả lời theo ngữ nghĩa cho các câu hỏi diễn đạt lại.
+        self.semantic_cache = SemanticAnswerCache(
+            dimension=self.embedding_model.get_sentence_embedding_dimension()
+        )
+
+        # Chỉ mục BM25 do scripts/ingest_data.py xây; tự nạp lại khi file thay đổi.
+        # Nếu chưa có file chỉ mục, truy xuất hybrid tự động quay về dense.
+        self.bm25_index = BM25IndexFile() if RETRIEVAL_MODE == "hybrid" else None
+
+        # Re-rank thích ứng (bỏ qua / thu nhỏ khi điểm dense đã rõ ràng) + cache điểm cross-encoder.
+        self.reranker = AdaptiveReranker(final_count=FINAL_CONTEXT_COUNT)
+
+        # Ghép ngữ cảnh trong ngân sách token theo công cụ (khử trùng lặp chunk, cắt theo độ liên quan).
+        self.context_assembler = ContextAssembler()
+
+        # Gộp các câu hỏi giống hệt nhau đang được xử lý đồng thời (ví dụ: nhiều người cùng hỏi về một địa chỉ khi có cảnh báo).
+        self.coalescer = StreamCoalescer()
+
+        self.speculative_kb_enabled = SPECULATIVE_KB_RETRIEVAL
+        self._speculation_stats = {"started": 0, "hits": 0, "misses": 0, "wasted_retrieval_seconds": 0.0}
         
         logger.info("AgentService initialized successfully.")
 
-    def _rerank_documents(self, question: str, documents: List[ScoredPoint]) -> List[str]:
+    async def warm_up(self):
+        """
+        Chạy một lần suy luận giả cho mỗi mô hình (khởi tạo thread pool của PyTorch, cấp phát bộ nhớ đệm),
+        để request đầu tiên không phải chịu chi phí này. Chạy trong từng worker, không ở tiến trình cha:
+        thread pool OpenMP không an toàn khi fork.
+        """
+        started_at = time.perf_counter()
+        await self.inference_executor.run(self._encode_batch, ["warm-up"])
+        await self.inference_executor.run(self._predict_batch, [[["warm-up", "warm-up"]]])
+        logger.info("Models warmed up", duration_ms=round((time.perf_counter() - started_at) * 1000, 1))
+
+    def _encode_batch(self, texts: List[str]) -> list:
+        """Encode một lô câu hỏi trong một lần forward. Chạy trong InferenceExecutor."""
+        return list(self.embedding_model.encode(texts, batch_size=len(texts)))
+
+    def _predict_batch(self, jobs: List[List[List[str]]]) -> List[List[float]]:
+        """Chấm điểm các cặp (câu hỏi, tài liệu) của nhiều request trong một lần forward, rồi tách lại theo request."""
+        flat_pairs = [pair for pairs in jobs for pair in pairs]
+        flat_scores = self.cross_encoder.predict(flat_pairs, batch_size=len(flat_pairs))
+        results, offset = [], 0
+        for pairs in jobs:
+            results.append([float(s) for s in flat_scores[offset:offset + len(pairs)]])
+            offset += len(pairs)
+        return results
+
+    def get_stats(self) -> dict:
+        """Thống kê vận hành của các thành phần nội bộ."""
+        speculation = dict(self._speculation_stats)
+        resolved = speculation["hits"] + speculation["misses"]
+        speculation["hit_rate"] = (speculation["hits"] / resolved) if resolved else 0.0
+        speculation["enabled"] = self.speculative_kb_enabled
+        return {
+            "embedding_batcher": self.embedding_batcher.stats(),
+            "rerank_batcher": self.rerank_batcher.stats(),
+            "speculation": speculation,
+            "semantic_cache": self.semantic_cache.stats(),
+            "reranker": self.reranker.stats(),
+            "llm_scheduler": self.llm_scheduler.stats(),
+            "coalescing": self.coalescer.stats(),
+        }
+
+    async def _rerank_documents(self, question: str, documents: List[ScoredPoint | Record]) -> List[str]:
         if not documents: return []
         valid_documents = [doc for doc in documents if doc.payload is not None and isinstance(doc.payload, dict) and 'content' in doc.payload and doc.payload['content'] is not None]
         if not valid_documents:
             return []
-        pairs = [[question, doc.payload['content']] for doc in valid_documents]
 
-        if not pairs:
-            return []
+        plan = self.reranker.plan(valid_documents)
+        scores = self.reranker.cached_scores(question, [doc.id for doc in plan.to_score])
+        uncached = [doc for doc in plan.to_score if doc.id not in scores]
+        if uncached:
+            pairs = [[question, doc.payload['content']] for doc in uncached]
+            new_scores = dict(zip((doc.id for doc in uncached), await self.rerank_batcher.submit(pairs)))
+            self.reranker.store_scores(question, new_scores)
+            scores.update(new_scores)
+        if plan.decision != "full":
+            logger.info("Adaptive rerank", decision=plan.decision, scored=len(plan.to_score),
+                        cached=len(plan.to_score) - len(uncached), candidates=len(valid_documents))
 
-        scores = self.cross_encoder.predict(pairs)
-        scores = [float(s) for s in scores]
-        reranked_docs_with_scores = sorted(
-            zip(valid_documents, scores), key=lambda x: x[1], reverse=True
-        )
-        return [doc.payload['content'] for doc, score in reranked_docs_with_scores]
+        reranked_docs = sorted(plan.to_score, key=lambda doc: scores[doc.id], reverse=True)
+        return [doc.payload['content'] for doc in reranked_docs + plan.tail]
 
-    def _get_context_from_kb(self, question: str) -> str:
+    async def _get_context_from_kb(self, question: str, query_vector: np.ndarray | None = None) -> str:
         logger.info("Executing tool", tool_name="knowledge_base_retriever", query=question)
-        query_vector = self.embedding_model.encode(question).tolist()
+        if query_vector is None:
+            with metrics.STAGE_DURATION.time(stage="embed"):
+                query_vector = await self.embedding_batcher.submit(question)
+        query_vector = query_vector.tolist()
         
-        search_results = self.qdrant_client.search(
-            collection_name=COLLECTION_NAME,
-            query_vector=query_vector,
-            limit=RETRIEVAL_CANDIDATE_COUNT,
-            with_payload=True
-        )
+        with metrics.STAGE_DURATION.time(stage="search"):
+            search_results = await self._retrieve_candidates(question, query_vector)
         if not search_results:
             logger.warning("Knowledge base search returned no results", query=question)
-            return "Không tìm thấy tài liệu nào trong cơ sở tri thức cho truy vấn này."
+            return KB_NO_RESULTS
 
-        reranked_docs = self._rerank_documents(question, search_results)
+        with metrics.STAGE_DURATION.time(stage="rerank"):
+            reranked_docs = await self._rerank_documents(question, search_results)
         final_docs = reranked_docs[:FINAL_CONTEXT_COUNT]
         if not final_docs:
             logger.warning("No relevant documents found after re-ranking", query=question)
-            return "Không tìm thấy tài liệu liên quan sau khi xếp hạng lại."
+            return KB_NO_RELEVANT_RESULTS
             
         return "\n\n---\n\n".join(final_docs)
 
-    async def execute_agent_stream(self, question: str) -> AsyncGenerator[str, None]:
-        logger.info("Agent execution started")
+    async def _retrieve_candidates(self, question: str, query_vector: list) -> List[ScoredPoint | Record]:
+        """Lấy ứng viên cho bước re-rank: dense, hoặc dense + BM25 gộp bằng RRF ở chế độ hybrid."""
+        dense_search = self.qdrant_client.search(
+            collection_name=COLLECTION_NAME,
+            query_vector=query_vector,
+            limit=RETRIEVAL_CANDIDATE_COUNT,
+            with_payload=True,
+            # Tham số tìm kiếm của profile collection (rescore khi lượng tử hoá int8, hnsw_ef).
+            search_params=self.search_params,
+        )
+        index = self.bm25_index.get() if self.bm25_index is not None else None
+        if index is None:
+            return await dense_search
 
-        # BƯỚC 1: ROUTER
-        yield "Đang phân tích câu hỏi...\n"
-        router_output_str = await self.router_chain.ainvoke({"question": question})
-        
+        dense_results, lexical_results = await asyncio.gather(
+            dense_search,
+            self.inference_executor.run(index.search, question, RETRIEVAL_CANDIDATE_COUNT),
+        )
+        by_id = {str(point.id): point for point in dense_results}
+        fused_ids = reciprocal_rank_fusion(
+            [list(by_id), [point_id for point_id, _ in lexical_results]], k=RRF_K
+        )[:RETRIEVAL_CANDIDATE_COUNT]
+        # Ứng viên chỉ có trong BM25 chưa có payload: lấy thêm từ Qdrant trong một lần gọi.
+        missing = [point_id for point_id in fused_ids if point_id not in by_id]
+        if missing:
+            records = await self.qdrant_client.retrieve(
+                collection_name=COLLECTION_NAME, ids=missing, with_payload=True
+            )
+            by_id.update({str(record.id): record for record in records})
+        logger.debug("Hybrid retrieval candidates", dense=len(dense_results),
+                     lexical=len(lexical_results), lexical_only=len(missing))
+        return [by_id[point_id] for point_id in fused_ids if point_id in by_id]
+
+    def _start_speculative_kb(self, question: str) -> _SpeculativeRetrieval | None:
+        """
+        Khởi chạy truy vấn KB (embed, search, rerank) song song với router.
+        Câu hỏi có địa chỉ luôn được chuyển sang anomaly_detector/graph_handler nên không cần đoán trước.
+        """
+        if not self.speculative_kb_enabled or _extract_address(question):
+            return None
+        task = asyncio.create_task(self._get_context_from_kb(question))
+        # Tránh cảnh báo "exception was never retrieved" khi kết quả bị bỏ.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._speculation_stats["started"] += 1
+        return _SpeculativeRetrieval(question=question, task=task)
+
+    def _discard_speculation(self, speculation: _SpeculativeRetrieval | None):
+        """Huỷ (hoặc bỏ kết quả của) một truy vấn đoán trước không được dùng và ghi nhận chi phí lãng phí."""
+        if speculation is None or speculation.used:
+            return
+        speculation.used = True
+        self._speculation_stats["misses"] += 1
+        self._speculation_stats["wasted_retrieval_seconds"] += time.perf_counter() - speculation.started_at
+        speculation.task.cancel()
+        logger.info("Speculative KB retrieval discarded", finished=speculation.task.done())
+
+    async def _get_kb_context(self, query: str, speculation: _SpeculativeRetrieval | None,
+                              query_vector: np.ndarray | None = None) -> str:
+        """
+        Dùng kết quả đoán trước nếu nó được chạy cho đúng truy vấn này, nếu không thì truy vấn mới.
+        `query_vector` là embedding đã tính sẵn của `query` (nếu có).
+        """
+        if speculation is not None and not speculation.used and speculation.question.strip() == query.strip():
+            speculation.used = True
+            self._speculation_stats["hits"] += 1
+            logger.info("Using speculative KB retrieval result", already_finished=speculation.task.done())
+            return await speculation.task
+        self._discard_speculation(speculation)
+        return await self._get_context_from_kb(query, query_vector)
+
+    async def _route_with_llm(self, question: str) -> RouteDecision:
+        """Tầng cuối của router: hỏi LLM và phân tích JSON trả về."""
         tool_name = "knowledge_base_retriever"
         query = question
+        try:
+            async with self.llm_scheduler.slot("router"):
+                router_output_str = await self.router_chain.ainvoke({"question": question})
+        except LLMOverloadedError as e:
+            logger.warning("LLM router rejected by scheduler, falling back to default",
+                           reason=e.reason, fallback_tool=tool_name)
+            metrics.FALLBACKS.inc(kind="llm_router_overloaded")
+            return RouteDecision(tool=tool_name, query=query, tier="llm_overloaded", confidence=0.0)
 
         try:
             # MỚI: Cố gắng tìm và trích xuất JSON từ bên trong khối mã
@@ -181,50 +390,174 @@ TRẢ LỜI:"""
             
             tool_name = router_output.get("tool", tool_name)
             query = router_output.get("query", question)
-            logger.info("Router decision made", tool=tool_name, query=query)
+            return RouteDecision(tool=tool_name, query=query, tier="llm", confidence=1.0)
         except json.JSONDecodeError:
             logger.warning("Router returned invalid JSON, falling back to default", 
                         invalid_json=router_output_str, 
                         fallback_tool=tool_name)
+            return RouteDecision(tool=tool_name, query=query, tier="llm_fallback", confidence=0.0)
+
+    async def execute_agent_stream(self, question: str) -> AsyncGenerator[str, None]:
+        if not self.coalescer.enabled:
+            async for chunk in self._execute_agent_stream(question):
+                yield chunk
+            return
+        try:
+            # Câu hỏi trùng với một luồng đang chạy: phát lại các chunk đã có rồi nhận tiếp từ luồng đó.
+            async for chunk in self.coalescer.subscribe(
+                coalescing_key(question), lambda: self._execute_agent_stream(question)
+            ):
+                yield chunk
+        except SubscriberLaggedError:
+            logger.warning("Client too slow for coalesced stream, stream detached")
+            yield ErrorEvent("Lỗi: Kết nối quá chậm, luồng trả lời đã bị ngắt. Vui lòng thử lại.")
+
+    async def _execute_agent_stream(self, question: str) -> AsyncGenerator[str, None]:
+        started_at = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            async for chunk in self._run_agent(question, started_at):
+                yield chunk
+            outcome = "completed"
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            metrics.STREAM_DURATION.observe(time.perf_counter() - started_at, outcome=outcome)
+
+    async def _run_agent(self, question: str, started_at: float) -> AsyncGenerator[str, None]:
+        logger.info("Agent execution started")
+
+        # BƯỚC 1: ROUTER
+        yield StatusEvent("Đang phân tích câu hỏi...")
+        speculation = self._start_speculative_kb(question)
+        question_vector = None
+        try:
+            # Câu hỏi có địa chỉ không bao giờ dùng semantic cache (kết quả phụ thuộc địa chỉ cụ thể).
+            if self.semantic_cache.enabled and not _extract_address(question):
+                with metrics.STAGE_DURATION.time(stage="embed"):
+                    question_vector = await self.embedding_batcher.submit(question)
+            with metrics.STAGE_DURATION.time(stage="router"):
+                decision = await self.router.route(question, query_vector=question_vector)
+                if decision is None:
+                    decision = await self._route_with_llm(question)
+        except BaseException:
+            self._discard_speculation(speculation)
+            raise
+        tool_name, query = decision.tool, decision.query
+        logger.info("Router decision made", tool=tool_name, query=query,
+                    router_tier=decision.tier, confidence=decision.confidence)
+        metrics.TOOL_CHOICES.inc(tool=tool_name, tier=decision.tier)
+        if decision.tier == "llm_fallback":
+            metrics.FALLBACKS.inc(kind="router_unparseable_output")
+        if tool_name in ("anomaly_detector", "graph_handler", "web_searcher"):
+            self._discard_speculation(speculation)
+
+        if question_vector is not None:
+            cached = self.semantic_cache.lookup(question_vector, tool_name)
+            if cached is not None:
+                self._discard_speculation(speculation)
+                logger.info("Semantic cache hit", tool=tool_name, similarity=cached.similarity,
+                            cached_question=cached.question)
+                yield StatusEvent("Đang tổng hợp câu trả lời...")
+                metrics.TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started_at)
+                for chunk in split_for_replay(cached.answer):
+                    yield chunk
+                logger.info("Agent stream finished.")
+                return
 
         # BƯỚC 2: EXECUTOR - THAY ĐỔI: Mở rộng hộp công cụ
         context = ""
-        if tool_name == "anomaly_detector":
-            address = _extract_address(query)
-            if not address:
-                context = f"Lỗi: Không thể trích xuất địa chỉ blockchain hợp lệ từ câu hỏi '{query}' để kiểm tra bất thường."
-            else:
-                yield "⏳ Đang kết nối tới dịch vụ phát hiện bất thường...\n"
-                context = await tools.check_address_anomaly(address) # Phải dùng await
-
-        elif tool_name == "graph_handler":
-            # Đây là placeholder, chúng ta sẽ triển khai logic này ở bước tiếp theo
-            yield "⏳ Chức năng phân tích đồ thị đang được phát triển...\n"
-            context = "Lỗi: Chức năng phân tích đồ thị chưa được triển khai đầy đủ."
-
-        elif tool_name == "web_searcher":
-            yield "Đang tìm kiếm trên web...\n"
-            # Giả định bạn đã cập nhật tools.py để có hàm async
-            context = await tools.search_the_web_async(query) 
-
-        elif tool_name == "knowledge_base_retriever":
-            yield "Đang truy vấn cơ sở tri thức...\n"
-            context = self._get_context_from_kb(query)
+        tool_started_at = time.perf_counter()
+        # Client ngắt kết nối ở một yield bên dưới (trước khi _get_kb_context chạy): vẫn huỷ truy vấn đoán trước,
+        # nếu không nó tiếp tục giữ một slot của inference executor. No-op khi kết quả đã được dùng.
+        try:
+            if tool_name == "anomaly_detector":
+                address = _extract_address(query)
+                if not address:
+                    context = f"Lỗi: Không thể trích xuất địa chỉ blockchain hợp lệ từ câu hỏi '{query}' để kiểm tra bất thường."
+                else:
+                    yield StatusEvent("⏳ Đang kết nối tới dịch vụ phát hiện bất thường...")
+                    context = await tools.check_address_anomaly(address) # Phải dùng await
+
+            elif tool_name == "graph_handler":
+                address = _extract_address(query)
+                if not address:
+                    context = f"Lỗi: Không thể trích xuất địa chỉ blockchain hợp lệ từ câu hỏi '{query}' để phân tích đồ thị."
+                else:
+                    yield StatusEvent("⏳ Đang phân tích đồ thị giao dịch...")
+                    context = await tools.analyze_address_graph(address)
+
+            elif tool_name == "web_searcher":
+                yield StatusEvent("Đang tìm kiếm trên web...")
+                # Giả định bạn đã cập nhật tools.py để có hàm async
+                context = await tools.search_the_web_async(query) 
+
+            elif tool_name == "knowledge_base_retriever":
+                yield StatusEvent("Đang truy vấn cơ sở tri thức...")
+                context = await self._get_kb_context(
+                    query, speculation, question_vector if query == question else None
+                )
             
-        else:
-            logger.error("Router requested non-existent tool, falling back to default", 
-                         requested_tool=tool_name,
-                         fallback_tool="knowledge_base_retriever")
-            yield f"Lỗi: Công cụ không tồn tại ('{tool_name}'). Đang sử dụng cơ sở tri thức mặc định...\n"
-            context = self._get_context_from_kb(question)
+            else:
+                logger.error("Router requested non-existent tool, falling back to default", 
+                             requested_tool=tool_name,
+                             fallback_tool="knowledge_base_retriever")
+                metrics.FALLBACKS.inc(kind="unknown_tool")
+                yield StatusEvent(f"Lỗi: Công cụ không tồn tại ('{tool_name}'). Đang sử dụng cơ sở tri thức mặc định...")
+                context = await self._get_kb_context(question, speculation)
+        finally:
+            self._discard_speculation(speculation)
+        kb_found_nothing = context in (KB_NO_RESULTS, KB_NO_RELEVANT_RESULTS)
+        metrics.TOOL_DURATION.observe(time.perf_counter() - tool_started_at, tool=tool_name)
+
+        assembled = self.context_assembler.assemble(tool_name, context)
+        context = assembled.text
+        metrics.CONTEXT_TOKENS.observe(assembled.tokens_after, tool=tool_name)
+        if assembled.tokens_saved:
+            metrics.CONTEXT_TOKENS_SAVED.inc(assembled.tokens_saved, tool=tool_name)
+        logger.info("Context assembled", tool=tool_name, tokens_before=assembled.tokens_before,
+                    tokens_after=assembled.tokens_after, tokens_saved=assembled.tokens_saved, budget=assembled.budget,
+                    duplicates_removed=assembled.duplicates_removed, parts_dropped=assembled.parts_dropped,
+                    truncated=assembled.truncated)
 
         # BƯỚC 3: SYNTHESIZER
-        yield "Đang tổng hợp câu trả lời...\n"
+        yield StatusEvent("Đang tổng hợp câu trả lời...")
         
         context_snippet = (context[:250] + '...') if len(context) > 250 else context
         logger.info("Synthesizing final answer", context_snippet=context_snippet)
         
-        async for chunk in self.synthesizer_chain.astream({"context": context, "question": question}):
-            yield chunk
+        answer_parts = []
+        synthesis_started_at = time.perf_counter()
+        first_token_at = None
+        try:
+            async with self.llm_scheduler.slot("synthesis"):
+                async for chunk in self.synthesizer_chain.astream({"context": context, "question": question}):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        metrics.TIME_TO_FIRST_TOKEN.observe(first_token_at - started_at)
+                        logger.info("First answer token", ttft_ms=round((first_token_at - started_at) * 1000, 1),
+                                    prefill_ms=round((first_token_at - synthesis_started_at) * 1000, 1),
+                                    context_tokens=assembled.tokens_after, tokens_saved=assembled.tokens_saved)
+                    answer_parts.append(chunk)
+                    yield chunk
+        except LLMOverloadedError as e:
+            metrics.FALLBACKS.inc(kind="llm_synthesis_overloaded")
+            yield ErrorEvent(f"Hệ thống đang quá tải, vui lòng thử lại sau {int(e.retry_after + 0.999)} giây.")
+            return
+        finished_at = time.perf_counter()
+        metrics.STAGE_DURATION.observe(finished_at - synthesis_started_at, stage="synthesis")
+        if len(answer_parts) > 1 and finished_at > first_token_at:
+            metrics.TOKENS_PER_SECOND.observe((len(answer_parts) - 1) / (finished_at - first_token_at))
+
+        # Chỉ lưu các câu trả lời đã stream trọn vẹn, và không lưu khi KB không trả về tài liệu nào.
+        if question_vector is not None and not kb_found_nothing:
+            self.semantic_cache.store(question, question_vector, tool_name, "".join(answer_parts))
             
-        logger.info("Agent stream finished.")
\ No newline at end of file
+        logger.info("Agent stream finished.")
+
+    def shutdown(self):
+        """Giải phóng tài nguyên nền (batcher, thread pool suy luận)."""
+        self.embedding_batcher.close()
+        self.rerank_batcher.close()
+        self.inference_executor.shutdown()
\ No newline at end of file
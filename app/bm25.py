@@ -0,0 +1,144 @@
+# app/bm25.py
+import os
+import re
+from collections import Counter
+from typing import Iterable
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Chỉ mục được scripts/ingest_data.py ghi ra; nằm trong thư mục app/ để container backend (mount ./app) đọc được.
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "app/data/bm25_index.npz")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Token là chuỗi chữ/số Unicode (giữ nguyên dấu tiếng Việt); địa chỉ 0x..., ticker, mã ID được giữ trọn.
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Chỉ mục nghịch đảo BM25 gọn nhẹ, lưu dạng CSR bằng numpy:
+    posting của term thứ i nằm trong `doc_ids[offsets[i]:offsets[i + 1]]` (kèm tần suất `tfs`).
+    Mỗi tài liệu được định danh bằng ID điểm trong Qdrant, nên kết quả có thể ghép với tìm kiếm dense.
+    """
+
+    def __init__(self, vocabulary: dict[str, int], offsets: np.ndarray, doc_ids: np.ndarray,
+                 tfs: np.ndarray, doc_lengths: np.ndarray, point_ids: list[str]):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.point_ids = point_ids
+        self.avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        doc_freq = np.diff(offsets).astype(np.float32)
+        n = len(point_ids)
+        self.idf = np.log1p((n - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.point_ids)
+
+    @classmethod
+    def build(cls, documents: Iterable[tuple[str, str]]) -> "BM25Index":
+        """Xây chỉ mục từ các cặp (point_id, nội dung)."""
+        vocabulary: dict[str, int] = {}
+        postings: list[list[tuple[int, int]]] = []
+        point_ids: list[str] = []
+        doc_lengths: list[int] = []
+        for point_id, text in documents:
+            doc_index = len(point_ids)
+            point_ids.append(str(point_id))
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                if term_id == len(postings):
+                    postings.append([])
+                postings[term_id].append((doc_index, tf))
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        doc_ids = np.fromiter((d for p in postings for d, _ in p), dtype=np.int32, count=int(offsets[-1]))
+        tfs = np.fromiter((tf for p in postings for _, tf in p), dtype=np.float32, count=int(offsets[-1]))
+        return cls(vocabulary, offsets, doc_ids, tfs, np.asarray(doc_lengths, dtype=np.float32), point_ids)
+
+    def search(self, query: str, limit: int) -> list[tuple[str, float]]:
+        """Trả về tối đa `limit` cặp (point_id, điểm BM25) có điểm dương, giảm dần theo điểm."""
+        if not self.point_ids:
+            return []
+        term_ids = {self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary}
+        if not term_ids:
+            return []
+        scores = np.zeros(len(self.point_ids), dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / max(self.avg_doc_length, 1e-9))
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            # Mỗi tài liệu xuất hiện tối đa một lần trong một posting, nên cộng trực tiếp là an toàn.
+            scores[docs] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + norm[docs])
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.point_ids[i], float(scores[i])) for i in candidates]
+
+    def save(self, path: str = BM25_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        terms = sorted(self.vocabulary, key=self.vocabulary.__getitem__)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            terms=np.asarray(terms, dtype=str),
+            offsets=self.offsets, doc_ids=self.doc_ids, tfs=self.tfs,
+            doc_lengths=self.doc_lengths, point_ids=np.asarray(self.point_ids, dtype=str),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_PATH) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+            return cls(vocabulary, data["offsets"], data["doc_ids"], data["tfs"],
+                       data["doc_lengths"], data["point_ids"].tolist())
+
+
+class BM25IndexFile:
+    """Giữ chỉ mục đã nạp và tự nạp lại khi file trên đĩa thay đổi (sau mỗi lần ingest)."""
+
+    def __init__(self, path: str = BM25_INDEX_PATH):
+        self.path = path
+        self._mtime: float | None = None
+        self._index: BM25Index | None = None
+
+    def get(self) -> BM25Index | None:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            if self._index is not None:
+                logger.warning("BM25 index file disappeared, lexical retrieval disabled", path=self.path)
+            self._index, self._mtime = None, None
+            return None
+        if mtime != self._mtime:
+            self._index = BM25Index.load(self.path)
+            self._mtime = mtime
+            logger.info("BM25 index loaded", path=self.path, documents=len(self._index),
+                        terms=len(self._index.vocabulary))
+        return self._index
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """Gộp nhiều danh sách xếp hạng theo RRF: điểm = tổng 1 / (k + hạng)."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda key: scores[key], reverse=True)
@@ -0,0 +1,218 @@
+# app/cache.py
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Protocol
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+
+class CacheBackend(Protocol):
+    """Kho lưu trữ của TTLCache. Giá trị phải tuần tự hoá được thành JSON nếu dùng backend trên đĩa."""
+
+    def get(self, key: str) -> tuple[Any, float] | None: ...
+    def set(self, key: str, value: Any, expires_at: float): ...
+    def delete(self, key: str): ...
+    def clear(self): ...
+    def __len__(self) -> int: ...
+
+
+class MemoryBackend:
+    """Backend trong tiến trình, giới hạn số phần tử, loại bỏ theo LRU."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: Any, expires_at: float):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    Backend trên đĩa (SQLite) để cache sống sót qua các lần khởi động lại.
+    Mỗi cache dùng một bảng riêng trong cùng một file; LRU dựa trên thời điểm truy cập cuối.
+
+    Kết nối được mở lười và gắn với pid: module tạo cache lúc import (app.tools) có thể được import ở tiến trình
+    cha trước khi fork worker (app/serve.py), và một kết nối SQLite không được dùng chung qua fork.
+    """
+
+    def __init__(self, path: str, table: str, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._path = path
+        self._table = table
+        self._conn_pid: int | None = None
+        self._connection: sqlite3.Connection | None = None
+        self._size = 0
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._conn_pid != os.getpid():
+            self._connection = self._connect()
+            self._conn_pid = os.getpid()
+        return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        table = self._table
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        conn = sqlite3.connect(self._path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+        # Dọn các bản ghi đã hết hạn từ lần chạy trước.
+        conn.execute(f"DELETE FROM {table} WHERE expires_at <= ?", (time.time(),))
+        self._size = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return conn
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        row = self._conn.execute(f"SELECT value, expires_at FROM {self._table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute(f"UPDATE {self._table} SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        existed = self._conn.execute(f"SELECT 1 FROM {self._table} WHERE key = ?", (key,)).fetchone() is not None
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {self._table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), expires_at, time.time()),
+        )
+        if not existed:
+            self._size += 1
+        overflow = self._size - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self._table} WHERE key IN "
+                f"(SELECT key FROM {self._table} ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._size -= overflow
+            self.evictions += overflow
+
+    def delete(self, key: str):
+        if self._conn.execute(f"DELETE FROM {self._table} WHERE key = ?", (key,)).rowcount:
+            self._size -= 1
+
+    def clear(self):
+        self._conn.execute(f"DELETE FROM {self._table}")
+        self._size = 0
+
+    def __len__(self) -> int:
+        self._conn  # Mở kết nối (và đếm số bản ghi) nếu tiến trình này chưa mở.
+        return self._size
+
+
+class TTLCache:
+    """
+    Cache có TTL cho kết quả của các lời gọi tốn kém (ví dụ: API bên ngoài).
+
+    - Hết hạn theo TTL cố định cho mỗi cache.
+    - Bộ nhớ bị giới hạn bởi backend (LRU).
+    - Single-flight: nhiều lời gọi đồng thời cho cùng một key chưa có trong cache chỉ
+      kích hoạt MỘT lần `loader`; các lời gọi còn lại chờ chung kết quả đó.
+    - Chỉ kết quả thành công được lưu; ngoại lệ từ `loader` được trả cho mọi người chờ.
+    """
+
+    def __init__(self, name: str, backend: CacheBackend, ttl_seconds: float):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._backend = backend
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "expired": 0}
+
+    def get(self, key: str) -> Any | None:
+        entry = self._backend.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            self._backend.delete(key)
+            self._stats["expired"] += 1
+            return None
+        return value
+
+    def set(self, key: str, value: Any):
+        self._backend.set(key, value, time.time() + self.ttl_seconds)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            self._stats["hits"] += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        self._stats["misses"] += 1
+        task = asyncio.ensure_future(self._load(key, loader))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        # shield: người gọi bị huỷ (ví dụ: client ngắt kết nối) không huỷ lần tải chung;
+        # kết quả vẫn được lưu cho những người chờ khác và các lần gọi sau.
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._backend.clear()
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"] + self._stats["coalesced"]
+        return {
+            **self._stats,
+            "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+            "entries": len(self._backend),
+            "evictions": getattr(self._backend, "evictions", 0),
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def create_cache(name: str, ttl_seconds: float, max_entries: int, backend: str = "memory", path: str | None = None) -> TTLCache:
+    """Tạo TTLCache với backend "memory" (mặc định) hoặc "sqlite" (trên đĩa, cần `path`)."""
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("A file path is required for the sqlite cache backend.")
+        store: CacheBackend = SQLiteBackend(path, table=name, max_entries=max_entries)
+    elif backend == "memory":
+        store = MemoryBackend(max_entries=max_entries)
+    else:
+        raise ValueError(f"Unknown cache backend: '{backend}'")
+    logger.info("Cache created", cache=name, backend=backend, ttl_seconds=ttl_seconds, max_entries=max_entries)
+    return TTLCache(name, store, ttl_seconds)
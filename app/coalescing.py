@@ -0,0 +1,156 @@
+# app/coalescing.py
+import asyncio
+import os
+import re
+from typing import Any, AsyncIterator, Callable
+
+import structlog
+
+from . import metrics
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Gộp các câu hỏi giống hệt nhau (sau chuẩn hoá) đang được xử lý đồng thời vào một luồng duy nhất.
+# Tắt mặc định: khi bật, mọi người hỏi cùng câu trong lúc đó nhận CÙNG một câu trả lời (xem README, mục Usage).
+REQUEST_COALESCING_ENABLED = os.getenv("REQUEST_COALESCING_ENABLED", "false").lower() == "true"
+# Dung lượng tối đa (ký tự) các chunk được giữ lại để phát lại cho người đăng ký đến sau.
+# Vượt quá thì luồng không nhận thêm người đăng ký mới, và chỉ giữ phần mà người đăng ký chậm nhất chưa đọc.
+COALESCING_MAX_BUFFER_CHARS = int(os.getenv("COALESCING_MAX_BUFFER_CHARS", "262144"))
+
+
+class SubscriberLaggedError(Exception):
+    """Người đăng ký đọc quá chậm so với luồng chung và đã bị tách ra để giữ bộ đệm trong giới hạn."""
+
+
+def coalescing_key(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().casefold()
+
+
+class _Subscriber:
+    __slots__ = ("cursor", "lagged")
+
+    def __init__(self, cursor: int):
+        self.cursor = cursor
+        self.lagged = False
+
+
+class _Flight:
+    """Một luồng đang chạy: bộ đệm chunk (có offset `base` sau khi cắt phần đầu) và các người đăng ký."""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.base = 0
+        self.buffered_chars = 0
+        self.subscribers: list[_Subscriber] = []
+        self.joinable = True
+        self.done = False
+        self.error: BaseException | None = None
+        self.changed = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.chunks)
+
+    def notify(self):
+        event, self.changed = self.changed, asyncio.Event()
+        event.set()
+
+
+class StreamCoalescer:
+    """
+    Single-flight cho các stream bất đồng bộ: yêu cầu đầu tiên với một khoá khởi chạy stream gốc trong một task
+    riêng; các yêu cầu trùng khoá đến khi stream còn chạy sẽ nhận lại các chunk đã phát, rồi nhận tiếp chunk mới.
+    Stream gốc bị huỷ khi mọi người đăng ký đều ngắt kết nối.
+    """
+
+    def __init__(self, enabled: bool = REQUEST_COALESCING_ENABLED, max_buffer_chars: int = COALESCING_MAX_BUFFER_CHARS):
+        self.enabled = enabled
+        self.max_buffer_chars = max_buffer_chars
+        self._flights: dict[str, _Flight] = {}
+        self._stats = {"flights": 0, "joined": 0, "replayed_chunks": 0, "lagged": 0, "cancelled": 0}
+
+    async def subscribe(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None or not flight.joinable:
+            flight = self._start(key, factory)
+        else:
+            self._stats["joined"] += 1
+            self._stats["replayed_chunks"] += len(flight.chunks)
+            metrics.COALESCED_REQUESTS.inc()
+            logger.info("Joined in-flight stream", buffered_chunks=len(flight.chunks))
+        subscriber = _Subscriber(flight.base)
+        flight.subscribers.append(subscriber)
+        try:
+            while True:
+                changed = flight.changed
+                while not subscriber.lagged and subscriber.cursor < flight.end:
+                    chunk = flight.chunks[subscriber.cursor - flight.base]
+                    subscriber.cursor += 1
+                    yield chunk
+                if subscriber.lagged:
+                    raise SubscriberLaggedError(key)
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers.remove(subscriber)
+            if not flight.subscribers and not flight.done and flight.task is not None:
+                self._stats["cancelled"] += 1
+                flight.task.cancel()
+            self._trim(flight)
+
+    def _start(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> _Flight:
+        flight = _Flight()
+        self._flights[key] = flight
+        self._stats["flights"] += 1
+        flight.task = asyncio.create_task(self._produce(key, flight, factory))
+        return flight
+
+    async def _produce(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                flight.buffered_chars += len(chunk)
+                if flight.buffered_chars > self.max_buffer_chars:
+                    self._trim(flight)
+                flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    def _trim(self, flight: _Flight):
+        """Giữ bộ đệm trong giới hạn khi nó đã vượt ngưỡng: bỏ phần mọi người đăng ký đã đọc, rồi tách người đọc chậm."""
+        if flight.buffered_chars <= self.max_buffer_chars:
+            return
+        # Người đăng ký mới sẽ không thể nhận lại toàn bộ luồng nữa.
+        flight.joinable = False
+        active = [s for s in flight.subscribers if not s.lagged]
+        while True:
+            keep_from = min((s.cursor for s in active), default=flight.end)
+            drop = keep_from - flight.base
+            if drop > 0:
+                flight.buffered_chars -= sum(len(c) for c in flight.chunks[:drop])
+                del flight.chunks[:drop]
+                flight.base = keep_from
+            if flight.buffered_chars <= self.max_buffer_chars or not active:
+                return
+            slowest = min(active, key=lambda s: s.cursor)
+            slowest.lagged = True
+            active.remove(slowest)
+            self._stats["lagged"] += 1
+            logger.warning("Coalesced stream subscriber lagged behind, detaching",
+                           buffered_chars=flight.buffered_chars, subscribers=len(flight.subscribers))
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._stats, "enabled": self.enabled, "in_flight": len(self._flights),
+                "subscribers": sum(len(f.subscribers) for f in self._flights.values())}
@@ -0,0 +1,178 @@
+# app/context_assembler.py
+import math
+import os
+import re
+from dataclasses import dataclass
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Ngân sách token cho phần NGỮ CẢNH của prompt tổng hợp, theo từng công cụ. 0 = không giới hạn.
+# Trên CPU, thời gian prefill của prompt chiếm phần lớn time-to-first-token, nên ngữ cảnh càng gọn càng tốt.
+CONTEXT_TOKEN_BUDGETS = {
+    "knowledge_base_retriever": int(os.getenv("CONTEXT_BUDGET_KB_TOKENS", "700")),
+    "web_searcher": int(os.getenv("CONTEXT_BUDGET_WEB_TOKENS", "600")),
+    "anomaly_detector": int(os.getenv("CONTEXT_BUDGET_ANOMALY_TOKENS", "0")),
+    "graph_handler": int(os.getenv("CONTEXT_BUDGET_GRAPH_TOKENS", "0")),
+}
+# Tuỳ chọn: đường dẫn tới tokenizer.json của LLM (ví dụ của llama3) để đếm token chính xác bằng thư viện
+# `tokenizers`. Mặc định dùng ước lượng nhanh theo số byte UTF-8 của từng từ.
+CONTEXT_TOKENIZER_PATH = os.getenv("CONTEXT_TOKENIZER_PATH")
+# Hai đoạn trùng nhau ít nhất chừng này ký tự (ở đầu/cuối) thì bị coi là phần chồng lấn do chunk_overlap khi ingest.
+CONTEXT_MIN_OVERLAP_CHARS = int(os.getenv("CONTEXT_MIN_OVERLAP_CHARS", "40"))
+# Không giữ lại phần cắt dở nếu nó ngắn hơn chừng này token.
+CONTEXT_MIN_PARTIAL_TOKENS = int(os.getenv("CONTEXT_MIN_PARTIAL_TOKENS", "40"))
+# Độ dài tối đa của phần chồng lấn cần dò tìm (ingest dùng chunk_overlap=200).
+_MAX_OVERLAP_CHARS = 400
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+_TRUNCATION_SUFFIX = " ..."
+_WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def _estimate_tokens(text: str) -> int:
+    # Tokenizer BPE theo byte (llama3) tách tiếng Anh ~4 byte/token; tiếng Việt có dấu tốn nhiều byte hơn mỗi âm tiết.
+    return sum(math.ceil(len(piece.encode("utf-8")) / 4) for piece in _WORD_PATTERN.findall(text))
+
+
+def load_token_counter(tokenizer_path: str | None = CONTEXT_TOKENIZER_PATH):
+    """Trả về hàm đếm token: tokenizer thật nếu được cấu hình và có thư viện, ngược lại là hàm ước lượng."""
+    if tokenizer_path:
+        try:
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+            logger.info("Context token counter uses tokenizer file", path=tokenizer_path)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+        except Exception as e:
+            logger.warning("Could not load tokenizer, falling back to estimate", path=tokenizer_path, error=str(e))
+    return _estimate_tokens
+
+
+def _overlap(previous: str, current: str, min_chars: int) -> int:
+    """Độ dài phần cuối của `previous` trùng với phần đầu của `current` (0 nếu ngắn hơn `min_chars`)."""
+    tail = previous[-_MAX_OVERLAP_CHARS:]
+    probe = current[:min_chars]
+    if len(probe) < min_chars:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        length = len(tail) - start
+        if current.startswith(tail[start:]):
+            return length
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+@dataclass
+class AssembledContext:
+    text: str
+    tokens_before: int
+    tokens_after: int
+    budget: int
+    duplicates_removed: int = 0
+    parts_dropped: int = 0
+    truncated: bool = False
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+class ContextAssembler:
+    """
+    Ghép ngữ cảnh cho prompt tổng hợp trong một ngân sách token:
+      1. loại bỏ đoạn trùng lặp và phần chồng lấn giữa các chunk liền kề;
+      2. giữ các đoạn theo thứ tự liên quan (đầu vào đã được re-rank), đoạn cuối vừa ngân sách thì cắt ở ranh giới câu/từ.
+    """
+
+    def __init__(self, budgets: dict[str, int] | None = None, count_tokens=None,
+                 min_overlap_chars: int = CONTEXT_MIN_OVERLAP_CHARS, min_partial_tokens: int = CONTEXT_MIN_PARTIAL_TOKENS):
+        self.budgets = dict(CONTEXT_TOKEN_BUDGETS if budgets is None else budgets)
+        self.count_tokens = count_tokens or load_token_counter()
+        self.min_overlap_chars = min_overlap_chars
+        self.min_partial_tokens = min_partial_tokens
+
+    def _dedupe(self, parts: list[str]) -> tuple[list[str], int]:
+        kept: list[str] = []
+        removed = 0
+        for part in parts:
+            part = part.strip()
+            if not part or any(part in other for other in kept):
+                removed += 1
+                continue
+            for other in kept:
+                # Phần chồng lấn có thể nằm ở cuối đoạn trước hoặc đầu đoạn trước (thứ tự re-rank không theo vị trí).
+                if (n := _overlap(other, part, self.min_overlap_chars)):
+                    part = part[n:].lstrip()
+                    removed += 1
+                    break
+                if (n := _overlap(part, other, self.min_overlap_chars)):
+                    part = part[:-n].rstrip()
+                    removed += 1
+                    break
+            if part:
+                kept.append(part)
+        return kept, removed
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """
+        Cắt `text` cho vừa `budget` token (kể cả dấu " ..." thêm vào khi cắt giữa câu), ưu tiên kết thúc ở cuối câu,
+        sau đó ở cuối từ. Ngân sách quá nhỏ để chứa cả dấu " ..." thì cắt trơn.
+        """
+        ratio = budget / max(self.count_tokens(text), 1)
+        cut = text[:int(len(text) * ratio)]
+        while cut:
+            if self.count_tokens(cut) <= budget:
+                sentence_end = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("\n"))
+                if sentence_end > len(cut) // 2:
+                    candidate = cut[:sentence_end + 1].rstrip()
+                else:
+                    candidate = cut.rsplit(" ", 1)[0].rstrip() + _TRUNCATION_SUFFIX
+                    if self.count_tokens(_TRUNCATION_SUFFIX) >= budget:
+                        candidate = cut.rstrip()
+                if self.count_tokens(candidate) <= budget:
+                    return candidate
+            cut = cut[:int(len(cut) * 0.9)]
+        return ""
+
+    def assemble(self, tool: str, context: str) -> AssembledContext:
+        tokens_before = self.count_tokens(context)
+        budget = self.budgets.get(tool, 0)
+        parts = context.split(CONTEXT_SEPARATOR)
+        if len(parts) == 1 and (budget <= 0 or tokens_before <= budget):
+            return AssembledContext(context, tokens_before, tokens_before, budget)
+
+        parts, duplicates = self._dedupe(parts)
+        selected, used, truncated = [], 0, False
+        separator_tokens = self.count_tokens(CONTEXT_SEPARATOR)
+        for part in parts:
+            cost = self.count_tokens(part) + (separator_tokens if selected else 0)
+            if budget <= 0 or used + cost <= budget:
+                selected.append(part)
+                used += cost
+                continue
+            remaining = budget - used - (separator_tokens if selected else 0)
+            if remaining >= self.min_partial_tokens or not selected:
+                selected.append(self._truncate(part, max(remaining, 1)))
+                truncated = True
+            break
+
+        text = CONTEXT_SEPARATOR.join(selected)
+        tokens_after = self.count_tokens(text)
+        # Số token của cả chuỗi không bằng đúng tổng từng phần (tokenizer thật gộp token qua ranh giới phần):
+        # đếm lại và cắt tiếp phần cuối cho tới khi vừa ngân sách.
+        while budget > 0 and tokens_after > budget and selected:
+            last = selected.pop()
+            last_budget = self.count_tokens(last) - (tokens_after - budget)
+            if last_budget >= self.min_partial_tokens or not selected:
+                shorter = self._truncate(last, max(last_budget, 1))
+                if shorter and len(shorter) < len(last):
+                    selected.append(shorter)
+            truncated = True
+            text = CONTEXT_SEPARATOR.join(selected)
+            tokens_after = self.count_tokens(text)
+        return AssembledContext(text, tokens_before, tokens_after, budget, duplicates,
+                                parts_dropped=len(parts) - len(selected), truncated=truncated)
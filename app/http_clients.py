@@ -0,0 +1,237 @@
+# app/http_clients.py
+import asyncio
+import os
+import time
+from collections import deque
+
+import httpx
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+# Dịch vụ trên render.com có thể "ngủ" và cần thời gian khởi động lại, nên read timeout vẫn dài.
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# Circuit breaker: mở mạch sau N lỗi liên tiếp, thử lại (half-open) sau một khoảng thời gian.
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+
+# Hedged requests: gửi thêm một yêu cầu thứ hai nếu yêu cầu đầu chậm hơn p95 quan sát được.
+HTTP_HEDGING_ENABLED = os.getenv("HTTP_HEDGING_ENABLED", "false").lower() == "true"
+HTTP_HEDGE_MIN_DELAY_MS = float(os.getenv("HTTP_HEDGE_MIN_DELAY_MS", "50"))
+HTTP_HEDGE_MIN_SAMPLES = int(os.getenv("HTTP_HEDGE_MIN_SAMPLES", "20"))
+_LATENCY_WINDOW = 512
+
+try:
+    import h2  # noqa: F401  # httpx chỉ hỗ trợ HTTP/2 khi có gói h2.
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class CircuitOpenError(Exception):
+    """Được raise khi circuit breaker của một endpoint đang mở và yêu cầu bị từ chối ngay."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Circuit for '{endpoint}' is open; retry in {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Circuit breaker đơn giản ba trạng thái: closed -> open -> half_open -> closed."""
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, recovery_seconds: float = CIRCUIT_RECOVERY_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = "closed"
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.recovery_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.retry_after() == 0.0:
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "half_open" and not self._trial_in_flight:
+            # Chỉ cho một yêu cầu thử đi qua khi half-open.
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self._consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def release_trial(self):
+        """Yêu cầu thử kết thúc mà không có kết luận (bị huỷ, lỗi không phải của dịch vụ)."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self._consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class ServiceEndpoint:
+    """
+    Một endpoint của dịch vụ bên ngoài: dùng chung connection pool, có circuit breaker
+    riêng và (tuỳ chọn) hedged requests dựa trên p95 độ trễ quan sát được.
+    """
+
+    def __init__(self, name: str, hedging_enabled: bool = HTTP_HEDGING_ENABLED, breaker: CircuitBreaker | None = None):
+        self.name = name
+        self.hedging_enabled = hedging_enabled
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._stats = {"requests": 0, "failures": 0, "rejected": 0, "hedged": 0, "hedge_wins": 0}
+
+    def hedge_delay(self) -> float | None:
+        """Độ trễ (giây) trước khi gửi yêu cầu dự phòng; None nếu chưa đủ dữ liệu."""
+        if len(self._latencies) < HTTP_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        return max(p95, HTTP_HEDGE_MIN_DELAY_MS / 1000)
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if not self.breaker.allow():
+            self._stats["rejected"] += 1
+            raise CircuitOpenError(self.name, self.breaker.retry_after())
+
+        self._stats["requests"] += 1
+        try:
+            delay = self.hedge_delay() if self.hedging_enabled else None
+            if delay is None:
+                response = await self._send(method, url, **kwargs)
+            else:
+                response = await self._send_hedged(delay, method, url, **kwargs)
+        except (httpx.TimeoutException, httpx.RequestError):
+            self._stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Huỷ giữa chừng hoặc lỗi khác (giải mã, RuntimeError của transport, ...): không tính là thất bại
+            # của dịch vụ, nhưng phải trả lại lượt thử half-open, nếu không breaker kẹt ở half-open mãi mãi.
+            self.breaker.release_trial()
+            raise
+
+        if response.status_code >= 500:
+            self._stats["failures"] += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await get_http_client().request(method, url, **kwargs)
+        self._latencies.append(time.perf_counter() - start)
+        return response
+
+    async def _send_hedged(self, delay: float, method: str, url: str, **kwargs) -> httpx.Response:
+        primary = asyncio.create_task(self._send(method, url, **kwargs))
+        tasks = {primary}
+        error: BaseException | None = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            self._stats["hedged"] += 1
+            hedge = asyncio.create_task(self._send(method, url, **kwargs))
+            tasks.add(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            # Kể cả khi chính lời gọi này bị huỷ lúc đang chờ: không để yêu cầu nào chạy tiếp không ai đợi.
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        delay = self.hedge_delay()
+        return {
+            **self._stats,
+            "circuit_state": self.breaker.state,
+            "hedging_enabled": self.hedging_enabled,
+            "hedge_delay_ms": delay * 1000 if delay is not None else None,
+        }
+
+
+# ==============================================================================
+# Connection pool dùng chung (được tạo trong lifespan của FastAPI)
+# ==============================================================================
+_client: httpx.AsyncClient | None = None
+_client_pid: int | None = None
+_endpoints: dict[str, ServiceEndpoint] = {}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Trả về AsyncClient dùng chung, tạo mới nếu chưa có (ví dụ: khi chạy ngoài FastAPI) hoặc nếu client được tạo ở
+    tiến trình khác (trước khi fork, app/serve.py): pool kết nối không được dùng chung qua fork.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client_pid = os.getpid()
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info("Shared HTTP client created", http2=HTTP2_AVAILABLE, max_connections=HTTP_MAX_CONNECTIONS)
+    return _client
+
+
+def get_endpoint(name: str) -> ServiceEndpoint:
+    if name not in _endpoints:
+        _endpoints[name] = ServiceEndpoint(name)
+    return _endpoints[name]
+
+
+def reset_endpoints():
+    """Xoá trạng thái (circuit breaker, thống kê độ trễ) của mọi endpoint."""
+    _endpoints.clear()
+
+
+def get_stats() -> dict:
+    return {name: endpoint.stats() for name, endpoint in _endpoints.items()}
+
+
+async def init_http_clients():
+    get_http_client()
+
+
+async def close_http_clients():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Shared HTTP client closed")
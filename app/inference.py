@@ -0,0 +1,189 @@
+# app/inference.py
+import asyncio
+import functools
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Generic, TypeVar
+
+import structlog
+
+# --- CẤU HÌNH ---
+# Số luồng tối đa chạy suy luận mô hình (embedding, cross-encoder) song song.
+INFERENCE_MAX_WORKERS = int(os.getenv("INFERENCE_MAX_WORKERS", "2"))
+# Số tác vụ suy luận tối đa được phép chờ/chạy cùng lúc. Các tác vụ vượt quá
+# sẽ phải đợi (bất đồng bộ) thay vì dồn vào hàng đợi không giới hạn của executor.
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "8"))
+# Micro-batching: thời gian tối đa (ms) gom các yêu cầu từ nhiều request vào một lô,
+# và số đầu vào tối đa (câu / cặp câu) trong một lần forward của mô hình.
+INFERENCE_BATCH_WINDOW_MS = float(os.getenv("INFERENCE_BATCH_WINDOW_MS", "5"))
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "64"))
+# Số mẫu gần nhất được giữ lại để tính các thống kê phân vị.
+_STATS_WINDOW = 1024
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+I = TypeVar("I")
+R = TypeVar("R")
+
+
+class InferenceExecutor:
+    """
+    Executor có giới hạn để chạy các tác vụ suy luận CPU-bound bên ngoài event loop.
+
+    SentenceTransformer.encode và CrossEncoder.predict là các hàm đồng bộ, tốn CPU.
+    Gọi trực tiếp chúng trong một coroutine sẽ chặn toàn bộ event loop của worker,
+    làm "đứng" mọi stream khác. Lớp này đẩy chúng sang một thread pool riêng
+    (PyTorch nhả GIL trong phần lớn thời gian tính toán).
+    """
+
+    def __init__(self, max_workers: int = INFERENCE_MAX_WORKERS, max_concurrency: int = INFERENCE_MAX_CONCURRENCY):
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        logger.info("Inference executor initialized", max_workers=max_workers, max_concurrency=max_concurrency)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Chạy `fn(*args, **kwargs)` trong thread pool và chờ kết quả mà không chặn event loop."""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        """Giải phóng thread pool. Các tác vụ chưa bắt đầu sẽ bị huỷ."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class MicroBatcher(Generic[I, R]):
+    """
+    Gom các tác vụ suy luận nhỏ từ nhiều request đồng thời thành một lô duy nhất.
+
+    Mỗi lời gọi `submit(item)` được đưa vào hàng đợi chung. Một worker nền lấy tác vụ
+    đầu tiên, tiếp tục gom thêm trong tối đa `window_ms` hoặc đến khi đủ `max_batch_size`
+    đầu vào, rồi gọi `batch_fn` một lần trong InferenceExecutor. Kết quả được trả về cho
+    từng người gọi qua future riêng của họ.
+
+    `batch_fn` nhận danh sách item và PHẢI trả về danh sách kết quả cùng thứ tự, cùng độ dài.
+    `item_size` cho biết một item chiếm bao nhiêu đầu vào của mô hình (ví dụ: số cặp câu).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[list[I]], list[R]],
+        executor: InferenceExecutor,
+        window_ms: float = INFERENCE_BATCH_WINDOW_MS,
+        max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+        item_size: Callable[[I], int] = lambda item: 1,
+    ):
+        self.name = name
+        self.window_s = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._batch_fn = batch_fn
+        self._executor = executor
+        self._item_size = item_size
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+        # Thống kê
+        self._batches = 0
+        self._items = 0
+        self._inputs = 0
+        self._batch_sizes: deque[int] = deque(maxlen=_STATS_WINDOW)
+        self._queue_waits_ms: deque[float] = deque(maxlen=_STATS_WINDOW)
+
+    async def submit(self, item: I) -> R:
+        """Đưa một item vào hàng đợi và chờ kết quả của riêng nó."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name=f"batcher-{self.name}")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect_batch(self) -> list[tuple[I, asyncio.Future, float]]:
+        assert self._queue is not None
+        batch = [await self._queue.get()]
+        size = self._item_size(batch[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window_s
+        while size < self.max_batch_size:
+            if self._queue.empty():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                entry = self._queue.get_nowait()
+            batch.append(entry)
+            size += self._item_size(entry[0])
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # Bỏ qua các người gọi đã huỷ (ví dụ: client ngắt kết nối) trước khi chạy mô hình.
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            now = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            batch_inputs = sum(self._item_size(item) for item in items)
+            self._batches += 1
+            self._items += len(items)
+            self._inputs += batch_inputs
+            self._batch_sizes.append(batch_inputs)
+            self._queue_waits_ms.extend((now - enqueued_at) * 1000 for _, _, enqueued_at in batch)
+
+            try:
+                results = await self._executor.run(self._batch_fn, items)
+            except Exception as e:
+                logger.error("Batched inference failed", batcher=self.name, batch_items=len(items), error=str(e))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict[str, Any]:
+        """Thống kê kích thước lô và thời gian chờ trong hàng đợi (trên cửa sổ mẫu gần nhất)."""
+        sizes = sorted(self._batch_sizes)
+        waits = sorted(self._queue_waits_ms)
+        return {
+            "window_ms": self.window_s * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches": self._batches,
+            "items": self._items,
+            "inputs": self._inputs,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size_avg": (sum(sizes) / len(sizes)) if sizes else 0.0,
+            "batch_size_p50": _percentile(sizes, 50),
+            "batch_size_max": sizes[-1] if sizes else 0,
+            "queue_wait_ms_avg": (sum(waits) / len(waits)) if waits else 0.0,
+            "queue_wait_ms_p50": _percentile(waits, 50),
+            "queue_wait_ms_p95": _percentile(waits, 95),
+        }
+
+    def close(self):
+        """Dừng worker nền."""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return float(sorted_values[index])
@@ -0,0 +1,163 @@
+# app/llm_scheduler.py
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+
+import structlog
+
+from . import metrics
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Số lời gọi LLM chạy đồng thời tới Ollama; nên khớp với OLLAMA_NUM_PARALLEL của server.
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+# Số lời gọi tối đa được phép chờ slot. Vượt quá thì từ chối ngay (HTTP 429).
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+# Thời gian chờ slot tối đa (giây). Nếu ước tính thời gian chờ vượt quá thì từ chối ngay (HTTP 503).
+LLM_QUEUE_DEADLINE_SECONDS = float(os.getenv("LLM_QUEUE_DEADLINE_SECONDS", "20"))
+# Hệ số làm mượt của trung bình trượt thời gian giữ slot, dùng để ước tính thời gian chờ.
+_HOLD_EWMA_ALPHA = 0.2
+_STATS_WINDOW = 1024
+
+# Độ ưu tiên: số nhỏ hơn được phục vụ trước. Lời gọi router ngắn (vài token JSON) nên được đi trước
+# các lượt tổng hợp câu trả lời dài, để router của request mới không phải đợi sau cả một câu trả lời.
+PRIORITIES = {"router": 0, "synthesis": 1}
+
+
+class LLMOverloadedError(Exception):
+    """Được raise khi không thể cấp slot LLM trong thời hạn cho phép; `retry_after` tính bằng giây."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"LLM scheduler overloaded ({reason}); retry in {retry_after:.1f}s")
+        self.reason = reason  # "queue_full" | "deadline"
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    """
+    Kiểm soát truy cập (admission control) cho các lời gọi tới Ollama.
+
+    Tối đa `max_in_flight` lời gọi chạy cùng lúc; phần còn lại chờ trong một hàng đợi ưu tiên có giới hạn.
+    Yêu cầu bị từ chối ngay khi hàng đợi đầy hoặc khi thời gian chờ ước tính (số lời gọi đứng trước
+    x thời gian giữ slot trung bình / số slot) vượt quá hạn chót, thay vì để mọi stream cùng chậm đi.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, max_queue: int = LLM_MAX_QUEUE,
+                 queue_deadline_seconds: float = LLM_QUEUE_DEADLINE_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_deadline_seconds = queue_deadline_seconds
+        self._in_flight = 0
+        # Heap các (độ ưu tiên, thứ tự đến, future); future đã huỷ được bỏ qua khi lấy ra.
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._queued = 0
+        self._sequence = itertools.count()
+        self._hold_ewma = 0.0
+        self._waits_ms: deque[float] = deque(maxlen=_STATS_WINDOW)
+        self._granted = {name: 0 for name in PRIORITIES}
+        self._rejected = {"queue_full": 0, "deadline": 0}
+        logger.info("LLM scheduler initialized", max_in_flight=max_in_flight, max_queue=max_queue,
+                    queue_deadline_seconds=queue_deadline_seconds)
+
+    def _ahead(self, priority: int) -> int:
+        return sum(1 for p, _, fut in self._waiters if p <= priority and not fut.done())
+
+    def estimate_wait(self, kind: str = "synthesis") -> float:
+        """Thời gian chờ slot ước tính (giây) cho một lời gọi mới thuộc loại `kind`."""
+        ahead = self._ahead(PRIORITIES[kind])
+        if self._in_flight < self.max_in_flight and ahead == 0:
+            return 0.0
+        return (ahead + 1) * self._hold_ewma / self.max_in_flight
+
+    def admit(self, kind: str = "synthesis"):
+        """Kiểm tra nhanh trước khi bắt đầu một stream; raise LLMOverloadedError nếu chắc chắn phải từ chối."""
+        if self._in_flight < self.max_in_flight and self._queued == 0:
+            return
+        estimate = self.estimate_wait(kind)
+        if self._queued >= self.max_queue:
+            self._reject("queue_full", estimate)
+        if estimate > self.queue_deadline_seconds:
+            self._reject("deadline", estimate)
+
+    def _reject(self, reason: str, estimate: float):
+        self._rejected[reason] += 1
+        metrics.LLM_REJECTIONS.inc(reason=reason)
+        retry_after = max(1.0, min(estimate, self.queue_deadline_seconds))
+        logger.warning("LLM call rejected by scheduler", reason=reason, queued=self._queued,
+                       in_flight=self._in_flight, estimated_wait_s=round(estimate, 2))
+        raise LLMOverloadedError(reason, retry_after)
+
+    @asynccontextmanager
+    async def slot(self, kind: str) -> AsyncIterator[None]:
+        """Giữ một slot LLM trong suốt khối `async with` (bao gồm cả thời gian stream câu trả lời)."""
+        await self._acquire(kind)
+        acquired_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            hold = time.perf_counter() - acquired_at
+            self._hold_ewma = hold if self._hold_ewma == 0.0 else (
+                _HOLD_EWMA_ALPHA * hold + (1 - _HOLD_EWMA_ALPHA) * self._hold_ewma)
+            self._release()
+
+    async def _acquire(self, kind: str):
+        priority = PRIORITIES[kind]
+        started_at = time.perf_counter()
+        if self._in_flight < self.max_in_flight and self._ahead(priority) == 0:
+            self._in_flight += 1
+        else:
+            self.admit(kind)
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+            self._queued += 1
+            metrics.LLM_QUEUE_DEPTH.set(self._queued)
+            try:
+                await asyncio.wait_for(future, timeout=self.queue_deadline_seconds)
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # Slot đã được chuyển giao đúng lúc bị huỷ: trả lại để không rò slot.
+                    self._release()
+                else:
+                    self._queued -= 1
+                    metrics.LLM_QUEUE_DEPTH.set(self._queued)
+                if isinstance(e, asyncio.TimeoutError):
+                    self._reject("deadline", self.queue_deadline_seconds)
+                raise
+        wait = time.perf_counter() - started_at
+        self._granted[kind] += 1
+        self._waits_ms.append(wait * 1000)
+        metrics.LLM_QUEUE_WAIT.observe(wait, kind=kind)
+        metrics.LLM_IN_FLIGHT.set(self._in_flight)
+
+    def _release(self):
+        # Chuyển slot trực tiếp cho người chờ có ưu tiên cao nhất (nếu có), nên `_in_flight` không đổi.
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                self._queued -= 1
+                metrics.LLM_QUEUE_DEPTH.set(self._queued)
+                return
+        self._in_flight -= 1
+        metrics.LLM_IN_FLIGHT.set(self._in_flight)
+
+    def stats(self) -> dict[str, Any]:
+        waits = sorted(self._waits_ms)
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_deadline_seconds": self.queue_deadline_seconds,
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "granted": dict(self._granted),
+            "rejected": dict(self._rejected),
+            "hold_seconds_ewma": self._hold_ewma,
+            "queue_wait_ms_avg": (sum(waits) / len(waits)) if waits else 0.0,
+            "queue_wait_ms_p95": waits[min(len(waits) - 1, int(0.95 * (len(waits) - 1) + 0.5))] if waits else 0.0,
+        }
@@ -1,12 +1,149 @@
 # app/logging_config.py
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
 import structlog
 from structlog.types import Processor
 
-def setup_logging():
+from . import metrics
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# --- CẤU HÌNH ---
+# "sync" (mặc định): render JSON và ghi stdout ngay trong luồng gọi log.
+# "async": luồng gọi chỉ đẩy bản ghi vào hàng đợi; một thread nền render và ghi ra stdout.
+LOG_MODE = os.getenv("LOG_MODE", "sync").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Khi hàng đợi đầy: "drop-debug" bỏ bản ghi dưới WARNING (WARNING trở lên vẫn chờ chỗ trống),
+# "block" luôn chờ (không mất log, nhưng request có thể bị chậm theo stdout).
+LOG_OVERFLOW = os.getenv("LOG_OVERFLOW", "drop-debug").lower()
+# Lấy mẫu các sự kiện INFO/DEBUG tần suất cao, JSON {"tên sự kiện": tỉ lệ giữ lại}; "*" áp dụng cho mọi sự kiện
+# còn lại. Ví dụ: LOG_SAMPLE_RATES='{"Request started": 0.1, "Request finished": 0.1}'. WARNING trở lên luôn được giữ.
+LOG_SAMPLE_RATES: dict[str, float] = json.loads(os.getenv("LOG_SAMPLE_RATES", "{}"))
+
+OVERFLOW_POLICIES = ("drop-debug", "block")
+
+LOG_RECORDS_DROPPED = metrics.REGISTRY.register(metrics.Counter(
+    "log_records_dropped_total", "Log records not written, by reason (sampled, overflow).", labelnames=("reason",),
+))
+
+# Handler/listener do setup_logging cài đặt, để gọi lại (ví dụ: sau khi fork worker) không nhân đôi handler.
+_installed: dict = {}
+
+
+class EventSampler:
+    """Processor của structlog: giữ lại ngẫu nhiên một tỉ lệ các sự kiện INFO/DEBUG theo tên sự kiện."""
+
+    def __init__(self, rates: dict[str, float]):
+        self.rates = dict(rates)
+        self.default_rate = self.rates.pop("*", 1.0)
+
+    def __call__(self, logger, method_name: str, event_dict):
+        if method_name in ("info", "debug"):
+            rate = self.rates.get(event_dict.get("event"), self.default_rate)
+            if rate < 1.0 and random.random() >= rate:
+                LOG_RECORDS_DROPPED.inc(reason="sampled")
+                raise structlog.DropEvent
+        return event_dict
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler không format trong luồng gọi (prepare() mặc định của QueueHandler render luôn bản ghi,
+    tức là vẫn tốn chi phí JSON trên hot path): bản ghi được đẩy nguyên vào hàng đợi, listener mới render.
+
+    Bản ghi của structlog đã đi qua các processor (kể cả merge_contextvars) trên luồng gọi. Bản ghi từ logging
+    chuẩn (uvicorn, thư viện) thì chưa: prepare() chụp contextvars (request_id, ...) và ghép message ngay trên
+    luồng gọi, vì thread của listener không thấy contextvars của request.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = LOG_OVERFLOW):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown log overflow policy: '{overflow}'")
+        super().__init__(log_queue)
+        self.overflow = overflow
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if not isinstance(record.msg, dict):
+            record.structlog_contextvars = structlog.contextvars.get_contextvars()
+            # Như QueueHandler gốc: args có thể bị thay đổi trước khi listener kịp format.
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == "drop-debug" and record.levelno < logging.WARNING:
+                LOG_RECORDS_DROPPED.inc(reason="overflow")
+                return
+            self.queue.put(record)
+
+
+def merge_record_contextvars(logger, method_name: str, event_dict):
+    """
+    merge_contextvars cho foreign_pre_chain: dùng contextvars đã chụp trên luồng gọi (BoundedQueueHandler.prepare)
+    nếu có, nếu không thì đọc contextvars hiện tại (chế độ sync, render ngay trên luồng gọi).
+    """
+    record = event_dict.get("_record")
+    captured = getattr(record, "structlog_contextvars", None)
+    if captured is None:
+        return structlog.contextvars.merge_contextvars(logger, method_name, event_dict)
+    for key, value in captured.items():
+        event_dict.setdefault(key, value)
+    return event_dict
+
+
+def _json_serializer(obj, **kwargs) -> str:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=str).decode()
+    # JSONRenderer đã truyền sẵn default= trong kwargs; chỉ đặt str khi thiếu.
+    kwargs.setdefault("default", str)
+    return json.dumps(obj, **kwargs)
+
+
+def build_formatter(shared_processors: list[Processor]) -> logging.Formatter:
+    # Processor cuối render bản ghi thành một chuỗi JSON (orjson nếu có, nhanh hơn json chuẩn nhiều lần).
+    return structlog.stdlib.ProcessorFormatter(
+        processor=structlog.processors.JSONRenderer(serializer=_json_serializer),
+        # Giữ lại các trường đã được thêm bởi các processor ở trên.
+        foreign_pre_chain=[
+            merge_record_contextvars if p is structlog.contextvars.merge_contextvars else p for p in shared_processors
+        ],
+    )
+
+
+def shutdown_logging():
+    """
+    Dừng listener nền sau khi ghi nốt các bản ghi còn trong hàng đợi; các bản ghi sau đó
+    được ghi đồng bộ qua stream handler.
+    """
+    listener = _installed.pop("listener", None)
+    if listener is None:
+        return
+    root_logger = logging.getLogger()
+    root_logger.removeHandler(_installed["handler"])
+    # Sau khi fork, thread của listener chỉ tồn tại ở tiến trình cha: không stop() ở tiến trình con.
+    if _installed.get("pid") == os.getpid():
+        listener.stop()
+    _installed["handler"] = listener.handlers[0]
+    root_logger.addHandler(_installed["handler"])
+
+
+def setup_logging(mode: str = LOG_MODE, stream=None):
     """
     Thiết lập hệ thống logging có cấu trúc cho toàn bộ ứng dụng.
+    Gọi lại nhiều lần (lifespan, app/serve.py trước và sau fork) sẽ thay handler cũ thay vì thêm handler mới.
     """
     # Các "bộ xử lý" (processors) định nghĩa cách mỗi bản ghi log được xây dựng.
     # Chúng được thực thi theo thứ tự, giống như một pipeline.
@@ -22,6 +159,9 @@ def setup_logging():
 
     structlog.configure(
         processors=[
+            # 0. Loại sớm các bản ghi dưới mức log và các sự kiện bị lấy mẫu bỏ, trước khi tốn công xây bản ghi.
+            structlog.stdlib.filter_by_level,
+            EventSampler(LOG_SAMPLE_RATES),
             *shared_processors,
             # 4. Chuẩn bị bản ghi để có thể được xử lý bởi logging tiêu chuẩn của Python.
             structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
@@ -32,22 +172,31 @@ def setup_logging():
         cache_logger_on_first_use=True,
     )
 
-    # Cấu hình formatter để render log cuối cùng.
-    # Chúng ta sẽ sử dụng JSONRenderer để tạo ra các log có cấu trúc.
-    formatter = structlog.stdlib.ProcessorFormatter(
-        # Processor này sẽ render bản ghi log thành một chuỗi JSON.
-        processor=structlog.processors.JSONRenderer(),
-        # Giữ lại các trường đã được thêm bởi các processor ở trên.
-        foreign_pre_chain=shared_processors,
-    )
-
     # Thiết lập handler để ghi log ra console (stdout).
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    stream_handler.setFormatter(build_formatter(shared_processors))
 
-    # Lấy root logger và thêm handler vào.
     root_logger = logging.getLogger()
+    shutdown_logging()
+    if (previous := _installed.pop("handler", None)) is not None:
+        root_logger.removeHandler(previous)
+
+    if mode == "async":
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        handler: logging.Handler = BoundedQueueHandler(log_queue)
+        listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+        listener.start()
+        _installed["listener"] = listener
+    elif mode == "sync":
+        handler = stream_handler
+    else:
+        raise ValueError(f"Unknown log mode: '{mode}'")
+    _installed.update(handler=handler, pid=os.getpid())
+
     root_logger.addHandler(handler)
-    root_logger.setLevel(logging.INFO) # Đặt mức log tối thiểu là INFO.
+    root_logger.setLevel(LOG_LEVEL)
+
+    print(f"✅ Structured logging setup complete. Logs will be in JSON format (mode={mode}, orjson={ORJSON_AVAILABLE}).")
+
 
-    print("✅ Structured logging setup complete. Logs will be in JSON format.")
\ No newline at end of file
+atexit.register(shutdown_logging)
@@ -1,44 +1,92 @@
 # app/main.py
+import asyncio
+import json
+import math
+import os
 import uuid
 import time
 from fastapi import FastAPI, Depends, HTTPException, Request # MỚI: Import Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 import structlog # MỚI: Import structlog
 
 # MỚI: Import hàm setup logging
-from .logging_config import setup_logging
-from .vector_store_client import db_client
+from .logging_config import setup_logging, shutdown_logging
+from .vector_store_client import get_db_client
 from .agent_service import AgentService
+from .llm_scheduler import LLMOverloadedError
+from . import http_clients, metrics, screening, streaming, tools
 
 # --- Global State ---
 agent_service_instance: AgentService | None = None
+# Trạng thái khởi tạo nền: "starting" -> "ready" (hoặc "failed"). /api/v1/ready dựa vào đây.
+startup_state = {"status": "starting", "error": None, "started_at": time.time(), "ready_at": None}
+_startup_task: asyncio.Task | None = None
 # MỚI: Khởi tạo logger cho file main
 logger = structlog.get_logger(__name__)
 
+
+async def initialize_services():
+    """Nạp mô hình (trong thread, hoặc lấy lại bản đã nạp trước khi fork), tạo AgentService rồi chạy warm-up."""
+    global agent_service_instance
+    await asyncio.to_thread(AgentService.preload)
+    agent_service_instance = AgentService(qdrant_client=get_db_client().async_client)
+    await agent_service_instance.warm_up()
+
+
+async def _startup():
+    try:
+        await initialize_services()
+    except Exception as e:
+        startup_state.update(status="failed", error=str(e))
+        logger.error("Service initialization failed", error=str(e), exc_info=True)
+        return
+    startup_state.update(status="ready", ready_at=time.time())
+    logger.info("Service ready", startup_seconds=round(startup_state["ready_at"] - startup_state["started_at"], 2))
+
+
+async def wait_until_ready():
+    """Chờ quá trình khởi tạo nền kết thúc (dùng cho script/benchmark chạy app trong cùng tiến trình)."""
+    if _startup_task is not None:
+        await asyncio.shield(_startup_task)
+
 # --- Lifespan Management ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global agent_service_instance
+    global agent_service_instance, _startup_task
     
     # MỚI: Gọi hàm setup logging ngay khi ứng dụng khởi động
     setup_logging()
     
     logger.info("Application startup: Initializing services...")
     
-    if not db_client.check_connection():
+    if not get_db_client().check_connection():
         logger.error("Fatal: Could not connect to Qdrant. Please check the service.")
         raise RuntimeError("Fatal: Could not connect to Qdrant. Please check the service.")
     logger.info("Qdrant connection verified.")
+
+    # Connection pool dùng chung (HTTP/2, keep-alive) cho các dịch vụ phân tích bên ngoài.
+    await http_clients.init_http_clients()
     
-    agent_service_instance = AgentService(qdrant_client=db_client.client)
+    # Nạp mô hình và warm-up chạy nền: server nhận kết nối ngay (/health xanh), /ready báo khi sẵn sàng phục vụ.
+    startup_state.update(status="starting", error=None, started_at=time.time(), ready_at=None)
+    _startup_task = asyncio.create_task(_startup())
     
     yield
     
     logger.info("Application shutdown.")
+    if not _startup_task.done():
+        _startup_task.cancel()
+        await asyncio.gather(_startup_task, return_exceptions=True)
+    if agent_service_instance is not None:
+        agent_service_instance.shutdown()
+    await http_clients.close_http_clients()
+    await get_db_client().close()
     agent_service_instance = None
+    # Ghi nốt các bản ghi log còn trong hàng đợi (LOG_MODE=async).
+    shutdown_logging()
 
 # --- App Instance ---
 app = FastAPI(
@@ -81,7 +129,7 @@ class ChatRequest(BaseModel):
 
 # --- Dependency Injection ---
 def get_agent_service() -> AgentService:
-    if agent_service_instance is None:
+    if agent_service_instance is None or startup_state["status"] != "ready":
         raise HTTPException(status_code=503, detail="Service not available.")
     return agent_service_instance
 
@@ -90,6 +138,28 @@ def get_agent_service() -> AgentService:
 def get_health():
     return {"status": "ok"}
 
+@app.get("/api/v1/ready", tags=["Monitoring"])
+def get_ready():
+    """Readiness: 200 khi mô hình đã nạp và warm-up xong, 503 trong lúc khởi tạo hoặc nếu khởi tạo thất bại."""
+    body = {**startup_state, "pid": os.getpid()}
+    if startup_state["status"] != "ready":
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@app.get("/api/v1/stats", tags=["Monitoring"])
+def get_stats(agent_service: AgentService = Depends(get_agent_service)):
+    """Thống kê nội bộ (micro-batching, ...) để tinh chỉnh độ trễ/thông lượng."""
+    return {
+        **agent_service.get_stats(),
+        "http_endpoints": http_clients.get_stats(),
+        "tool_caches": tools.get_cache_stats(),
+    }
+
+@app.get("/api/v1/metrics", tags=["Monitoring"], response_class=PlainTextResponse)
+def get_metrics():
+    """Metrics theo định dạng Prometheus: độ trễ từng giai đoạn, TTFT, tokens/s, lựa chọn công cụ, fallback."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/api/v1/chat", tags=["Chat"])
 async def post_chat_stream(
     request: ChatRequest,
@@ -97,15 +167,61 @@ async def post_chat_stream(
 ):
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty.")
+
+    # Từ chối sớm (trước khi mở stream) nếu LLM đang quá tải, để client có thể thử lại theo Retry-After.
+    try:
+        agent_service.llm_scheduler.admit()
+    except LLMOverloadedError as e:
+        raise HTTPException(
+            status_code=429 if e.reason == "queue_full" else 503,
+            detail="LLM is overloaded, please retry later.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
         
     try:
         # Gán câu hỏi vào context log để nó xuất hiện trong tất cả các log liên quan
         structlog.contextvars.bind_contextvars(user_question=request.question)
         
         token_generator: AsyncGenerator[str, None] = agent_service.execute_agent_stream(request.question)
-        return StreamingResponse(token_generator, media_type="text/event-stream")
+        # Sự kiện SSE (status/token/error/done), token được gộp theo cửa sổ thời gian/kích thước.
+        # Client ngắt kết nối -> generator bị đóng -> LLM và công cụ đang chạy bị huỷ.
+        return StreamingResponse(
+            streaming.sse_events(token_generator),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     except Exception as e:
         # Log lỗi với đầy đủ thông tin
         logger.error("Chat endpoint error", error=str(e), exc_info=True)
-        raise HTTPException(status_code=500, detail="An internal server error occurred.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An internal server error occurred.")
+
+@app.post("/api/v1/screen", tags=["Screening"])
+async def post_screen(request: Request):
+    """
+    Sàng lọc hàng loạt địa chỉ qua Anomaly Detection API (không dùng LLM), trả về NDJSON theo thứ tự hoàn thành.
+    Body: JSON {"addresses": [...]} hoặc danh sách JSON, hoặc file CSV gửi thẳng (Content-Type: text/csv hay text/plain).
+    """
+    body = (await request.body()).decode("utf-8", errors="replace")
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "json" in content_type:
+            payload = json.loads(body)
+            addresses = payload.get("addresses") if isinstance(payload, dict) else payload
+            if not isinstance(addresses, list):
+                raise ValueError("expected a list of addresses")
+        else:
+            addresses = screening.parse_address_csv(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request body: {e}")
+    if not addresses:
+        raise HTTPException(status_code=400, detail="No addresses provided.")
+    if len(addresses) > screening.SCREEN_MAX_ADDRESSES:
+        raise HTTPException(status_code=413,
+                            detail=f"Too many addresses (max {screening.SCREEN_MAX_ADDRESSES} per request).")
+
+    async def ndjson_lines():
+        async for result in screening.screen_addresses(addresses):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
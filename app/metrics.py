@@ -0,0 +1,209 @@
+# app/metrics.py
+# Metrics dạng Prometheus (text exposition format 0.0.4) viết tay, không cần thêm thư viện.
+# Mỗi lần ghi nhận chỉ là một phép bisect và vài phép cộng trên dict, đủ rẻ để gọi trên hot path.
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+# Bucket mặc định cho độ trễ (giây): từ vài mili-giây (cache, rule router) đến hàng chục giây (LLM).
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in list(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Gauge; có thể truyền `callback` để đọc giá trị tại thời điểm scrape (ví dụ: độ sâu hàng đợi)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 callback: Callable[[], float] | None = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._callback = callback
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list[str]:
+        if self._callback is not None:
+            return [f"{self.name} {_format_value(self._callback())}"]
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in list(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Mỗi nhãn: [đếm theo bucket (không cộng dồn, phần tử cuối là +Inf), tổng, số lần].
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ==============================================================================
+# Metric của agent
+# ==============================================================================
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "agent_stage_duration_seconds",
+    "Duration of agent pipeline stages (router, embed, search, rerank, synthesis).",
+    labelnames=("stage",),
+))
+TOOL_DURATION = REGISTRY.register(Histogram(
+    "agent_tool_duration_seconds", "Duration of tool execution, by tool.", labelnames=("tool",),
+))
+TIME_TO_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "agent_time_to_first_token_seconds", "Time from request start to the first answer token.",
+))
+STREAM_DURATION = REGISTRY.register(Histogram(
+    "agent_stream_duration_seconds", "Total duration of an agent stream.", labelnames=("outcome",),
+))
+TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "agent_tokens_per_second", "Answer generation rate after the first token.",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300),
+))
+TOOL_CHOICES = REGISTRY.register(Counter(
+    "agent_tool_choices_total", "Router decisions, by tool and router tier.", labelnames=("tool", "tier"),
+))
+FALLBACKS = REGISTRY.register(Counter(
+    "agent_fallbacks_total", "Fallbacks taken by the agent, by kind.", labelnames=("kind",),
+))
+LLM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "llm_in_flight", "LLM calls currently holding a scheduler slot.",
+))
+LLM_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "llm_queue_depth", "LLM calls waiting for a scheduler slot.",
+))
+LLM_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "llm_queue_wait_seconds", "Time spent waiting for an LLM scheduler slot, by call kind.", labelnames=("kind",),
+))
+LLM_REJECTIONS = REGISTRY.register(Counter(
+    "llm_rejections_total", "LLM calls rejected by the scheduler, by reason.", labelnames=("reason",),
+))
+COALESCED_REQUESTS = REGISTRY.register(Counter(
+    "agent_coalesced_requests_total", "Chat requests served by joining an identical in-flight stream.",
+))
+CONTEXT_TOKENS = REGISTRY.register(Histogram(
+    "agent_context_tokens", "Synthesizer context size in tokens after assembly, by tool.", labelnames=("tool",),
+    buckets=(50, 100, 200, 400, 600, 800, 1000, 1500, 2000, 4000),
+))
+CONTEXT_TOKENS_SAVED = REGISTRY.register(Counter(
+    "agent_context_tokens_saved_total", "Context tokens removed by deduplication and budget trimming, by tool.",
+    labelnames=("tool",),
+))
+STREAM_DISCONNECTS = REGISTRY.register(Counter(
+    "agent_stream_disconnects_total", "Chat streams closed by the client before completion (upstream cancelled).",
+))
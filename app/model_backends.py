@@ -0,0 +1,110 @@
+# app/model_backends.py
+import importlib.util
+import os
+import shutil
+from typing import TYPE_CHECKING
+
+import structlog
+
+# sentence_transformers (kéo theo torch, transformers) chỉ được import khi thực sự nạp mô hình,
+# để các tiến trình/đường dẫn không cần mô hình (stub, script, kiểm tra cấu hình) khởi động nhanh.
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.cross_encoder import CrossEncoder
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Backend suy luận trên CPU: "torch" (mặc định), "onnx" (ONNX Runtime) hoặc "onnx-int8" (ONNX lượng tử hoá động int8).
+# ONNX cần cài thêm: pip install "sentence-transformers[onnx]".
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+# Cho phép chọn riêng cho từng mô hình (ví dụ: int8 cho cross-encoder nhưng giữ embedding khớp với dữ liệu đã ingest).
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", INFERENCE_BACKEND).lower()
+CROSS_ENCODER_BACKEND = os.getenv("CROSS_ENCODER_BACKEND", INFERENCE_BACKEND).lower()
+# Thư mục cache các mô hình đã chuyển đổi, để việc export chỉ chạy một lần.
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", "app/data/models")
+# Cấu hình lượng tử hoá theo tập lệnh CPU: "arm64", "avx2", "avx512", "avx512_vnni".
+ONNX_QUANTIZATION_CONFIG = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2")
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# Chỉ kiểm tra sự tồn tại (không import) để khởi động nhanh khi dùng PyTorch.
+ONNX_AVAILABLE = all(importlib.util.find_spec(m) is not None for m in ("onnxruntime", "optimum"))
+
+# Mô hình đã nạp trong tiến trình này, theo (lớp, tên mô hình, backend). app/serve.py nạp trước ở tiến trình cha
+# rồi mới fork các worker, nên trọng số được chia sẻ copy-on-write thay vì mỗi worker giữ một bản.
+_LOADED: dict[tuple[str, str, str], object] = {}
+
+
+def export_path(model_name: str, export_dir: str = MODEL_EXPORT_DIR) -> str:
+    return os.path.join(export_dir, model_name.replace("/", "__"))
+
+
+def quantized_file_name(quantization_config: str = ONNX_QUANTIZATION_CONFIG) -> str:
+    return f"onnx/model_qint8_{quantization_config}.onnx"
+
+
+def _export_onnx(model_cls, model_name: str, path: str):
+    """Chuyển mô hình sang ONNX và lưu vào cache (ghi ra thư mục tạm rồi đổi tên, tránh cache dở dang)."""
+    if os.path.exists(os.path.join(path, "onnx", "model.onnx")):
+        return
+    logger.info("Exporting model to ONNX", model=model_name, path=path)
+    model = model_cls(model_name, backend="onnx")
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    model.save_pretrained(tmp_path)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+def _export_quantized(model_cls, path: str, quantization_config: str):
+    if os.path.exists(os.path.join(path, quantized_file_name(quantization_config))):
+        return
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    logger.info("Quantizing ONNX model to int8", path=path, quantization_config=quantization_config)
+    export_dynamic_quantized_onnx_model(model_cls(path, backend="onnx"), quantization_config, path)
+
+
+def load_model(model_cls, model_name: str, backend: str, export_dir: str = MODEL_EXPORT_DIR,
+               quantization_config: str = ONNX_QUANTIZATION_CONFIG):
+    """
+    Tải SentenceTransformer hoặc CrossEncoder với backend đã chọn.
+    Lần đầu dùng backend ONNX, mô hình được export (và lượng tử hoá nếu cần) vào `export_dir`;
+    các lần sau chỉ nạp từ cache. Nếu thiếu thư viện ONNX, quay về PyTorch.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: '{backend}'. Expected one of {BACKENDS}.")
+    if backend != "torch" and not ONNX_AVAILABLE:
+        logger.warning("ONNX backend unavailable (install sentence-transformers[onnx]), falling back to PyTorch",
+                       model=model_name, backend=backend)
+        backend = "torch"
+    if backend == "torch":
+        return model_cls(model_name)
+
+    path = export_path(model_name, export_dir)
+    _export_onnx(model_cls, model_name, path)
+    if backend == "onnx":
+        return model_cls(path, backend="onnx")
+    _export_quantized(model_cls, path, quantization_config)
+    return model_cls(path, backend="onnx", model_kwargs={"file_name": quantized_file_name(quantization_config)})
+
+
+def _load_shared(model_cls, model_name: str, backend: str, **kwargs):
+    key = (model_cls.__name__, model_name, backend)
+    if key not in _LOADED:
+        _LOADED[key] = load_model(model_cls, model_name, backend, **kwargs)
+    else:
+        logger.info("Using preloaded model", model=model_name, backend=backend)
+    return _LOADED[key]
+
+
+def load_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND, **kwargs) -> "SentenceTransformer":
+    from sentence_transformers import SentenceTransformer
+
+    return _load_shared(SentenceTransformer, model_name, backend, **kwargs)
+
+
+def load_cross_encoder(model_name: str, backend: str = CROSS_ENCODER_BACKEND, **kwargs) -> "CrossEncoder":
+    from sentence_transformers.cross_encoder import CrossEncoder
+
+    return _load_shared(CrossEncoder, model_name, backend, **kwargs)
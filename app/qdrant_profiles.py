@@ -0,0 +1,119 @@
+# app/qdrant_profiles.py
+# Các profile cấu hình collection của Qdrant, áp dụng lúc ingest (scripts/ingest_data.py) và đọc lại lúc truy vấn
+# (app/agent_service.py) để dùng đúng tham số tìm kiếm. Chọn bằng QDRANT_COLLECTION_PROFILE:
+#   - "default":     vector float32 trong RAM, HNSW mặc định (như trước).
+#   - "int8":        thêm lượng tử hoá vô hướng int8 (giữ trong RAM, ~1/4 bộ nhớ vector); tìm trên int8 rồi
+#                    chấm lại (rescore) top ứng viên bằng vector gốc để giữ recall.
+#   - "int8-ondisk": như "int8", nhưng vector gốc và đồ thị HNSW nằm trên đĩa (mmap); RAM chủ yếu chỉ còn
+#                    bản int8. Rescore đọc vector gốc từ đĩa, nên cần SSD.
+# Mọi profile đều tạo payload index kiểu keyword trên `source` để lọc theo nguồn tài liệu không phải quét toàn bộ.
+import os
+from dataclasses import dataclass
+
+from qdrant_client import models
+
+# --- CẤU HÌNH ---
+QDRANT_COLLECTION_PROFILE = os.getenv("QDRANT_COLLECTION_PROFILE", "default")
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+# ef lúc tìm kiếm; 0 = để Qdrant tự chọn.
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "0"))
+# Hệ số lấy dư ứng viên trên int8 trước khi rescore (limit * oversampling).
+QDRANT_QUANTIZATION_OVERSAMPLING = float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0"))
+PAYLOAD_INDEXES = {"source": models.PayloadSchemaType.KEYWORD}
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    name: str
+    quantized: bool = False
+    vectors_on_disk: bool = False
+    hnsw_on_disk: bool = False
+
+    def vectors_config(self, size: int) -> models.VectorParams:
+        return models.VectorParams(size=size, distance=models.Distance.COSINE, on_disk=self.vectors_on_disk)
+
+    def hnsw_config(self) -> models.HnswConfigDiff:
+        return models.HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT, on_disk=self.hnsw_on_disk)
+
+    def quantization_config(self) -> models.ScalarQuantization | None:
+        if not self.quantized:
+            return None
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+
+    def search_params(self) -> models.SearchParams | None:
+        quantization = (
+            models.QuantizationSearchParams(rescore=True, oversampling=QDRANT_QUANTIZATION_OVERSAMPLING)
+            if self.quantized else None
+        )
+        if quantization is None and not QDRANT_HNSW_EF:
+            return None
+        return models.SearchParams(hnsw_ef=QDRANT_HNSW_EF or None, quantization=quantization)
+
+    def estimated_ram_bytes(self, points: int, size: int) -> int:
+        """Ước lượng RAM của collection (vector + chỉ mục HNSW), bỏ qua payload."""
+        total = 0 if self.vectors_on_disk else points * size * 4
+        if self.quantized:
+            total += points * size
+        if not self.hnsw_on_disk:
+            # Mỗi điểm giữ ~2*m liên kết (4 byte) ở tầng 0.
+            total += points * QDRANT_HNSW_M * 2 * 4
+        return total
+
+
+PROFILES = {
+    "default": CollectionProfile("default"),
+    "int8": CollectionProfile("int8", quantized=True),
+    "int8-ondisk": CollectionProfile("int8-ondisk", quantized=True, vectors_on_disk=True, hnsw_on_disk=True),
+}
+
+
+def get_profile(name: str = QDRANT_COLLECTION_PROFILE) -> CollectionProfile:
+    if name not in PROFILES:
+        raise ValueError(f"Unknown Qdrant collection profile: '{name}'. Choose from {list(PROFILES)}")
+    return PROFILES[name]
+
+
+def create_collection(client, collection_name: str, size: int, profile: CollectionProfile):
+    """Tạo lại collection theo profile (client đồng bộ) kèm payload index."""
+    client.recreate_collection(
+        collection_name=collection_name,
+        vectors_config=profile.vectors_config(size),
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config(),
+    )
+    ensure_payload_indexes(client, collection_name)
+
+
+def apply_profile(client, collection_name: str, profile: CollectionProfile):
+    """
+    Áp profile lên collection đã tồn tại mà không ingest lại: Qdrant xây lại chỉ mục/lượng tử hoá ở nền.
+    Chuyển từ profile có lượng tử hoá về "default" thì tắt lượng tử hoá.
+    """
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=profile.vectors_on_disk)},
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config() or models.Disabled.DISABLED,
+    )
+    ensure_payload_indexes(client, collection_name)
+
+
+def profile_matches(client, collection_name: str, profile: CollectionProfile) -> bool:
+    """Cấu hình hiện tại của collection đã khớp profile chưa (để không kích hoạt xây lại chỉ mục vô ích)."""
+    config = client.get_collection(collection_name=collection_name).config
+    hnsw = config.hnsw_config
+    return (
+        (config.quantization_config is not None) == profile.quantized
+        and bool(config.params.vectors.on_disk) == profile.vectors_on_disk
+        and (hnsw.m, hnsw.ef_construct, bool(hnsw.on_disk)) == (QDRANT_HNSW_M, QDRANT_HNSW_EF_CONSTRUCT, profile.hnsw_on_disk)
+    )
+
+
+def ensure_payload_indexes(client, collection_name: str):
+    existing = client.get_collection(collection_name=collection_name).payload_schema or {}
+    for field_name, schema in PAYLOAD_INDEXES.items():
+        if field_name not in existing:
+            client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=schema)
@@ -0,0 +1,112 @@
+# app/reranking.py
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from .cache import MemoryBackend
+
+# --- CẤU HÌNH ---
+# Chính sách re-rank thích ứng: bỏ qua hoặc thu nhỏ lượt chấm điểm cross-encoder khi điểm dense đã đủ rõ ràng.
+ADAPTIVE_RERANK_ENABLED = os.getenv("ADAPTIVE_RERANK_ENABLED", "false").lower() == "true"
+# Bỏ qua re-rank nếu khoảng cách điểm cosine giữa ứng viên thứ k và thứ k+1 (k = số tài liệu ngữ cảnh) đủ lớn...
+RERANK_SKIP_GAP = float(os.getenv("RERANK_SKIP_GAP", "0.15"))
+# ...và ứng viên thứ k cũng đủ liên quan.
+RERANK_SKIP_MIN_SCORE = float(os.getenv("RERANK_SKIP_MIN_SCORE", "0.5"))
+# Khi không bỏ qua: chỉ re-rank các ứng viên có điểm trong khoảng này so với ứng viên tốt nhất.
+RERANK_SHRINK_WINDOW = float(os.getenv("RERANK_SHRINK_WINDOW", "0.2"))
+# Cache điểm cross-encoder theo (câu hỏi đã chuẩn hoá, point ID). ID điểm được băm từ nội dung chunk
+# (xem scripts/ingest_data.py) nên không cần vô hiệu hoá khi ingest lại. 0 = tắt.
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "10000"))
+
+
+@dataclass
+class RerankPlan:
+    decision: str  # "full" | "shrunk" | "skipped"
+    to_score: list = field(default_factory=list)
+    # Ứng viên giữ nguyên thứ tự dense, xếp sau các ứng viên đã re-rank.
+    tail: list = field(default_factory=list)
+
+
+class AdaptiveReranker:
+    """
+    Quyết định có chạy cross-encoder hay không, trên bao nhiêu ứng viên, và cache điểm đã tính.
+
+    Chính sách chỉ áp dụng khi mọi ứng viên có điểm dense (ScoredPoint từ Qdrant); danh sách đã gộp
+    bằng RRF ở chế độ hybrid không có thang điểm chung nên luôn được re-rank đầy đủ.
+    """
+
+    def __init__(
+        self,
+        final_count: int,
+        enabled: bool = ADAPTIVE_RERANK_ENABLED,
+        skip_gap: float = RERANK_SKIP_GAP,
+        skip_min_score: float = RERANK_SKIP_MIN_SCORE,
+        shrink_window: float = RERANK_SHRINK_WINDOW,
+        cache_max_entries: int = RERANK_CACHE_MAX_ENTRIES,
+    ):
+        self.final_count = final_count
+        self.enabled = enabled
+        self.skip_gap = skip_gap
+        self.skip_min_score = skip_min_score
+        self.shrink_window = shrink_window
+        self._cache = MemoryBackend(max_entries=cache_max_entries) if cache_max_entries > 0 else None
+        self._stats = {"full": 0, "shrunk": 0, "skipped": 0, "candidates": 0,
+                       "pairs_scored": 0, "pairs_cached": 0, "pairs_avoided": 0}
+
+    def plan(self, documents: list) -> RerankPlan:
+        self._stats["candidates"] += len(documents)
+        scores = [getattr(doc, "score", None) for doc in documents]
+        k = self.final_count
+        if not self.enabled or len(documents) <= k or any(s is None for s in scores):
+            return self._record(RerankPlan("full", to_score=list(documents)), len(documents))
+
+        # Qdrant trả về ứng viên theo điểm giảm dần.
+        if scores[k - 1] >= self.skip_min_score and scores[k - 1] - scores[k] >= self.skip_gap:
+            return self._record(RerankPlan("skipped", tail=list(documents)), len(documents))
+
+        cutoff = scores[0] - self.shrink_window
+        # Luôn giữ ít nhất k + 1 ứng viên để cross-encoder còn có thể thay đổi top-k.
+        keep = max(k + 1, sum(1 for s in scores if s >= cutoff))
+        if keep < len(documents):
+            return self._record(RerankPlan("shrunk", to_score=documents[:keep], tail=documents[keep:]), len(documents))
+        return self._record(RerankPlan("full", to_score=list(documents)), len(documents))
+
+    def _record(self, plan: RerankPlan, total: int) -> RerankPlan:
+        self._stats[plan.decision] += 1
+        self._stats["pairs_avoided"] += total - len(plan.to_score)
+        return plan
+
+    def cached_scores(self, question: str, point_ids: list[Any]) -> dict[Any, float]:
+        if self._cache is None:
+            return {}
+        key_prefix = _normalize_question(question)
+        found = {}
+        for point_id in point_ids:
+            entry = self._cache.get(f"{key_prefix}\x1f{point_id}")
+            if entry is not None:
+                found[point_id] = entry[0]
+        self._stats["pairs_cached"] += len(found)
+        return found
+
+    def store_scores(self, question: str, scores: dict[Any, float]):
+        self._stats["pairs_scored"] += len(scores)
+        if self._cache is None:
+            return
+        key_prefix = _normalize_question(question)
+        for point_id, score in scores.items():
+            self._cache.set(f"{key_prefix}\x1f{point_id}", score, float("inf"))
+
+    def stats(self) -> dict:
+        decisions = self._stats["full"] + self._stats["shrunk"] + self._stats["skipped"]
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "skip_rate": (self._stats["skipped"] / decisions) if decisions else 0.0,
+            "shrink_rate": (self._stats["shrunk"] / decisions) if decisions else 0.0,
+            "cache_entries": len(self._cache) if self._cache is not None else 0,
+        }
+
+
+def _normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower()
@@ -0,0 +1,227 @@
+# app/risk_table.py
+import json
+import os
+import time
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+import structlog
+
+from . import metrics
+from .graph_engine import ADDRESS_DTYPE, _META_FILE, encode_addresses, write_index_dir
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Bảng điểm rủi ro chấm trước (offline) do scripts/build_risk_table.py tạo ra. Không có bảng thì mọi địa chỉ
+# đều hỏi Anomaly Detection API như trước.
+RISK_TABLE_DIR = os.getenv("RISK_TABLE_DIR", "app/data/risk_table")
+# Điểm cũ hơn khoảng này (tính từ lúc chấm) coi như hết hạn và được hỏi lại dịch vụ; 0 = không bao giờ hết hạn.
+RISK_TABLE_MAX_AGE_SECONDS = float(os.getenv("RISK_TABLE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+# Địa chỉ S20 sắp xếp tăng dần, chia 65536 bucket theo 2 byte đầu: một lần tra chỉ tìm nhị phân trong
+# bucket của nó (~N/65536 phần tử, vài trang bộ nhớ) thay vì trên toàn bảng.
+_BUCKET_COUNT = 1 << 16
+_ARRAYS = ("addresses", "bucket_offsets", "probability", "label", "scored_at")
+
+RISK_TABLE_LOOKUPS = metrics.REGISTRY.register(metrics.Counter(
+    "risk_table_lookups_total", "Precomputed risk table lookups, by result (hit, miss, stale).", labelnames=("result",),
+))
+
+
+def _bucket_offsets(addresses: np.ndarray) -> np.ndarray:
+    first_bytes = addresses.view(np.uint8).reshape(-1, 20)[:, :2].astype(np.int64)
+    buckets = (first_bytes[:, 0] << 8) | first_bytes[:, 1]
+    offsets = np.zeros(_BUCKET_COUNT + 1, dtype=np.int64)
+    np.cumsum(np.bincount(buckets, minlength=_BUCKET_COUNT), out=offsets[1:])
+    return offsets
+
+
+def build_risk_table(addresses: np.ndarray, probability: np.ndarray, labels: np.ndarray, scored_at: np.ndarray,
+                     out_dir: str = RISK_TABLE_DIR) -> dict[str, Any]:
+    """
+    Xây bảng điểm rủi ro từ các cột đã mã hoá S20. Địa chỉ trùng lặp giữ bản chấm mới nhất.
+    Nhãn (prediction) được mã hoá thành uint8, danh sách nhãn nằm trong meta.json.
+    """
+    started_at = time.perf_counter()
+    scored_at = np.asarray(scored_at, dtype=np.uint32)
+    # Sắp xếp giảm dần theo thời điểm chấm: np.unique(return_index) giữ lần xuất hiện đầu = bản mới nhất.
+    newest_first = np.argsort(scored_at, kind="stable")[::-1]
+    unique, first = np.unique(np.ascontiguousarray(addresses, dtype=ADDRESS_DTYPE)[newest_first], return_index=True)
+    keep = newest_first[first]
+    names, codes = np.unique(np.asarray(labels, dtype=str)[keep], return_inverse=True)
+    if len(names) > 255:
+        raise ValueError(f"Too many distinct labels for a risk table: {len(names)} (max 255)")
+
+    arrays = {
+        "addresses": unique,
+        "bucket_offsets": _bucket_offsets(unique),
+        "probability": np.asarray(probability, dtype=np.float32)[keep],
+        "label": codes.astype(np.uint8),
+        "scored_at": scored_at[keep],
+    }
+    meta = {
+        "rows": int(len(unique)),
+        "labels": names.tolist(),
+        "oldest_scored_at": int(arrays["scored_at"].min()) if len(unique) else None,
+        "newest_scored_at": int(arrays["scored_at"].max()) if len(unique) else None,
+        "built_at": time.time(),
+        "build_seconds": round(time.perf_counter() - started_at, 3),
+    }
+    write_index_dir(arrays, meta, out_dir)
+    logger.info("Risk table built", path=out_dir, duplicates=int(len(addresses) - len(unique)), **meta)
+    return meta
+
+
+class RiskTable:
+    """
+    Tra điểm rủi ro trên các mảng ánh xạ bộ nhớ (np.load mmap_mode="r"): chỉ các trang bucket thực sự được đọc
+    mới nằm trong RAM, và nhiều worker dùng chung page cache của hệ điều hành.
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray], meta: dict[str, Any]):
+        self.meta = meta
+        self.labels = meta["labels"]
+        # np.asarray: view ndarray thường trên cùng vùng mmap; cắt/đọc np.memmap chậm hơn vài lần trên hot path.
+        self.addresses = np.asarray(arrays["addresses"])
+        self.bucket_offsets = np.asarray(arrays["bucket_offsets"])
+        self.probability = np.asarray(arrays["probability"])
+        self.label = np.asarray(arrays["label"])
+        self.scored_at = np.asarray(arrays["scored_at"])
+        self._raw = memoryview(self.addresses.view(np.uint8).reshape(-1))
+
+    @classmethod
+    def open(cls, path: str = RISK_TABLE_DIR) -> "RiskTable":
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+        with open(os.path.join(path, _META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(arrays, meta)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    def find(self, address: str) -> int | None:
+        if len(address) != 42 or address[:2] not in ("0x", "0X"):
+            return None
+        try:
+            raw = bytes.fromhex(address[2:])
+        except ValueError:
+            return None
+        bucket = (raw[0] << 8) | raw[1]
+        start, end = int(self.bucket_offsets[bucket]), int(self.bucket_offsets[bucket + 1])
+        # Bucket chỉ vài trăm địa chỉ (vài KB) kể cả với hàng chục triệu dòng: tìm chuỗi con trên bytes của bucket
+        # (memmem) nhanh hơn tìm nhị phân qua numpy, vốn tốn vài micro-giây chi phí gọi mỗi lần.
+        block = bytes(self._raw[start * 20:end * 20])
+        offset = block.find(raw)
+        while offset > 0 and offset % 20:
+            offset = block.find(raw, offset + 1)
+        return start + offset // 20 if offset >= 0 else None
+
+    def find_many(self, addresses: Iterable[str]) -> np.ndarray:
+        """Tra hàng loạt (vector hoá): vị trí của từng địa chỉ trong bảng, -1 nếu không có hoặc không hợp lệ."""
+        encoded, valid = encode_addresses(addresses)
+        result = np.full(len(valid), -1, dtype=np.int64)
+        if len(self.addresses) and len(encoded):
+            positions = np.minimum(np.searchsorted(self.addresses, encoded), len(self.addresses) - 1)
+            found = np.asarray(self.addresses[positions]) == encoded
+            result[np.flatnonzero(valid)[found]] = positions[found]
+        return result
+
+    def entry(self, i: int) -> dict[str, Any]:
+        """Cùng dạng kết quả với Anomaly Detection API, kèm thời điểm chấm (epoch giây)."""
+        return {
+            "prediction": self.labels[int(self.label[i])],
+            "probability_fraud": float(self.probability[i]),
+            "scored_at": int(self.scored_at[i]),
+        }
+
+
+class RiskTableFile:
+    """Giữ bảng đã mở, tự mở lại khi bảng trên đĩa được xây lại (meta.json thay đổi), và đếm hit/miss/stale."""
+
+    def __init__(self, path: str = RISK_TABLE_DIR, max_age_seconds: float = RISK_TABLE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self._mtime: float | None = None
+        self._checked_at = float("-inf")
+        self._table: RiskTable | None = None
+        self._stats = {"hits": 0, "misses": 0, "stale": 0}
+
+    def get(self) -> RiskTable | None:
+        # Kiểm tra meta.json tối đa mỗi giây một lần: os.stat đắt ngang cả một lần tra bảng.
+        now = time.monotonic()
+        if now - self._checked_at < 1.0:
+            return self._table
+        self._checked_at = now
+        try:
+            mtime = os.stat(os.path.join(self.path, _META_FILE)).st_mtime
+        except FileNotFoundError:
+            self._table, self._mtime = None, None
+            return None
+        if mtime != self._mtime:
+            self._table = RiskTable.open(self.path)
+            self._mtime = mtime
+            logger.info("Risk table loaded", path=self.path, **self._table.meta)
+        return self._table
+
+    def lookup(self, address: str) -> dict[str, Any] | None:
+        """Điểm đã chấm trước của địa chỉ, hoặc None nếu không có bảng, không có địa chỉ hay điểm đã hết hạn."""
+        table = self.get()
+        if table is None:
+            return None
+        i = table.find(address)
+        if i is None:
+            result = "misses"
+        elif self.max_age_seconds and time.time() - int(table.scored_at[i]) > self.max_age_seconds:
+            result = "stale"
+        else:
+            result = "hits"
+        self._stats[result] += 1
+        RISK_TABLE_LOOKUPS.inc(result={"hits": "hit", "misses": "miss", "stale": "stale"}[result])
+        return table.entry(i) if result == "hits" else None
+
+    def stats(self) -> dict[str, Any]:
+        lookups = sum(self._stats.values())
+        return {
+            **self._stats,
+            "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+            "entries": len(self._table) if self._table is not None else 0,
+            "max_age_seconds": self.max_age_seconds,
+        }
+
+
+def iter_score_chunks(path: str, columns: dict[str, str], chunk_rows: int = 1_000_000,
+                      default_scored_at: int | None = None) -> Iterator[tuple[np.ndarray, ...]]:
+    """
+    Đọc điểm đã chấm từ CSV, Parquet (cần pyarrow) hoặc NDJSON (ví dụ: đầu ra của /api/v1/screen, chỉ lấy
+    các dòng status "ok"), trả về (addresses, probability, labels, scored_at) đã mã hoá.
+    `columns` ánh xạ tên chuẩn ("address", "prediction", "probability", "scored_at") sang tên cột trong file;
+    thiếu cột scored_at thì dùng `default_scored_at` (mặc định: bây giờ).
+    """
+    import pandas as pd
+
+    if default_scored_at is None:
+        default_scored_at = int(time.time())
+    if path.endswith(".parquet"):
+        frames: Iterable = [pd.read_parquet(path)]
+    elif path.endswith((".ndjson", ".jsonl")):
+        frames = pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False)
+    else:
+        frames = pd.read_csv(path, chunksize=chunk_rows, dtype={columns["address"]: str, columns["prediction"]: str})
+    for frame in frames:
+        if "status" in frame.columns:
+            frame = frame[frame["status"] == "ok"]
+        addresses, valid = encode_addresses(frame[columns["address"]].to_numpy())
+        probability = pd.to_numeric(frame[columns["probability"]], errors="coerce").fillna(-1).to_numpy(dtype=np.float32)
+        labels = frame[columns["prediction"]].fillna("Không xác định").astype(str).to_numpy()
+        if columns["scored_at"] in frame.columns:
+            ts_col = frame[columns["scored_at"]]
+            if not pd.api.types.is_numeric_dtype(ts_col):
+                ts_col = pd.to_datetime(ts_col, errors="coerce", utc=True).astype("int64") // 10**9
+            scored_at = ts_col.fillna(default_scored_at).to_numpy(dtype=np.int64)
+        else:
+            scored_at = np.full(len(frame), default_scored_at, dtype=np.int64)
+        dropped = int((~valid).sum())
+        if dropped:
+            logger.warning("Dropped scores with invalid addresses", path=path, dropped=dropped)
+        yield addresses, probability[valid], labels[valid], scored_at[valid]
@@ -0,0 +1,172 @@
+# app/router.py
+import asyncio
+import os
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Bật/tắt các tầng định tuyến nhanh (luật + embedding). Khi tắt, mọi câu hỏi đi qua LLM router.
+ROUTER_FAST_PATH_ENABLED = os.getenv("ROUTER_FAST_PATH_ENABLED", "true").lower() == "true"
+# Tầng embedding chỉ được tin khi độ tương đồng cao nhất vượt ngưỡng VÀ cách biệt đủ xa
+# so với công cụ đứng thứ hai.
+ROUTER_EMBEDDING_THRESHOLD = float(os.getenv("ROUTER_EMBEDDING_THRESHOLD", "0.62"))
+ROUTER_EMBEDDING_MARGIN = float(os.getenv("ROUTER_EMBEDDING_MARGIN", "0.08"))
+
+ADDRESS_PATTERN = re.compile(r'(0x[a-fA-F0-9]{40})')
+
+# Từ khoá cho tầng luật. So khớp trên câu hỏi đã chuyển về chữ thường.
+GRAPH_KEYWORDS = (
+    "graph", "đồ thị", "biểu đồ", "quan hệ", "relationship", "tương tác", "interact",
+    "giao dịch với", "transacted with", "luồng tiền", "money flow", "counterpart",
+)
+# "giá" được so khớp riêng để không nhầm với "giá trị" hay "đánh giá".
+WEB_PATTERN = re.compile(
+    r"(?<!đánh )\bgiá\b(?! trị)|\bprices?\b|tin tức|\bnews\b|hôm nay|\btoday\b|mới nhất|\blatest\b"
+)
+
+# Các câu hỏi mẫu đã gán nhãn cho tầng embedding. Không cần chứa địa chỉ vì các câu hỏi
+# có địa chỉ luôn được tầng luật xử lý.
+LABELLED_EXAMPLES: dict[str, list[str]] = {
+    "knowledge_base_retriever": [
+        "tấn công re-entrancy là gì?",
+        "làm thế nào để phát hiện một rug pull?",
+        "giải thích tấn công Sybil",
+        "wash trading là gì?",
+        "phishing attack hoạt động như thế nào?",
+        "what is a sybil attack",
+        "how does a flash loan attack work",
+        "các dấu hiệu của một hợp đồng lừa đảo là gì?",
+        "blockchain là gì?",
+        "smart contract là gì?",
+    ],
+    "web_searcher": [
+        "tin tức mới nhất về dự án ZKsync là gì?",
+        "giá ETH hôm nay",
+        "giá bitcoin hiện tại là bao nhiêu",
+        "sự kiện hack gần đây nhất trong DeFi",
+        "latest news about ethereum ETF",
+        "what is the price of solana today",
+        "dự án nào vừa bị hack tuần này?",
+    ],
+    "graph_handler": [
+        "vẽ biểu đồ tương tác của hợp đồng này",
+        "ví này đã giao dịch với những ai?",
+        "phân tích luồng tiền của địa chỉ này",
+        "show the transaction graph of this wallet",
+    ],
+    "anomaly_detector": [
+        "kiểm tra rủi ro của ví này",
+        "địa chỉ này có phải lừa đảo không?",
+        "check if this wallet is a scam",
+        "ví này có an toàn không?",
+    ],
+}
+
+
+@dataclass
+class RouteDecision:
+    tool: str
+    query: str
+    tier: str  # "rules" | "embedding" | "llm" | "llm_fallback"
+    confidence: float
+
+
+def _route_by_rules(question: str) -> RouteDecision | None:
+    """Tầng 1: các quy tắc xác định, không tốn chi phí suy luận."""
+    lowered = question.lower()
+    has_graph_keyword = any(k in lowered for k in GRAPH_KEYWORDS)
+
+    if ADDRESS_PATTERN.search(question):
+        # ROUTER_PROMPT bắt buộc anomaly_detector hoặc graph_handler khi có địa chỉ.
+        tool = "graph_handler" if has_graph_keyword else "anomaly_detector"
+        return RouteDecision(tool=tool, query=question, tier="rules", confidence=1.0)
+
+    if WEB_PATTERN.search(lowered) and not has_graph_keyword:
+        return RouteDecision(tool="web_searcher", query=question, tier="rules", confidence=0.9)
+
+    return None
+
+
+class TieredRouter:
+    """
+    Bộ định tuyến nhiều tầng đặt trước LLM router.
+
+    - Tầng 1 (rules): regex địa chỉ và từ khoá.
+    - Tầng 2 (embedding): so sánh cosine câu hỏi với các câu mẫu đã gán nhãn, tái sử dụng
+      mô hình MiniLM đã được tải.
+    Trả về None khi cả hai tầng đều không đủ tự tin; khi đó caller sẽ gọi LLM router.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[str], Awaitable[np.ndarray]],
+        examples: dict[str, list[str]] = LABELLED_EXAMPLES,
+        threshold: float = ROUTER_EMBEDDING_THRESHOLD,
+        margin: float = ROUTER_EMBEDDING_MARGIN,
+        enabled: bool = ROUTER_FAST_PATH_ENABLED,
+    ):
+        self._encode = encode
+        self._examples = examples
+        self.threshold = threshold
+        self.margin = margin
+        self.enabled = enabled
+        self._example_matrix: np.ndarray | None = None
+        self._example_labels: list[str] = []
+        self._init_lock = asyncio.Lock()
+
+    async def _ensure_examples(self):
+        if self._example_matrix is not None:
+            return
+        async with self._init_lock:
+            if self._example_matrix is not None:
+                return
+            labels = [tool for tool, texts in self._examples.items() for _ in texts]
+            texts = [text for texts in self._examples.values() for text in texts]
+            vectors = await asyncio.gather(*(self._encode(text) for text in texts))
+            self._example_labels = labels
+            self._example_matrix = _normalize(np.vstack(vectors))
+            logger.info("Router examples embedded", examples=len(texts))
+
+    async def _route_by_embedding(self, question: str, query_vector: np.ndarray | None = None) -> RouteDecision | None:
+        """Tầng 2: k-NN theo cosine trên các câu mẫu; lấy điểm cao nhất của mỗi công cụ."""
+        await self._ensure_examples()
+        if query_vector is None:
+            query_vector = await self._encode(question)
+        query_vector = _normalize(np.asarray(query_vector).reshape(1, -1))
+        similarities = (self._example_matrix @ query_vector.T).ravel()
+
+        best_per_tool: dict[str, float] = {}
+        for label, score in zip(self._example_labels, similarities):
+            best_per_tool[label] = max(best_per_tool.get(label, -1.0), float(score))
+        ranked = sorted(best_per_tool.items(), key=lambda x: x[1], reverse=True)
+        best_tool, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+
+        # Các công cụ cần địa chỉ không thể chạy khi câu hỏi không có địa chỉ (tầng 1 đã loại trừ).
+        if best_tool in ("anomaly_detector", "graph_handler"):
+            return None
+        if best_score < self.threshold or best_score - runner_up < self.margin:
+            logger.debug("Embedding router not confident", best_tool=best_tool,
+                         best_score=best_score, runner_up_score=runner_up)
+            return None
+        return RouteDecision(tool=best_tool, query=question, tier="embedding", confidence=best_score)
+
+    async def route(self, question: str, query_vector: np.ndarray | None = None) -> RouteDecision | None:
+        """`query_vector`: embedding của câu hỏi nếu caller đã tính sẵn, tránh encode lại."""
+        if not self.enabled:
+            return None
+        decision = _route_by_rules(question)
+        if decision is not None:
+            return decision
+        return await self._route_by_embedding(question, query_vector)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.clip(norms, 1e-12, None)
@@ -0,0 +1,101 @@
+# app/screening.py
+import asyncio
+import csv
+import io
+import os
+import time
+from typing import Any, AsyncGenerator, Iterable
+
+import httpx
+import structlog
+
+from . import http_clients, tools
+from .router import ADDRESS_PATTERN
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Số địa chỉ tối đa trong một yêu cầu sàng lọc hàng loạt.
+SCREEN_MAX_ADDRESSES = int(os.getenv("SCREEN_MAX_ADDRESSES", "10000"))
+# Số lời gọi Anomaly Detection API chạy đồng thời cho một yêu cầu (dùng chung connection pool và cache của tools).
+SCREEN_CONCURRENCY = int(os.getenv("SCREEN_CONCURRENCY", "16"))
+
+
+def parse_address_csv(text: str) -> list[str]:
+    """Lấy cột "address" nếu file có tiêu đề đó, ngược lại lấy cột đầu tiên của mọi dòng (bỏ dòng tiêu đề không hợp lệ)."""
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "address" in header:
+        column = header.index("address")
+        return [row[column] if column < len(row) else "" for row in rows[1:]]
+    first = [row[0] for row in rows]
+    # Dòng đầu không phải địa chỉ thì coi là tiêu đề.
+    if not ADDRESS_PATTERN.fullmatch(first[0].strip()):
+        first = first[1:]
+    return first
+
+
+def _error(index: int, address: str, status: str, error: str, **extra) -> dict[str, Any]:
+    return {"index": index, "address": address, "status": status, "error": error, **extra}
+
+
+async def _screen_one(index: int, address: str) -> dict[str, Any]:
+    try:
+        result = await tools.fetch_anomaly_result(address)
+        return {"index": index, "address": address, "status": "ok",
+                "prediction": result["prediction"], "probability_fraud": result["probability_fraud"]}
+    except tools.ToolServiceError as e:
+        return _error(index, address, "service_error", str(e))
+    except http_clients.CircuitOpenError as e:
+        return _error(index, address, "unavailable", "circuit open", retry_after=round(e.retry_after, 1))
+    except httpx.TimeoutException:
+        return _error(index, address, "timeout", "request timed out")
+    except httpx.HTTPError as e:
+        return _error(index, address, "request_error", type(e).__name__)
+    except Exception as e:
+        logger.error("Unexpected error while screening address", address=address, error=str(e), exc_info=True)
+        return _error(index, address, "internal_error", "unexpected error")
+
+
+async def screen_addresses(addresses: Iterable[str], concurrency: int = SCREEN_CONCURRENCY) -> AsyncGenerator[dict, None]:
+    """
+    Sàng lọc danh sách địa chỉ qua Anomaly Detection API, trả kết quả theo thứ tự hoàn thành.
+    Địa chỉ không hợp lệ được báo lỗi ngay; cuối cùng là một bản ghi {"summary": ...}.
+    Không có LLM trong luồng này.
+    """
+    started_at = time.perf_counter()
+    counts = {"ok": 0, "invalid": 0, "errors": 0}
+    pending: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+    for index, raw in enumerate(addresses):
+        address = str(raw).strip()
+        if ADDRESS_PATTERN.fullmatch(address):
+            pending.put_nowait((index, address))
+        else:
+            counts["invalid"] += 1
+            yield _error(index, address, "invalid", "not a valid 0x-prefixed 40-hex-digit address")
+
+    results: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def worker():
+        while not pending.empty():
+            index, address = pending.get_nowait()
+            await results.put(await _screen_one(index, address))
+
+    total = pending.qsize()
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, total))]
+    try:
+        for _ in range(total):
+            result = await results.get()
+            counts["ok" if result["status"] == "ok" else "errors"] += 1
+            yield result
+    finally:
+        # Client ngắt kết nối giữa chừng: dừng các worker (lần tải đang chạy vẫn hoàn tất và được cache).
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    elapsed = time.perf_counter() - started_at
+    logger.info("Bulk screening finished", screened=total, elapsed_ms=round(elapsed * 1000, 1), **counts)
+    yield {"summary": {**counts, "total": total + counts["invalid"], "elapsed_ms": round(elapsed * 1000, 1)}}
@@ -0,0 +1,163 @@
+# app/semantic_cache.py
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+# Ngưỡng cosine để coi hai câu hỏi là cùng một ý (diễn đạt lại).
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+# Chỉ cache câu trả lời của các công cụ có kết quả ổn định theo thời gian.
+SEMANTIC_CACHE_TOOLS = tuple(
+    t.strip() for t in os.getenv("SEMANTIC_CACHE_TOOLS", "knowledge_base_retriever").split(",") if t.strip()
+)
+# File "phiên bản" của cơ sở tri thức, được scripts/ingest_data.py ghi lại sau mỗi lần ingest.
+# Khi nội dung file thay đổi, toàn bộ cache bị xoá. Nằm trong app/data/ (cạnh bm25_index.npz) để script ingest
+# trên máy host và backend trong container (mount ./app) cùng thấy một file.
+KB_VERSION_FILE = os.getenv("KB_VERSION_FILE", "app/data/kb_version")
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    tool: str
+    answer: str
+    similarity: float
+
+
+class SemanticAnswerCache:
+    """
+    Cache câu trả lời theo ngữ nghĩa của câu hỏi.
+
+    Vector câu hỏi (đã chuẩn hoá) được lưu trong một ma trận cấp phát sẵn; tra cứu là một phép
+    nhân ma trận-vector trên tối đa `max_entries` dòng. Khi đầy, phần tử ít được dùng gần đây
+    nhất bị thay thế.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        enabled: bool = SEMANTIC_CACHE_ENABLED,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        tools: tuple[str, ...] = SEMANTIC_CACHE_TOOLS,
+        version_file: str = KB_VERSION_FILE,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.tools = tools
+        self._version_file = version_file
+        self._version_mtime: float | None = None
+        self._version: str | None = None
+
+        self._vectors = np.zeros((max_entries, dimension), dtype=np.float32)
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._tool_ids = np.full(max_entries, -1, dtype=np.int16)
+        self._entries: list[tuple[str, str, str] | None] = [None] * max_entries  # (question, tool, answer)
+        self._size = 0
+        self._clock = 0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def accepts(self, tool: str) -> bool:
+        return self.enabled and tool in self.tools
+
+    def _check_kb_version(self):
+        """Xoá cache nếu cơ sở tri thức vừa được ingest lại (file phiên bản thay đổi)."""
+        try:
+            mtime = os.stat(self._version_file).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._version_mtime:
+            return
+        self._version_mtime = mtime
+        version = None
+        if mtime is not None:
+            with open(self._version_file, "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        if version != self._version:
+            if self._size:
+                logger.info("Knowledge base re-ingested, clearing semantic cache",
+                            old_version=self._version, new_version=version, dropped_entries=self._size)
+                self._stats["invalidations"] += 1
+            self.clear()
+            self._version = version
+
+    def lookup(self, vector: np.ndarray, tool: str) -> CachedAnswer | None:
+        if not self.accepts(tool):
+            return None
+        self._check_kb_version()
+        if self._size == 0:
+            self._stats["misses"] += 1
+            return None
+
+        query = _normalize(vector)
+        similarities = self._vectors[:self._size] @ query
+        similarities[self._tool_ids[:self._size] != self.tools.index(tool)] = -1.0
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self._stats["misses"] += 1
+            return None
+
+        self._clock += 1
+        self._last_used[best] = self._clock
+        self._stats["hits"] += 1
+        question, entry_tool, answer = self._entries[best]
+        return CachedAnswer(question=question, tool=entry_tool, answer=answer, similarity=float(similarities[best]))
+
+    def store(self, question: str, vector: np.ndarray, tool: str, answer: str):
+        if not self.accepts(tool) or not answer.strip():
+            return
+        self._check_kb_version()
+        if self._size < self.max_entries:
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used[:self._size]))
+            self._stats["evictions"] += 1
+        self._clock += 1
+        self._vectors[slot] = _normalize(vector)
+        self._last_used[slot] = self._clock
+        self._tool_ids[slot] = self.tools.index(tool)
+        self._entries[slot] = (question, tool, answer)
+        self._stats["stores"] += 1
+
+    def clear(self):
+        self._entries = [None] * self.max_entries
+        self._last_used[:] = 0
+        self._tool_ids[:] = -1
+        self._size = 0
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "entries": self._size,
+            "hit_rate": (self._stats["hits"] / lookups) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def split_for_replay(answer: str, chunk_chars: int = 24) -> list[str]:
+    """Chia câu trả lời đã cache thành các mảnh nhỏ (theo ranh giới từ) để phát lại như một stream."""
+    chunks, current = [], ""
+    for token in re.findall(r"\s+|\S+\s*", answer):
+        if current and len(current) + len(token) > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current += token
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,92 @@
+# app/serve.py
+"""
+Chạy N worker uvicorn với mô hình được nạp SẴN ở tiến trình cha rồi mới fork.
+
+`uvicorn --workers N` khởi tạo worker bằng "spawn": mỗi worker import lại app và nạp lại hai mô hình,
+nên thời gian khởi động và RSS nhân lên N lần. Ở đây tiến trình cha nạp mô hình một lần, gọi gc.freeze()
+(để GC không ghi vào header của các object cũ và làm "bẩn" trang nhớ), mở socket rồi os.fork() từng worker:
+trọng số được chia sẻ copy-on-write giữa các worker. Warm-up (khởi tạo thread pool của PyTorch) chạy trong
+từng worker sau khi fork, trong lifespan của app.
+
+Cách chạy (thay cho `uvicorn app.main:app`):
+    python -m app.serve --host 0.0.0.0 --port 8000 --workers 4
+"""
+import argparse
+import gc
+import os
+import signal
+import time
+
+import structlog
+import uvicorn
+
+from .agent_service import AgentService
+from .logging_config import setup_logging
+
+logger = structlog.get_logger(__name__)
+
+
+def _run_worker(config: uvicorn.Config, sock) -> None:
+    # Worker không kế thừa handler tín hiệu của tiến trình cha; uvicorn.Server tự cài handler riêng.
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+def serve(host: str, port: int, workers: int, preload: bool = True) -> None:
+    # Tiến trình cha ghi log đồng bộ: thread của listener (LOG_MODE=async) không sống sót qua fork,
+    # mỗi worker tự cài lại logging (và listener riêng) trong lifespan của app.
+    setup_logging(mode="sync")
+    if preload:
+        started_at = time.perf_counter()
+        AgentService.preload()
+        logger.info("Models preloaded before fork", duration_s=round(time.perf_counter() - started_at, 2))
+    # Không mở kết nối nào ở tiến trình cha: SQLite cache, client Qdrant và pool HTTP đều được tạo lười
+    # và gắn với pid, nên mỗi worker tự mở kết nối riêng sau khi fork.
+    # Mọi object đã tạo tới đây được chuyển sang thế hệ "permanent": GC của worker không quét (và ghi vào) chúng.
+    gc.freeze()
+
+    config = uvicorn.Config("app.main:app", host=host, port=port)
+    sock = config.bind_socket()
+    children: set[int] = set()
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(config, sock)
+        children.add(pid)
+    logger.info("Workers started", workers=sorted(children), host=host, port=port)
+
+    def _forward(signum, _frame):
+        for child in children:
+            try:
+                os.kill(child, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _forward)
+    signal.signal(signal.SIGTERM, _forward)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        logger.info("Worker exited", pid=pid, exit_code=os.waitstatus_to_exitcode(status))
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chạy app với mô hình nạp sẵn trước khi fork các worker.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--no-preload", action="store_true", help="Mỗi worker tự nạp mô hình (để so sánh).")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, preload=not args.no_preload)
+
+
+if __name__ == "__main__":
+    main()
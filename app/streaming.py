@@ -0,0 +1,123 @@
+# app/streaming.py
+import asyncio
+import json
+import os
+from typing import AsyncIterator
+
+import structlog
+
+from . import metrics
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# Gộp các token liên tiếp thành một sự kiện SSE: các token đến trong SSE_COALESCE_MS kể từ token đầu tiên
+# được gửi chung, mỗi sự kiện tối đa SSE_COALESCE_MAX_CHARS ký tự. 0 ms = mỗi chunk của LLM là một sự kiện (như trước).
+# Nên lớn hơn khoảng cách giữa hai token của LLM (20-50 ms với 20-50 token/s), nếu không sẽ không gộp được gì.
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "60"))
+SSE_COALESCE_MAX_CHARS = int(os.getenv("SSE_COALESCE_MAX_CHARS", "256"))
+# Gửi comment keep-alive khi không có sự kiện nào trong khoảng này (ví dụ: đang chờ công cụ): giữ proxy không
+# đóng kết nối và phát hiện client đã ngắt ngay cả khi upstream chưa sinh gì.
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "10"))
+# Số chunk tối đa chờ giữa upstream và client. Đầy thì upstream dừng đọc từ LLM (backpressure).
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "64"))
+
+HEARTBEAT = ": ping\n\n"
+_END = object()
+
+
+class StatusEvent(str):
+    """Dòng trạng thái tiến trình (router, công cụ, ...), phát thành sự kiện `status` thay vì `token`."""
+
+
+class ErrorEvent(str):
+    """Thông báo lỗi cho người dùng, phát thành sự kiện `error`."""
+
+
+def format_sse(event: str, data: dict) -> str:
+    # data là JSON một dòng: token có thể chứa xuống dòng, vốn kết thúc trường `data:` của SSE.
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _event_for(chunk: str) -> str:
+    if isinstance(chunk, StatusEvent):
+        return format_sse("status", {"text": chunk.strip()})
+    if isinstance(chunk, ErrorEvent):
+        return format_sse("error", {"text": chunk.strip()})
+    return format_sse("token", {"text": chunk})
+
+
+async def _pump(chunks: AsyncIterator[str], queue: asyncio.Queue):
+    # Bị huỷ (client đã ngắt) thì không đưa gì thêm vào hàng đợi: không còn ai đọc.
+    try:
+        async for chunk in chunks:
+            await queue.put(chunk)
+    except Exception as e:
+        logger.error("Agent stream failed", error=str(e), exc_info=True)
+        await queue.put(ErrorEvent("Lỗi: Một lỗi không mong muốn đã xảy ra khi tạo câu trả lời."))
+    await queue.put(_END)
+
+
+async def sse_events(
+    chunks: AsyncIterator[str],
+    coalesce_ms: float = SSE_COALESCE_MS,
+    max_chars: int = SSE_COALESCE_MAX_CHARS,
+    heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS,
+    queue_size: int = SSE_QUEUE_SIZE,
+) -> AsyncIterator[str]:
+    """
+    Chuyển stream chunk của agent thành sự kiện SSE (`status`, `token`, `error`, cuối cùng là `done`).
+    Upstream chạy trong task riêng, nối với client qua hàng đợi có giới hạn. Khi client ngắt kết nối, server
+    huỷ (hoặc đóng) generator này và task upstream bị huỷ theo: LLM đang sinh và các công cụ đang chạy dừng ngay.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    producer = asyncio.create_task(_pump(chunks, queue))
+    window = coalesce_ms / 1000
+    completed = False
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            if chunk is _END:
+                break
+            if isinstance(chunk, (StatusEvent, ErrorEvent)) or window <= 0:
+                yield _event_for(chunk)
+                continue
+
+            # Token đầu tiên mở cửa sổ: chờ hết cửa sổ rồi lấy mọi chunk đã đến trong lúc đó (một lần ngủ
+            # cho cả cửa sổ thay vì một timer cho mỗi token).
+            pending, pending_chars = [chunk], len(chunk)
+            await asyncio.sleep(window)
+            ended = False
+            while not queue.empty():
+                chunk = queue.get_nowait()
+                if chunk is _END or isinstance(chunk, (StatusEvent, ErrorEvent)):
+                    # Giữ thứ tự: xả các token đang chờ trước sự kiện khác.
+                    if pending:
+                        yield format_sse("token", {"text": "".join(pending)})
+                        pending, pending_chars = [], 0
+                    if chunk is _END:
+                        ended = True
+                        break
+                    yield _event_for(chunk)
+                    continue
+                pending.append(chunk)
+                pending_chars += len(chunk)
+                if pending_chars >= max_chars:
+                    yield format_sse("token", {"text": "".join(pending)})
+                    pending, pending_chars = [], 0
+            if pending:
+                yield format_sse("token", {"text": "".join(pending)})
+            if ended:
+                break
+        yield format_sse("done", {})
+        completed = True
+    finally:
+        if not completed:
+            metrics.STREAM_DISCONNECTS.inc()
+            logger.info("Client disconnected, cancelling agent stream")
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
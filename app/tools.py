@@ -1,8 +1,16 @@
 # app/tools.py
+import asyncio
+import os
+import time
 import httpx
 import structlog
 from typing import Dict, Any
-from duckduckgo_search import DDGS
+
+from . import http_clients
+from .cache import create_cache
+from .graph_engine import GraphEngineFile
+from .risk_table import RiskTableFile
+from .web_search import WebSearcher, create_backend
 
 # ==============================================================================
 # Logger & Configuration
@@ -12,96 +20,198 @@ logger = structlog.get_logger(__name__)
 # Trong một hệ thống production thực tế, các URL này nên được quản lý 
 # thông qua biến môi trường và Pydantic BaseSettings.
 # Việc đặt chúng ở đây giúp dễ dàng cho việc phát triển ban đầu.
-ANOMALY_SERVICE_URL = "https://fraudgraphml-2nz2.onrender.com/analyze"
-GRAPH_SERVICE_URL = "https://fraudgraphml-2nz2.onrender.com/graph"
+ANOMALY_SERVICE_URL = os.getenv("ANOMALY_SERVICE_URL", "https://fraudgraphml-2nz2.onrender.com/analyze")
+GRAPH_SERVICE_URL = os.getenv("GRAPH_SERVICE_URL", "https://fraudgraphml-2nz2.onrender.com/graph")
+# "remote": gọi Graph Handling API. "local": truy vấn chỉ mục đồ thị cục bộ (app/graph_engine.py,
+# xây bằng scripts/build_graph_index.py), không phụ thuộc mạng.
+GRAPH_BACKEND = os.getenv("GRAPH_BACKEND", "remote").lower()
+GRAPH_KHOP_DEPTH = int(os.getenv("GRAPH_KHOP_DEPTH", "2"))
+
+# Cache kết quả theo địa chỉ: các ví "nóng" (sàn giao dịch, hợp đồng lừa đảo đã biết) được hỏi lặp lại.
+# TOOL_CACHE_BACKEND: "memory" (mặc định) hoặc "sqlite" để cache sống sót qua các lần khởi động lại.
+TOOL_CACHE_BACKEND = os.getenv("TOOL_CACHE_BACKEND", "memory")
+TOOL_CACHE_PATH = os.getenv("TOOL_CACHE_PATH", "cache/tool_cache.sqlite3")
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "10000"))
+ANOMALY_CACHE_TTL_SECONDS = float(os.getenv("ANOMALY_CACHE_TTL_SECONDS", "3600"))
+GRAPH_CACHE_TTL_SECONDS = float(os.getenv("GRAPH_CACHE_TTL_SECONDS", "900"))
+
+anomaly_cache = create_cache("anomaly", ANOMALY_CACHE_TTL_SECONDS, TOOL_CACHE_MAX_ENTRIES, TOOL_CACHE_BACKEND, TOOL_CACHE_PATH)
+graph_cache = create_cache("graph", GRAPH_CACHE_TTL_SECONDS, TOOL_CACHE_MAX_ENTRIES, TOOL_CACHE_BACKEND, TOOL_CACHE_PATH)
+
+
+graph_index = GraphEngineFile() if GRAPH_BACKEND == "local" else None
+# Bảng điểm rủi ro chấm trước (scripts/build_risk_table.py), tra trước cache và dịch vụ: địa chỉ đã chấm
+# trả lời trong vài micro-giây; chỉ địa chỉ chưa có hoặc điểm đã hết hạn mới gọi Anomaly Detection API.
+risk_table = RiskTableFile()
+
+# Tìm kiếm web: backend chọn qua WEB_SEARCH_BACKEND (xem app/web_search.py), cache TTL ngắn theo câu truy vấn.
+web_searcher = WebSearcher(create_backend())
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return {"anomaly": anomaly_cache.stats(), "graph": graph_cache.stats(), "web_search": web_searcher.cache.stats(),
+            "risk_table": risk_table.stats()}
 
 # ==============================================================================
 # Công cụ Nghiệp vụ Cốt lõi (Core Business Tools)
 # ==============================================================================
 
+class ToolServiceError(Exception):
+    """Lỗi nghiệp vụ từ dịch vụ bên ngoài, kèm thông báo thân thiện cho người dùng. Không được cache."""
+
+
+async def fetch_anomaly_result(address: str) -> Dict[str, Any]:
+    """
+    Gọi Anomaly Detection Service và trả về kết quả đã phân tích:
+    {"prediction": ..., "probability_fraud": ...}. Địa chỉ có trong bảng điểm chấm trước (còn hạn) được trả lời
+    ngay từ bảng, kèm "scored_at"; còn lại gọi dịch vụ, kết quả thành công được cache theo địa chỉ.
+    """
+    precomputed = risk_table.lookup(address)
+    if precomputed is not None:
+        return precomputed
+    return await anomaly_cache.get_or_load(address.lower(), lambda: _request_anomaly(address))
+
+
+async def _request_anomaly(address: str) -> Dict[str, Any]:
+    # Client lấy từ connection pool dùng chung; timeout được cấu hình trong http_clients.
+    response = await http_clients.get_endpoint("anomaly").request(
+        "POST",
+        ANOMALY_SERVICE_URL, 
+        json={"address": address},
+    )
+    
+    # Không dùng raise_for_status() nữa vì API trả về 200 ngay cả khi có lỗi logic.
+    # Thay vào đó, chúng ta kiểm tra nội dung JSON. Lỗi máy chủ (5xx) vẫn được báo riêng.
+    if response.status_code >= 500:
+        logger.error("Anomaly Detection API returned a server error", address=address, status_code=response.status_code)
+        raise ToolServiceError(f"Lỗi: Dịch vụ phát hiện bất thường gặp sự cố (HTTP {response.status_code}).")
+    data = response.json()
+
+    # KIỂM TRA LỖI LOGIC TỪ API
+    if "detail" in data:
+        error_message = data["detail"]
+        logger.warning("Anomaly Detection API returned a logical error", address=address, api_error=error_message)
+        # Trả về thông báo lỗi thân thiện cho người dùng
+        raise ToolServiceError(f"Dịch vụ phân tích báo lỗi cho địa chỉ {address}: {error_message}")
+
+    # Logic được điều chỉnh để khớp với output đã được ghi nhận: {"prediction": ..., "probability_fraud": ...}
+    return {
+        "prediction": data.get('prediction', 'Không xác định'),
+        "probability_fraud": data.get('probability_fraud', -1),
+    }
+
+
 async def check_address_anomaly(address: str) -> str:
     """
     Gọi đến Anomaly Detection Service để kiểm tra một địa chỉ blockchain.
     Hàm này đã được cập nhật để sử dụng endpoint thật và xử lý các phản hồi lỗi cụ thể.
     """
     logger.info("Executing tool: anomaly_detector", address=address)
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                ANOMALY_SERVICE_URL, 
-                json={"address": address},
-                timeout=20.0 # Tăng timeout một chút cho các dịch vụ trên render.com
-            )
-            
-            # Không dùng raise_for_status() nữa vì API trả về 200 ngay cả khi có lỗi logic.
-            # Thay vào đó, chúng ta kiểm tra nội dung JSON.
-            data = response.json()
-
-            # KIỂM TRA LỖI LOGIC TỪ API
-            if "detail" in data:
-                error_message = data["detail"]
-                logger.warning("Anomaly Detection API returned a logical error", address=address, api_error=error_message)
-                # Trả về thông báo lỗi thân thiện cho người dùng
-                return f"Dịch vụ phân tích báo lỗi cho địa chỉ {address}: {error_message}"
-
-            # XỬ LÝ KHI THÀNH CÔNG
-            # Logic được điều chỉnh để khớp với output đã được ghi nhận: {"prediction": ..., "probability_fraud": ...}
-            prediction = data.get('prediction', 'Không xác định')
-            probability = data.get('probability_fraud', -1)
-            
-            # Chuyển đổi xác suất thành định dạng phần trăm dễ đọc
-            if probability != -1:
-                probability_percent = f"{probability:.2%}"
-            else:
-                probability_percent = "N/A"
-
-            return (f"Kết quả phân tích bất thường cho địa chỉ {address}:\n"
-                    f"- Đánh giá: {prediction}\n"
-                    f"- Xác suất lừa đảo: {probability_percent}")
-
-        except httpx.TimeoutException:
-            logger.error("Timeout calling Anomaly Detection API", address=address)
-            return f"Lỗi: Yêu cầu kiểm tra địa chỉ {address} đã hết thời gian chờ."
-        except httpx.RequestError as e:
-            logger.error("Anomaly detection API call failed", error=str(e), address=address)
-            return f"Lỗi: Không thể kết nối đến dịch vụ phát hiện bất thường. Chi tiết: {e.request.url}"
-        except Exception as e:
-            logger.error("An unexpected error occurred in anomaly_detector", error=str(e), address=address, exc_info=True)
-            return "Lỗi: Một lỗi không mong muốn đã xảy ra khi xử lý yêu cầu phát hiện bất thường."
+    try:
+        data = await fetch_anomaly_result(address)
+
+        # XỬ LÝ KHI THÀNH CÔNG
+        prediction = data['prediction']
+        probability = data['probability_fraud']
+        
+        # Chuyển đổi xác suất thành định dạng phần trăm dễ đọc
+        if probability != -1:
+            probability_percent = f"{probability:.2%}"
+        else:
+            probability_percent = "N/A"
+
+        result = (f"Kết quả phân tích bất thường cho địa chỉ {address}:\n"
+                  f"- Đánh giá: {prediction}\n"
+                  f"- Xác suất lừa đảo: {probability_percent}")
+        if "scored_at" in data:
+            scored_at = time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(data["scored_at"]))
+            result += f"\n- Điểm chấm trước lúc: {scored_at}"
+        return result
+
+    except ToolServiceError as e:
+        return str(e)
+    except http_clients.CircuitOpenError as e:
+        logger.warning("Anomaly Detection API circuit open, failing fast", address=address, retry_after=e.retry_after)
+        return f"Lỗi: Dịch vụ phát hiện bất thường tạm thời không khả dụng. Vui lòng thử lại sau {e.retry_after:.0f} giây."
+    except httpx.TimeoutException:
+        logger.error("Timeout calling Anomaly Detection API", address=address)
+        return f"Lỗi: Yêu cầu kiểm tra địa chỉ {address} đã hết thời gian chờ."
+    except httpx.RequestError as e:
+        logger.error("Anomaly detection API call failed", error=str(e), address=address)
+        return f"Lỗi: Không thể kết nối đến dịch vụ phát hiện bất thường. Chi tiết: {e.request.url}"
+    except Exception as e:
+        logger.error("An unexpected error occurred in anomaly_detector", error=str(e), address=address, exc_info=True)
+        return "Lỗi: Một lỗi không mong muốn đã xảy ra khi xử lý yêu cầu phát hiện bất thường."
+
+async def fetch_graph_result(address: str) -> Dict[str, Any]:
+    """Gọi Graph Handling Service (hoặc engine cục bộ) và trả về JSON kết quả. Kết quả thành công được cache theo địa chỉ."""
+    if graph_index is not None:
+        return await graph_cache.get_or_load(address.lower(), lambda: asyncio.to_thread(_query_local_graph, address))
+    return await graph_cache.get_or_load(address.lower(), lambda: _request_graph(address))
+
+
+def _query_local_graph(address: str) -> Dict[str, Any]:
+    engine = graph_index.get()
+    if engine is None:
+        logger.error("Local graph index not found", path=graph_index.path)
+        raise ToolServiceError("Lỗi: Chưa có dữ liệu đồ thị giao dịch cục bộ.")
+    data = engine.summary(address)
+    if data is None:
+        raise ToolServiceError(f"Không tìm thấy giao dịch nào của địa chỉ {address} trong dữ liệu đồ thị.")
+    data["neighborhood"] = engine.k_hop(address, k=GRAPH_KHOP_DEPTH)
+    return data
+
+
+async def _request_graph(address: str) -> Dict[str, Any]:
+    response = await http_clients.get_endpoint("graph").request(
+        "GET",
+        GRAPH_SERVICE_URL,
+        params={"address": address},
+    )
+    response.raise_for_status()
+    return response.json()
+
 
 async def analyze_address_graph(address: str) -> str:
     """
     Gọi đến Graph Handling Service để phân tích các mối quan hệ của một địa chỉ.
     """
     logger.info("Executing tool: graph_handler", address=address)
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(
-                f"{GRAPH_SERVICE_URL}?address={address}",
-                timeout=20.0 # Có thể cần timeout dài hơn cho các phân tích phức tạp
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Định dạng kết quả JSON thành một chuỗi văn bản súc tích.
-            top_interactions = data.get('top_interactions', [])
-            interaction_summary = "\n".join([f"  - {tx.get('type', 'N/A')} với {tx.get('counterparty', 'N/A')} ({tx.get('count', 0)} lần)" for tx in top_interactions]) or "Không có tương tác đáng chú ý."
-            
-            return (f"Kết quả phân tích quan hệ cho địa chỉ {address}:\n"
-                    f"- Tổng số giao dịch đã phân tích: {data.get('total_transactions', 'N/A')}\n"
-                    f"- Các tương tác chính nổi bật:\n{interaction_summary}\n"
-                    f"- Tóm tắt hành vi tổng thể: {data.get('behavior_summary', 'Không có.')}")
-
-        except httpx.TimeoutException:
-            logger.error("Timeout calling Graph Handling API", address=address)
-            return f"Lỗi: Yêu cầu phân tích đồ thị cho địa chỉ {address} đã hết thời gian chờ."
-        except httpx.RequestError as e:
-            logger.error("Graph handling API call failed", error=str(e), address=address)
-            return f"Lỗi: Không thể kết nối đến dịch vụ phân tích đồ thị cho địa chỉ {address}. Chi tiết: {e.request.url}"
-        except Exception as e:
-            logger.error("An unexpected error occurred in graph_handler", error=str(e), address=address, exc_info=True)
-            return "Lỗi: Một lỗi không mong muốn đã xảy ra khi xử lý yêu cầu phân tích đồ thị."
+    try:
+        data = await fetch_graph_result(address)
+        
+        # Định dạng kết quả JSON thành một chuỗi văn bản súc tích.
+        top_interactions = data.get('top_interactions', [])
+        interaction_summary = "\n".join([f"  - {tx.get('type', 'N/A')} với {tx.get('counterparty', 'N/A')} ({tx.get('count', 0)} lần)" for tx in top_interactions]) or "Không có tương tác đáng chú ý."
+        
+        result = (f"Kết quả phân tích quan hệ cho địa chỉ {address}:\n"
+                  f"- Tổng số giao dịch đã phân tích: {data.get('total_transactions', 'N/A')}\n"
+                  f"- Các tương tác chính nổi bật:\n{interaction_summary}\n"
+                  f"- Tóm tắt hành vi tổng thể: {data.get('behavior_summary', 'Không có.')}")
+        # Các chỉ số mở rộng chỉ có khi dùng engine đồ thị cục bộ.
+        if (m := data.get("metrics")):
+            result += (f"\n- Fan-in / fan-out: {m['fan_in']} ví gửi đến / {m['fan_out']} ví nhận\n"
+                       f"- Độ tập trung đối tác (HHI): {m['counterparty_hhi']:.2f}, "
+                       f"đối tác lớn nhất chiếm {m['top_counterparty_share']:.0%} số giao dịch")
+        if (hood := data.get("neighborhood")):
+            hops = ", ".join(f"bước {i + 1}: {n} ví" for i, n in enumerate(hood["hops"]))
+            result += f"\n- Lân cận giao dịch: {hops}" + (" (đã giới hạn)" if hood["truncated"] else "")
+        return result
+
+    except ToolServiceError as e:
+        return str(e)
+    except http_clients.CircuitOpenError as e:
+        logger.warning("Graph Handling API circuit open, failing fast", address=address, retry_after=e.retry_after)
+        return f"Lỗi: Dịch vụ phân tích đồ thị tạm thời không khả dụng. Vui lòng thử lại sau {e.retry_after:.0f} giây."
+    except httpx.TimeoutException:
+        logger.error("Timeout calling Graph Handling API", address=address)
+        return f"Lỗi: Yêu cầu phân tích đồ thị cho địa chỉ {address} đã hết thời gian chờ."
+    except httpx.RequestError as e:
+        logger.error("Graph handling API call failed", error=str(e), address=address)
+        return f"Lỗi: Không thể kết nối đến dịch vụ phân tích đồ thị cho địa chỉ {address}. Chi tiết: {e.request.url}"
+    except Exception as e:
+        logger.error("An unexpected error occurred in graph_handler", error=str(e), address=address, exc_info=True)
+        return "Lỗi: Một lỗi không mong muốn đã xảy ra khi xử lý yêu cầu phân tích đồ thị."
 
 # ==============================================================================
 # Công cụ Hiện có (Existing Tools)
@@ -109,12 +219,12 @@ async def analyze_address_graph(address: str) -> str:
 
 async def search_the_web_async(query: str) -> str:
     """
-    Phiên bản bất đồng bộ của công cụ tìm kiếm web.
+    Công cụ tìm kiếm web bất đồng bộ: các biến thể câu truy vấn chạy song song ngoài event loop,
+    kết quả được trộn, loại trùng theo URL và cache ngắn hạn (app/web_search.py).
     """
     logger.info("Executing tool: web_searcher", query=query)
     try:
-        with DDGS() as ddgs:
-            results = [r for r in ddgs.text(query, max_results=5)]
+        results = await web_searcher.search(query)
         
         if not results:
             return "Không tìm thấy kết quả nào trên web."
@@ -122,4 +232,4 @@ async def search_the_web_async(query: str) -> str:
         return "\n\n---\n\n".join([f"Nguồn: {res['href']}\nNội dung: {res['body']}" for res in results])
     except Exception as e:
         logger.error("Web search failed", error=str(e), query=query)
-        return "Lỗi: Không thể thực hiện tìm kiếm trên web."
\ No newline at end of file
+        return "Lỗi: Không thể thực hiện tìm kiếm trên web."
@@ -1,6 +1,6 @@
 # app/vector_store_client.py
 import os
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient
 
 COLLECTION_NAME = "blockchain_knowledge"
 
@@ -9,13 +9,31 @@ class QdrantVectorStoreClient:
         host = os.getenv("QDRANT_HOST", "localhost")
         # Qdrant client thông minh, nó sẽ tự xử lý các cổng. Chỉ cần cung cấp cổng REST.
         port = 6333
+        # Tuỳ chọn: ":memory:" hoặc đường dẫn thư mục để chạy Qdrant cục bộ không cần server
+        # (dùng cho benchmark offline).
+        location = os.getenv("QDRANT_LOCATION")
         
-        print(f"Attempting to connect to Qdrant at: {host}:{port}")
-        self.client = QdrantClient(host=host, port=port)
+        if location:
+            print(f"Using local Qdrant at: {location}")
+            # Chỉ một client cục bộ (async, dùng cho đường truy vấn): ở chế độ path, thư mục lưu trữ bị khoá bởi
+            # client mở nó trước, client thứ hai sẽ lỗi; ở ":memory:", hai client là hai kho dữ liệu riêng.
+            self.client = None
+            self.async_client = AsyncQdrantClient(location=location) if location == ":memory:" else AsyncQdrantClient(path=location)
+        else:
+            # gRPC (cổng 6334): protobuf nhị phân thay cho JSON qua HTTP, rẻ hơn khi (giải) mã hoá vector và payload.
+            prefer_grpc = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+            grpc_port = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+            print(f"Attempting to connect to Qdrant at: {host}:{port}" + (f" (gRPC on {grpc_port})" if prefer_grpc else ""))
+            self.client = QdrantClient(host=host, port=port, grpc_port=grpc_port, prefer_grpc=prefer_grpc)
+            # Client bất đồng bộ dùng cho đường truy vấn trong request, tránh chặn event loop.
+            self.async_client = AsyncQdrantClient(host=host, port=port, grpc_port=grpc_port, prefer_grpc=prefer_grpc)
         print("Successfully initialized Qdrant client.")
 
     def check_connection(self):
         """Kiểm tra kết nối tới Qdrant server bằng cách lấy thông tin cluster."""
+        if self.client is None:
+            # Chế độ cục bộ: không có server; lỗi mở thư mục lưu trữ đã được raise khi tạo client.
+            return True
         try:
             # Đây là một lệnh chỉ đọc, an toàn để kiểm tra kết nối.
             self.client.get_collections()
@@ -25,4 +43,21 @@ class QdrantVectorStoreClient:
             print(f"Failed to connect to Qdrant: {e}")
             return False
 
-db_client = QdrantVectorStoreClient()
\ No newline at end of file
+    async def close(self):
+        """Đóng các kết nối của client bất đồng bộ."""
+        await self.async_client.close()
+
+_db_client: QdrantVectorStoreClient | None = None
+_db_client_pid: int | None = None
+
+
+def get_db_client() -> QdrantVectorStoreClient:
+    """
+    Client dùng chung của tiến trình, tạo lười ở lần gọi đầu. Không tạo lúc import: app/serve.py import app
+    ở tiến trình cha trước khi fork, và kết nối (gRPC, pool HTTP) không được dùng chung qua fork.
+    """
+    global _db_client, _db_client_pid
+    if _db_client is None or _db_client_pid != os.getpid():
+        _db_client = QdrantVectorStoreClient()
+        _db_client_pid = os.getpid()
+    return _db_client
\ No newline at end of file
@@ -0,0 +1,237 @@
+# app/web_search.py
+import asyncio
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Protocol
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import structlog
+
+from . import http_clients
+from .cache import TTLCache, create_cache
+
+logger = structlog.get_logger(__name__)
+
+# --- CẤU HÌNH ---
+# "duckduckgo" (mặc định, thư viện duckduckgo_search) hoặc "http": gọi WEB_SEARCH_URL
+# (GET ?q=...&max_results=..., trả {"results": [{"href", "title", "body"}]}) — ví dụ stub trong scripts/stub_services.py.
+WEB_SEARCH_BACKEND = os.getenv("WEB_SEARCH_BACKEND", "duckduckgo").lower()
+WEB_SEARCH_URL = os.getenv("WEB_SEARCH_URL", "http://localhost:9100/search")
+WEB_SEARCH_MAX_RESULTS = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5"))
+# Số biến thể câu truy vấn chạy song song (1 = chỉ câu gốc, mặc định). Mỗi biến thể là một lời gọi backend:
+# 3 nghĩa là gấp ba số yêu cầu tới backend tìm kiếm (DuckDuckGo giới hạn tần suất), đổi lại kết quả đa dạng hơn.
+WEB_SEARCH_FANOUT = int(os.getenv("WEB_SEARCH_FANOUT", "1"))
+# Số lời gọi backend đồng thời tối đa trong tiến trình (cũng là số thread của DuckDuckGo backend).
+WEB_SEARCH_CONCURRENCY = int(os.getenv("WEB_SEARCH_CONCURRENCY", "8"))
+# Hạn chót cho MỖI lời gọi backend; biến thể quá hạn bị bỏ qua, kết quả của các biến thể khác vẫn được dùng.
+WEB_SEARCH_TIMEOUT_SECONDS = float(os.getenv("WEB_SEARCH_TIMEOUT_SECONDS", "4"))
+# TTL ngắn: tin tức/giá thay đổi nhanh, nhưng đủ để hấp thụ các đợt câu hỏi giống hệt nhau.
+WEB_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "120"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "1000"))
+
+# Từ để hỏi / từ đệm bị bỏ khi tạo biến thể "từ khoá" của câu hỏi.
+_FILLER_WORDS = {
+    "là", "gì", "nào", "không", "bao", "nhiêu", "như", "thế", "cho", "tôi", "mình", "hãy", "giúp", "về", "của",
+    "có", "được", "vậy", "ạ", "nhé", "what", "is", "are", "the", "a", "an", "of", "about", "how", "much", "me",
+    "please", "tell", "show", "for",
+}
+_RECENCY_WORDS = ("hôm nay", "mới nhất", "tin tức", "giá", "today", "latest", "news", "price")
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|ref|fbclid|gclid)$")
+
+
+class WebSearchError(Exception):
+    """Mọi biến thể của câu truy vấn đều thất bại hoặc quá hạn."""
+
+
+class BackendSaturatedError(Exception):
+    """Mọi thread của backend đồng bộ đều đang bận (kể cả các lời gọi đã quá hạn nhưng chưa trả về)."""
+
+
+class SearchBackend(Protocol):
+    async def search(self, query: str, max_results: int) -> list[dict]: ...
+
+
+class DuckDuckGoBackend:
+    """
+    DDGS là thư viện đồng bộ: chạy trong thread pool riêng, giới hạn số thread, không chặn event loop.
+
+    Hạn chót (asyncio.wait_for) chỉ bỏ rơi thread chứ không dừng được nó, nên thread quá hạn vẫn giữ chỗ trong pool
+    cho tới khi DDGS tự hết timeout HTTP. Backend đếm số thread thực sự đang chạy và từ chối ngay (không xếp vào
+    hàng đợi của executor) khi pool đã đầy: nếu không, lời gọi mới chờ trong hàng đợi và tiêu hết hạn chót của
+    chính nó, làm quá hạn lan sang mọi lời gọi sau.
+    """
+
+    def __init__(self, max_workers: int = WEB_SEARCH_CONCURRENCY, timeout_seconds: float = WEB_SEARCH_TIMEOUT_SECONDS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="web-search")
+        self._max_workers = max_workers
+        self._timeout_seconds = timeout_seconds
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _search_sync(self, query: str, max_results: int) -> list[dict]:
+        try:
+            # Import muộn: duckduckgo_search chỉ cần khi thực sự tìm kiếm web.
+            from duckduckgo_search import DDGS
+
+            # Timeout HTTP của DDGS bằng hạn chót: thread bị bỏ rơi cũng tự kết thúc ngay sau đó.
+            with DDGS(timeout=self._timeout_seconds) as ddgs:
+                return list(ddgs.text(query, max_results=max_results))
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    async def search(self, query: str, max_results: int) -> list[dict]:
+        with self._lock:
+            if self._in_flight >= self._max_workers:
+                raise BackendSaturatedError(f"All {self._max_workers} web search threads are busy")
+            self._in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, self._search_sync, query, max_results)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        return await future
+
+
+class HttpSearchBackend:
+    """Backend tìm kiếm qua HTTP, dùng connection pool và circuit breaker chung của http_clients."""
+
+    def __init__(self, url: str = WEB_SEARCH_URL):
+        self.url = url
+
+    async def search(self, query: str, max_results: int) -> list[dict]:
+        response = await http_clients.get_endpoint("web_search").request(
+            "GET", self.url, params={"q": query, "max_results": max_results}
+        )
+        response.raise_for_status()
+        return response.json().get("results", [])
+
+
+def create_backend(name: str = WEB_SEARCH_BACKEND) -> SearchBackend:
+    if name == "duckduckgo":
+        return DuckDuckGoBackend()
+    if name == "http":
+        return HttpSearchBackend()
+    raise ValueError(f"Unknown web search backend: '{name}'")
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def reformulate(query: str, fanout: int = WEB_SEARCH_FANOUT) -> list[str]:
+    """
+    Các biến thể của câu truy vấn, câu gốc đứng đầu: dạng chỉ còn từ khoá (bỏ từ để hỏi, dấu câu)
+    và dạng chủ đề + "news" khi câu hỏi mang tính thời sự. Không trùng lặp, tối đa `fanout`.
+    """
+    original = " ".join(query.split())
+    words = re.findall(r"[\w$.\-]+", original.lower())
+    keywords = " ".join(w for w in words if w not in _FILLER_WORDS)
+    variants = [original, keywords]
+    if any(word in original.lower() for word in _RECENCY_WORDS):
+        # Câu hỏi thời sự: chủ đề trần (bỏ cụm từ thời gian) + "news", thường khớp các trang tin tổng hợp.
+        topic = re.sub(rf"\b({'|'.join(_RECENCY_WORDS)})\b", " ", keywords)
+        if topic.split():
+            variants.append(f"{' '.join(topic.split())} news")
+
+    unique, seen = [], set()
+    for variant in variants:
+        key = normalize_query(variant)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(variant)
+    return unique[:max(1, fanout)]
+
+
+def canonical_url(url: str) -> str:
+    """Khoá so trùng URL: bỏ scheme, "www.", fragment, dấu "/" cuối và tham số theo dõi (utm_*, ...)."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k)))
+    return f"{host}{parts.path.rstrip('/')}" + (f"?{query}" if query else "")
+
+
+def merge_results(result_lists: list[list[dict]], max_results: int) -> list[dict]:
+    """Trộn xen kẽ theo thứ hạng (round-robin giữa các biến thể) và loại trùng theo URL chuẩn hoá."""
+    merged, seen = [], set()
+    for rank in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if rank >= len(results):
+                continue
+            item = results[rank]
+            key = canonical_url(item.get("href", ""))
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            merged.append(item)
+            if len(merged) >= max_results:
+                return merged
+    return merged
+
+
+class WebSearcher:
+    """
+    Tìm kiếm web bất đồng bộ: chạy song song các biến thể câu truy vấn (giới hạn bởi semaphore, mỗi lời gọi
+    có hạn chót riêng), trộn và loại trùng kết quả theo URL. Kết quả được cache theo câu truy vấn đã chuẩn hoá
+    với TTL ngắn; TTLCache gộp (single-flight) các câu truy vấn giống hệt nhau đang chạy.
+    """
+
+    def __init__(
+        self,
+        backend: SearchBackend,
+        cache: TTLCache | None = None,
+        fanout: int = WEB_SEARCH_FANOUT,
+        max_results: int = WEB_SEARCH_MAX_RESULTS,
+        concurrency: int = WEB_SEARCH_CONCURRENCY,
+        timeout_seconds: float = WEB_SEARCH_TIMEOUT_SECONDS,
+    ):
+        self.backend = backend
+        self.cache = cache or create_cache(
+            "web_search", WEB_SEARCH_CACHE_TTL_SECONDS, WEB_SEARCH_CACHE_MAX_ENTRIES
+        )
+        self.fanout = fanout
+        self.max_results = max_results
+        self.timeout_seconds = timeout_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._stats = {"backend_calls": 0, "backend_failures": 0, "backend_timeouts": 0, "backend_saturated": 0}
+
+    async def search(self, query: str) -> list[dict]:
+        return await self.cache.get_or_load(normalize_query(query), lambda: self._search_uncached(query))
+
+    async def _search_uncached(self, query: str) -> list[dict]:
+        variants = reformulate(query, self.fanout)
+        started_at = time.perf_counter()
+        outcomes = await asyncio.gather(*(self._call_backend(v) for v in variants), return_exceptions=True)
+        result_lists = [o for o in outcomes if not isinstance(o, BaseException)]
+        if not result_lists:
+            raise WebSearchError(f"All {len(variants)} search variants failed: {outcomes[0]!r}")
+        merged = merge_results(result_lists, self.max_results)
+        logger.info("Web search completed", variants=len(variants), succeeded=len(result_lists),
+                    results=len(merged), duration_ms=round((time.perf_counter() - started_at) * 1000, 1))
+        return merged
+
+    async def _call_backend(self, query: str) -> list[dict]:
+        async with self._semaphore:
+            self._stats["backend_calls"] += 1
+            try:
+                return await asyncio.wait_for(self.backend.search(query, self.max_results), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                self._stats["backend_timeouts"] += 1
+                logger.warning("Web search variant timed out", query=query, timeout_seconds=self.timeout_seconds)
+                raise
+            except BackendSaturatedError:
+                self._stats["backend_saturated"] += 1
+                logger.warning("Web search backend saturated, skipping variant", query=query)
+                raise
+            except Exception as e:
+                self._stats["backend_failures"] += 1
+                logger.warning("Web search variant failed", query=query, error=str(e))
+                raise
+
+    def stats(self) -> dict:
+        return {**self._stats, "cache": self.cache.stats()}
@@ -0,0 +1,113 @@
+# scripts/benchmark_graph_engine.py
+"""
+Benchmark engine đồ thị cục bộ (app/graph_engine.py) trên một đồ thị giao dịch tổng hợp.
+
+Đồ thị có phân bố bậc lệch (một số ví "hub" chiếm phần lớn giao dịch, như sàn giao dịch hay router DEX).
+Báo cáo: thời gian xây chỉ mục, dung lượng trên đĩa, và độ trễ p50/p95/p99/max của
+summary (các trường của graph_handler) và lân cận k bước, cho địa chỉ ngẫu nhiên và cho các hub.
+Tuỳ chọn --csv-edges đo thêm tốc độ đọc/mã hoá danh sách cạnh CSV.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.benchmark_graph_engine --nodes 2000000 --edges 20000000 --queries 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.graph_engine import ADDRESS_DTYPE, GraphEngine, build_graph_index, decode_address, iter_edge_chunks
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def synthetic_edges(nodes: int, edges: int, skew: float, seed: int) -> tuple[np.ndarray, ...]:
+    rng = np.random.default_rng(seed)
+    addresses = np.frombuffer(rng.bytes(20 * nodes), dtype=ADDRESS_DTYPE)
+    # Lấy ID theo u^skew: ID nhỏ được chọn nhiều hơn hẳn -> phân bố bậc lệch.
+    src = (nodes * rng.random(edges) ** skew).astype(np.int64)
+    dst = (nodes * rng.random(edges) ** skew).astype(np.int64)
+    value = rng.exponential(1.5, edges)
+    ts = 1_600_000_000 + np.sort(rng.integers(0, 100_000_000, edges))
+    return addresses, addresses[src], addresses[dst], value, ts
+
+
+def _time(fn, addresses: list[str]) -> list[float]:
+    latencies = []
+    for address in addresses:
+        start = time.perf_counter()
+        fn(address)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def _row(name: str, latencies: list[float]):
+    print(f"{name:<28} p50={_percentile(latencies, 50):8.2f}ms p95={_percentile(latencies, 95):8.2f}ms "
+          f"p99={_percentile(latencies, 99):8.2f}ms max={max(latencies):8.2f}ms")
+
+
+def _csv_ingest(path_dir: str, src: np.ndarray, dst: np.ndarray, value: np.ndarray, ts: np.ndarray, count: int):
+    import pandas as pd
+
+    path = os.path.join(path_dir, "edges.csv")
+    pd.DataFrame({"from": [decode_address(bytes(a)) for a in src[:count]],
+                  "to": [decode_address(bytes(a)) for a in dst[:count]],
+                  "value": value[:count], "timestamp": ts[:count]}).to_csv(path, index=False)
+    start = time.perf_counter()
+    read = sum(len(chunk[0]) for chunk in iter_edge_chunks(path, {"from": "from", "to": "to", "value": "value",
+                                                                  "timestamp": "timestamp"}))
+    elapsed = time.perf_counter() - start
+    print(f"CSV ingest: {read:,} edges in {elapsed:.2f}s ({read / elapsed:,.0f} edges/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=1_000_000)
+    parser.add_argument("--edges", type=int, default=10_000_000)
+    parser.add_argument("--skew", type=float, default=3.0, help="Higher = more skewed degree distribution.")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--hubs", type=int, default=20)
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--csv-edges", type=int, default=0)
+    parser.add_argument("--out", help="Index directory (default: a temporary directory).")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="graph-bench-") as tmp:
+        out = args.out or os.path.join(tmp, "graph")
+        start = time.perf_counter()
+        addresses, src, dst, value, ts = synthetic_edges(args.nodes, args.edges, args.skew, args.seed)
+        print(f"Generated {args.edges:,} edges over {args.nodes:,} addresses in {time.perf_counter() - start:.1f}s")
+        if args.csv_edges:
+            _csv_ingest(tmp, src, dst, value, ts, args.csv_edges)
+
+        meta = build_graph_index(src, dst, value, ts, out)
+        size = sum(os.path.getsize(os.path.join(out, f)) for f in os.listdir(out))
+        print(f"Index: {meta['nodes']:,} nodes, {meta['edges']:,} edges, built in {meta['build_seconds']:.1f}s, "
+              f"{size / 2**20:,.0f} MiB on disk")
+        del src, dst, value, ts
+
+        start = time.perf_counter()
+        engine = GraphEngine.open(out)
+        print(f"Open (mmap): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        rng = np.random.default_rng(args.seed + 1)
+        in_index = engine.addresses[rng.integers(0, len(engine), args.queries)]
+        random_addresses = [decode_address(bytes(a)) for a in in_index]
+        degrees = np.diff(np.asarray(engine._adjacency["out"][0])) + np.diff(np.asarray(engine._adjacency["in"][0]))
+        hub_ids = np.argsort(degrees)[::-1][:args.hubs]
+        hub_addresses = [decode_address(bytes(engine.addresses[i])) for i in hub_ids]
+        print(f"Hub degree: max={int(degrees[hub_ids[0]]):,}, median={int(np.median(degrees)):,}")
+
+        for name, sample in (("random", random_addresses), ("hubs", hub_addresses)):
+            _row(f"summary ({name})", _time(engine.summary, sample))
+            _row(f"{args.k}-hop ({name})", _time(lambda a: engine.k_hop(a, k=args.k), sample))
+        _row("lookup miss", _time(engine.summary, ["0x" + os.urandom(20).hex() for _ in range(args.queries)]))
+
+
+if __name__ == "__main__":
+    main()
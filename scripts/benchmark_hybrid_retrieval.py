@@ -0,0 +1,150 @@
+# scripts/benchmark_hybrid_retrieval.py
+"""
+Benchmark: so sánh truy xuất dense-only với hybrid (dense + BM25, gộp bằng RRF)
+trên tập truy vấn held-out (scripts/data/kb_eval_queries.jsonl).
+
+Mỗi truy vấn có danh sách chuỗi "relevant": một chunk được coi là liên quan nếu chứa một trong các chuỗi đó.
+Báo cáo recall@k của danh sách ứng viên (trước re-rank), tuỳ chọn recall sau re-rank,
+và độ trễ p50/p95 của bước lấy ứng viên.
+
+Corpus = knowledge_base/ + các tài liệu "nhiễu" sinh ngẫu nhiên (cùng định dạng với common_anomalies.csv)
+để bài toán không tầm thường. Qdrant chạy ở chế độ in-memory, không cần server.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.benchmark_hybrid_retrieval --distractors 2000 --rerank
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from qdrant_client import AsyncQdrantClient, models
+
+from app.agent_service import AgentService, COLLECTION_NAME, FINAL_CONTEXT_COUNT, RETRIEVAL_CANDIDATE_COUNT
+from app.bm25 import BM25Index, BM25IndexFile
+from scripts.ingest_data import chunk_documents, iter_document_batches, list_source_files
+
+KNOWLEDGE_BASE_DIR = "knowledge_base"
+QUERIES_PATH = "scripts/data/kb_eval_queries.jsonl"
+VECTOR_SIZE = 384
+K_VALUES = (1, 3, 5, 10)
+
+_ANOMALY_WORDS = ["Flash Loan", "Rug Pull", "Front-running", "Sandwich", "Dusting", "Honeypot", "Oracle",
+                  "Bridge", "Governance", "Airdrop", "Pump and Dump", "Reentrancy", "Approval", "MEV", "Mixer"]
+_SUFFIXES = ["Exploit", "Scheme", "Manipulation", "Abuse", "Drain", "Pattern", "Anomaly"]
+_PHRASES = ["chuyển tiền qua nhiều ví trung gian", "thao túng giá trong một khối", "rút thanh khoản đột ngột",
+            "gửi số lượng nhỏ token tới nhiều địa chỉ", "khai thác lỗi trong hợp đồng thông minh",
+            "sử dụng khoản vay không thế chấp", "đặt lệnh trước giao dịch của nạn nhân",
+            "bỏ phiếu với token mượn tạm thời", "phát hành token không thể bán lại"]
+
+
+def _distractors(count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        name = f"{rng.choice(_ANOMALY_WORDS)} {rng.choice(_SUFFIXES)}"
+        description = ", ".join(rng.sample(_PHRASES, 3)) + f", token ${rng.choice(['ABC', 'XYZ', 'FOO', 'BAR'])}{i % 97}"
+        docs.append({"content": f"id: {i + 100}, anomaly_name: {name}, description: {description}", "source": "synthetic.csv"})
+    return docs
+
+
+def load_corpus(distractors: int, seed: int) -> list[dict]:
+    documents = [doc for path in list_source_files(KNOWLEDGE_BASE_DIR) for batch in iter_document_batches(path) for doc in batch]
+    return chunk_documents(documents + _distractors(distractors, seed))
+
+
+async def seed_collection(client: AsyncQdrantClient, embedding_model, chunks: list[dict]):
+    vectors = embedding_model.encode([c["content"] for c in chunks], batch_size=64)
+    await client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE),
+    )
+    await client.upsert(
+        collection_name=COLLECTION_NAME,
+        points=[
+            models.PointStruct(id=c["id"], vector=v.tolist(), payload={"content": c["content"], "source": c["source"]})
+            for v, c in zip(vectors, chunks)
+        ],
+    )
+
+
+def load_queries(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def is_relevant(content: str, query: dict) -> bool:
+    return any(marker in content for marker in query["relevant"])
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+async def _evaluate(service: AgentService, queries: list[dict], rerank: bool, repeats: int) -> dict:
+    hits = {k: 0 for k in K_VALUES}
+    reranked_hits = 0
+    latencies = []
+    for query in queries:
+        vector = (await service.embedding_batcher.submit(query["query"])).tolist()
+        for _ in range(repeats):
+            start = time.perf_counter()
+            candidates = await service._retrieve_candidates(query["query"], vector)
+            latencies.append(time.perf_counter() - start)
+        contents = [c.payload["content"] for c in candidates]
+        for k in K_VALUES:
+            hits[k] += any(is_relevant(c, query) for c in contents[:k])
+        if rerank:
+            final_docs = (await service._rerank_documents(query["query"], candidates))[:FINAL_CONTEXT_COUNT]
+            reranked_hits += any(is_relevant(c, query) for c in final_docs)
+    result = {f"recall@{k}": hits[k] / len(queries) for k in K_VALUES}
+    if rerank:
+        result[f"reranked_recall@{FINAL_CONTEXT_COUNT}"] = reranked_hits / len(queries)
+    result["latency_p50_ms"] = _percentile(latencies, 50) * 1000
+    result["latency_p95_ms"] = _percentile(latencies, 95) * 1000
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--distractors", type=int, default=2000, help="Số tài liệu nhiễu thêm vào corpus.")
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--repeats", type=int, default=5, help="Số lần lặp mỗi truy vấn khi đo độ trễ.")
+    parser.add_argument("--rerank", action="store_true", help="Đo thêm recall sau bước re-rank bằng cross-encoder.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    client = AsyncQdrantClient(location=":memory:")
+    service = AgentService(qdrant_client=client)
+    chunks = load_corpus(args.distractors, args.seed)
+    queries = load_queries(args.queries)
+    print(f"Corpus: {len(chunks)} chunks, queries: {len(queries)}, candidates per query: {RETRIEVAL_CANDIDATE_COUNT}")
+
+    await seed_collection(client, service.embedding_model, chunks)
+    start = time.perf_counter()
+    index = BM25Index.build((c["id"], c["content"]) for c in chunks)
+    print(f"BM25 index: {len(index.vocabulary)} terms, built in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    results = {}
+    service.bm25_index = None
+    results["dense"] = await _evaluate(service, queries, args.rerank, args.repeats)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Đi qua đúng đường nạp chỉ mục từ file như khi chạy thật.
+        index_path = os.path.join(tmp_dir, "bm25_index.npz")
+        index.save(index_path)
+        service.bm25_index = BM25IndexFile(index_path)
+        results["hybrid"] = await _evaluate(service, queries, args.rerank, args.repeats)
+    service.shutdown()
+
+    columns = list(results["dense"])
+    print(f"\n{'mode':<8}" + "".join(f"{c:>22}" for c in columns))
+    for mode, row in results.items():
+        print(f"{mode:<8}" + "".join(f"{row[c]:>22.3f}" for c in columns))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
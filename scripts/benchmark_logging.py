@@ -0,0 +1,73 @@
+# scripts/benchmark_logging.py
+"""
+Microbenchmark chi phí của MỘT lời gọi `logger.info(...)` (điển hình như trong logging_middleware) ở luồng gọi,
+theo từng chế độ logging (app/logging_config.py):
+  - sync:  render JSON + ghi stream ngay trong luồng gọi;
+  - async: chỉ đẩy bản ghi vào hàng đợi, thread nền render và ghi.
+Với chế độ async còn đo thời gian listener ghi hết hàng đợi (drain) và số bản ghi bị bỏ khi hàng đợi đầy.
+Log được ghi vào /dev/null (mặc định) hoặc một file (--output) để loại chi phí của terminal.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.benchmark_logging --calls 100000
+    LOG_SAMPLE_RATES='{"Request started": 0.1}' python -m scripts.benchmark_logging --modes async
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import structlog
+
+from app import logging_config
+
+
+def _bench_mode(mode: str, calls: int, output: str) -> dict:
+    with open(output, "w") as stream:
+        logging_config.setup_logging(mode=mode, stream=stream)
+        logger = structlog.get_logger("benchmark")
+        structlog.contextvars.bind_contextvars(request_id="3f2c9a4e-0000-4000-8000-000000000000", client_ip="127.0.0.1")
+
+        timings = np.empty(calls)
+        started_at = time.perf_counter()
+        for i in range(calls):
+            start = time.perf_counter_ns()
+            logger.info("Request started", method="POST", url="http://localhost:8000/api/v1/chat", i=i)
+            timings[i] = time.perf_counter_ns() - start
+        caller_s = time.perf_counter() - started_at
+
+        # Dừng listener = chờ ghi hết hàng đợi.
+        logging_config.shutdown_logging()
+        total_s = time.perf_counter() - started_at
+        structlog.contextvars.clear_contextvars()
+
+    return {
+        "mode": mode,
+        "p50_us": float(np.percentile(timings, 50)) / 1000,
+        "p99_us": float(np.percentile(timings, 99)) / 1000,
+        "mean_us": float(timings.mean()) / 1000,
+        "caller_s": caller_s,
+        "drain_s": total_s - caller_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark chi phí mỗi lời gọi log theo chế độ logging.")
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--output", default=os.devnull)
+    args = parser.parse_args()
+
+    rows = [_bench_mode(mode, args.calls, args.output) for mode in args.modes]
+    print(f"\norjson={logging_config.ORJSON_AVAILABLE} queue_size={logging_config.LOG_QUEUE_SIZE} "
+          f"overflow={logging_config.LOG_OVERFLOW} calls={args.calls}")
+    print(f"{'mode':<8}{'p50 us':>10}{'p99 us':>10}{'mean us':>10}{'caller s':>10}{'drain s':>10}")
+    for r in rows:
+        print(f"{r['mode']:<8}{r['p50_us']:>10.1f}{r['p99_us']:>10.1f}{r['mean_us']:>10.1f}"
+              f"{r['caller_s']:>10.2f}{r['drain_s']:>10.2f}")
+    dropped = logging_config.LOG_RECORDS_DROPPED.samples()
+    if dropped:
+        print("Dropped records:", ", ".join(dropped))
+
+
+if __name__ == "__main__":
+    main()
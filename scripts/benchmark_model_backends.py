@@ -0,0 +1,85 @@
+# scripts/benchmark_model_backends.py
+"""
+Benchmark độ trễ / throughput trên CPU của từng backend suy luận (torch, onnx, onnx-int8)
+cho đúng khối lượng công việc của một request:
+  - embedding: encode 1 câu hỏi (độ trễ) và encode các chunk theo batch (throughput);
+  - cross-encoder: chấm điểm RETRIEVAL_CANDIDATE_COUNT cặp (câu hỏi, tài liệu) (độ trễ) và throughput theo cặp.
+
+Backend ONNX được export vào MODEL_EXPORT_DIR ở lần chạy đầu (xem scripts/export_models.py).
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.benchmark_model_backends --backends torch onnx onnx-int8 --iterations 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.agent_service import CROSS_ENCODER_MODEL_NAME, EMBEDDING_MODEL_NAME, RETRIEVAL_CANDIDATE_COUNT
+from app.model_backends import BACKENDS, load_cross_encoder, load_embedding_model
+from scripts.benchmark_hybrid_retrieval import QUERIES_PATH, load_corpus, load_queries
+
+
+def _timed(fn, iterations: int) -> np.ndarray:
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    return np.asarray(timings)
+
+
+def _bench_backend(backend: str, queries: list[str], docs: list[str], iterations: int) -> dict:
+    start = time.perf_counter()
+    embedding_model = load_embedding_model(EMBEDDING_MODEL_NAME, backend=backend)
+    cross_encoder = load_cross_encoder(CROSS_ENCODER_MODEL_NAME, backend=backend)
+    load_seconds = time.perf_counter() - start
+
+    pairs_per_request = [[[q, d] for d in docs[:RETRIEVAL_CANDIDATE_COUNT]] for q in queries]
+    # Khởi động (warm-up) để loại bỏ chi phí lần gọi đầu.
+    embedding_model.encode(queries[:4])
+    cross_encoder.predict(pairs_per_request[0])
+
+    encode = _timed(lambda i: embedding_model.encode(queries[i % len(queries)]), iterations)
+    rerank = _timed(lambda i: cross_encoder.predict(pairs_per_request[i % len(queries)]), iterations)
+
+    start = time.perf_counter()
+    embedding_model.encode(docs, batch_size=64)
+    encode_throughput = len(docs) / (time.perf_counter() - start)
+    all_pairs = [pair for pairs in pairs_per_request for pair in pairs]
+    start = time.perf_counter()
+    cross_encoder.predict(all_pairs, batch_size=64)
+    rerank_throughput = len(all_pairs) / (time.perf_counter() - start)
+
+    return {
+        "backend": backend,
+        "load_s": load_seconds,
+        "encode_p50_ms": float(np.percentile(encode, 50) * 1000),
+        "encode_p95_ms": float(np.percentile(encode, 95) * 1000),
+        "encode_per_s": encode_throughput,
+        "rerank_p50_ms": float(np.percentile(rerank, 50) * 1000),
+        "rerank_p95_ms": float(np.percentile(rerank, 95) * 1000),
+        "pairs_per_s": rerank_throughput,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--iterations", type=int, default=200, help="Số lần đo độ trễ mỗi thao tác.")
+    parser.add_argument("--documents", type=int, default=1000, help="Số tài liệu dùng để đo throughput.")
+    args = parser.parse_args()
+
+    queries = [q["query"] for q in load_queries(QUERIES_PATH)]
+    docs = [c["content"] for c in load_corpus(args.documents, seed=7)]
+    results = [_bench_backend(backend, queries, docs, args.iterations) for backend in args.backends]
+
+    print(f"\nencode = 1 question, rerank = {RETRIEVAL_CANDIDATE_COUNT} pairs, throughput on {len(docs)} documents")
+    columns = [c for c in results[0] if c != "backend"]
+    print(f"{'backend':<10}" + "".join(f"{c:>15}" for c in columns))
+    for r in results:
+        print(f"{r['backend']:<10}" + "".join(f"{r[c]:>15.2f}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# scripts/benchmark_qdrant_profiles.py
+"""
+Benchmark các profile collection của Qdrant (app/qdrant_profiles.py): độ trễ tìm kiếm p50/p95 (REST và,
+tuỳ chọn, gRPC), recall@k so với tìm kiếm chính xác (brute-force numpy), recall và độ trễ khi lọc theo `source`,
+và bộ nhớ (ước lượng theo profile; đo thực tế qua /metrics của server nếu có).
+
+Dữ liệu là các vector đơn vị sinh ngẫu nhiên theo cụm (cùng số chiều với all-MiniLM-L6-v2), không cần mô hình.
+
+Nên chạy với một container Qdrant cục bộ (--url): chế độ local của qdrant-client chỉ tìm kiếm chính xác
+và bỏ qua lượng tử hoá, HNSW và payload index, nên mọi profile sẽ cho kết quả như nhau.
+
+Cách chạy (từ thư mục gốc của repo):
+    docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant:v1.9.0
+    python -m scripts.benchmark_qdrant_profiles --url http://localhost:6333 --points 100000 --grpc
+    python -m scripts.benchmark_qdrant_profiles --points 5000     # local mode, chỉ để kiểm tra script
+"""
+import argparse
+import time
+from urllib.parse import urlsplit
+
+import httpx
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from app.qdrant_profiles import PROFILES, ensure_payload_indexes, create_collection, get_profile
+
+VECTOR_SIZE = 384
+SOURCES = 20
+
+
+def make_dataset(points: int, queries: int, dim: int, seed: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vector theo cụm (giống embedding thật hơn nhiễu đều), đã chuẩn hoá; truy vấn là điểm lân cận các tâm cụm."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, points // 500), dim)).astype(np.float32)
+    data = centers[rng.integers(len(centers), size=points)] + 0.35 * rng.normal(size=(points, dim)).astype(np.float32)
+    query = centers[rng.integers(len(centers), size=queries)] + 0.35 * rng.normal(size=(queries, dim)).astype(np.float32)
+    data /= np.linalg.norm(data, axis=1, keepdims=True)
+    query /= np.linalg.norm(query, axis=1, keepdims=True)
+    sources = np.arange(points) % SOURCES
+    return data, query, sources
+
+
+def exact_top_k(data: np.ndarray, query: np.ndarray, k: int, mask: np.ndarray | None = None) -> list[set[int]]:
+    scores = query @ data.T
+    if mask is not None:
+        scores[:, ~mask] = -np.inf
+    return [set(np.argpartition(-row, k)[:k].tolist()) for row in scores]
+
+
+def _resident_bytes(url: str | None) -> int | None:
+    if url is None:
+        return None
+    try:
+        for line in httpx.get(f"{url.rstrip('/')}/metrics", timeout=5).text.splitlines():
+            if line.startswith("memory_resident_bytes"):
+                return int(float(line.split()[-1]))
+    except httpx.HTTPError:
+        pass
+    return None
+
+
+def _wait_indexed(client: QdrantClient, name: str, timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(name).status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    raise SystemExit(f"Collection {name} not indexed after {timeout:.0f}s")
+
+
+def _search_bench(client: QdrantClient, name: str, queries: np.ndarray, truth: list[set[int]], k: int,
+                  params: models.SearchParams | None, query_filter: models.Filter | None = None) -> dict:
+    latencies, hits = [], 0
+    for vector, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = client.search(collection_name=name, query_vector=vector.tolist(), limit=k,
+                               search_params=params, query_filter=query_filter, with_payload=False)
+        latencies.append(time.perf_counter() - start)
+        hits += len(expected & {point.id for point in result})
+    return {
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "recall": hits / (len(truth) * k),
+    }
+
+
+def bench_profile(name: str, clients: dict[str, QdrantClient], url: str | None, data: np.ndarray, queries: np.ndarray,
+                  sources: np.ndarray, truth: list[set[int]], filtered_truth: list[set[int]], k: int) -> list[dict]:
+    profile = get_profile(name)
+    client = next(iter(clients.values()))
+    collection = f"bench_{name.replace('-', '_')}"
+    memory_before = _resident_bytes(url)
+    create_collection(client, collection, data.shape[1], profile)
+    for start in range(0, len(data), 1024):
+        ids = range(start, min(start + 1024, len(data)))
+        client.upsert(collection_name=collection, points=models.Batch(
+            ids=list(ids),
+            vectors=data[start:start + 1024].tolist(),
+            payloads=[{"source": f"source_{sources[i]}.csv"} for i in ids],
+        ), wait=True)
+    ensure_payload_indexes(client, collection)
+    _wait_indexed(client, collection)
+    memory_after = _resident_bytes(url)
+
+    params = profile.search_params()
+    source_filter = models.Filter(must=[models.FieldCondition(key="source", match=models.MatchValue(value="source_3.csv"))])
+    rows = []
+    try:
+        for transport, transport_client in clients.items():
+            # Khởi động: kết nối, nạp trang mmap của profile on-disk.
+            _search_bench(transport_client, collection, queries[:20], truth[:20], k, params)
+            plain = _search_bench(transport_client, collection, queries, truth, k, params)
+            filtered = _search_bench(transport_client, collection, queries, filtered_truth, k, params, source_filter)
+            rows.append({
+                "profile": name, "transport": transport, **plain,
+                "filtered_p50_ms": filtered["p50_ms"], "filtered_recall": filtered["recall"],
+                "est_ram_mb": profile.estimated_ram_bytes(len(data), data.shape[1]) / 2**20,
+                "rss_delta_mb": (memory_after - memory_before) / 2**20
+                if memory_before is not None and memory_after is not None else None,
+            })
+    finally:
+        client.delete_collection(collection)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Qdrant server (ví dụ http://localhost:6333). Bỏ trống = local mode in-memory.")
+    parser.add_argument("--grpc", action="store_true", help="Đo thêm qua gRPC (cổng 6334).")
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.url:
+        host = urlsplit(args.url).hostname
+        clients = {"rest": QdrantClient(url=args.url, timeout=60)}
+        if args.grpc:
+            clients["grpc"] = QdrantClient(host=host, grpc_port=6334, prefer_grpc=True, timeout=60)
+    else:
+        print("WARNING: local mode runs exact search and ignores quantization, HNSW and payload indexes.")
+        clients = {"local": QdrantClient(location=":memory:")}
+
+    data, queries, sources = make_dataset(args.points, args.queries, VECTOR_SIZE, args.seed)
+    truth = exact_top_k(data, queries, args.k)
+    filtered_truth = exact_top_k(data, queries, args.k, mask=sources == 3)
+
+    rows = [row for name in args.profiles
+            for row in bench_profile(name, clients, args.url, data, queries, sources, truth, filtered_truth, args.k)]
+    print(f"\n{args.points} points x {VECTOR_SIZE} dims, {args.queries} queries, recall@{args.k} vs exact search")
+    print(f"{'profile':<13}{'transport':<10}{'p50 ms':>8}{'p95 ms':>8}{'recall':>8}"
+          f"{'filt p50':>10}{'filt rec':>10}{'est RAM MB':>12}{'RSS Δ MB':>10}")
+    for r in rows:
+        rss = f"{r['rss_delta_mb']:.0f}" if r["rss_delta_mb"] is not None else "-"
+        print(f"{r['profile']:<13}{r['transport']:<10}{r['p50_ms']:>8.2f}{r['p95_ms']:>8.2f}{r['recall']:>8.3f}"
+              f"{r['filtered_p50_ms']:>10.2f}{r['filtered_recall']:>10.3f}{r['est_ram_mb']:>12.0f}{rss:>10}")
+
+
+if __name__ == "__main__":
+    main()
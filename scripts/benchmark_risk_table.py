@@ -0,0 +1,145 @@
+# scripts/benchmark_risk_table.py
+"""
+Benchmark bảng điểm rủi ro chấm trước (app/risk_table.py) trên một bảng tổng hợp (mặc định 10 triệu địa chỉ).
+
+Báo cáo: thời gian xây bảng, dung lượng trên đĩa; trong một tiến trình con mới (để RSS không tính phần xây bảng):
+độ trễ p50/p99 và thông lượng tra từng địa chỉ (hit và miss, qua RiskTableFile.lookup như anomaly_detector),
+thông lượng tra hàng loạt (find_many), và RSS sau khi mở bảng / sau khi tra (tách phần ẩn danh và phần trang
+file dùng chung). So sánh với một dict Python chứa --dict-sample địa chỉ, ngoại suy lên kích thước bảng.
+
+Bảng vừa được ghi nên nằm sẵn trong page cache; muốn đo tra cứu "lạnh" thì xoá page cache
+(echo 3 > /proc/sys/vm/drop_caches, cần root) rồi chạy lại với --lookup-only --out <thư mục bảng>.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.benchmark_risk_table --rows 10000000 --queries 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.graph_engine import ADDRESS_DTYPE, decode_address
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def _rss_mb(field: str = "VmRSS") -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _dir_size_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+
+
+def build(rows: int, out: str, seed: int) -> dict:
+    from app.risk_table import build_risk_table
+
+    rng = np.random.default_rng(seed)
+    addresses = np.frombuffer(rng.bytes(20 * rows), dtype=ADDRESS_DTYPE)
+    probability = rng.beta(0.5, 5.0, rows).astype(np.float32)
+    labels = np.where(probability > 0.5, "Fraud", "Normal")
+    scored_at = int(time.time()) - rng.integers(0, 3 * 24 * 3600, rows)
+    return build_risk_table(addresses, probability, labels, scored_at, out)
+
+
+def _time_lookups(fn, addresses: list[str]) -> tuple[list[float], float]:
+    latencies = []
+    started = time.perf_counter()
+    for address in addresses:
+        start = time.perf_counter()
+        fn(address)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies, len(addresses) / (time.perf_counter() - started)
+
+
+def lookup_bench(path: str, queries: int, dict_sample: int, seed: int) -> dict:
+    from app.risk_table import RiskTableFile
+
+    rss_start = _rss_mb()
+    table_file = RiskTableFile(path)
+    table = table_file.get()
+    rss_open = _rss_mb()
+
+    rng = np.random.default_rng(seed + 1)
+    hit_rows = np.sort(rng.integers(0, len(table), queries))
+    hits = [decode_address(bytes(a)) for a in np.asarray(table.addresses[hit_rows])]
+    rng.shuffle(hits)
+    misses = [decode_address(rng.bytes(20)) for _ in range(queries)]
+
+    results = {"rows": len(table), "rss_start_mb": rss_start, "rss_open_mb": rss_open}
+    for name, addresses in (("hit", hits), ("miss", misses)):
+        latencies, rate = _time_lookups(table_file.lookup, addresses)
+        results[name] = {"p50_us": _percentile(latencies, 50), "p99_us": _percentile(latencies, 99), "per_s": rate}
+    assert table_file.stats()["hits"] == queries, "every sampled table address should hit"
+
+    start = time.perf_counter()
+    found = table.find_many(hits + misses)
+    results["batch_per_s"] = 2 * queries / (time.perf_counter() - start)
+    assert int((found >= 0).sum()) == queries
+    results["rss_after_mb"] = _rss_mb()
+    # Trang của bảng là trang file (page cache, dùng chung giữa các worker, hệ điều hành thu hồi được khi thiếu RAM).
+    results["rss_anon_mb"], results["rss_file_mb"] = _rss_mb("RssAnon"), _rss_mb("RssFile")
+
+    if dict_sample:
+        before = _rss_mb()
+        sample = {decode_address(rng.bytes(20)): ("Normal", 0.1, 1_700_000_000) for _ in range(dict_sample)}
+        results["dict_mb_extrapolated"] = (_rss_mb() - before) * len(table) / len(sample)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--dict-sample", type=int, default=1_000_000,
+                        help="Addresses in the in-memory dict baseline (0 = skip).")
+    parser.add_argument("--out", help="Table directory (default: a temporary directory).")
+    parser.add_argument("--lookup-only", action="store_true", help="Benchmark an existing table at --out.")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if args.lookup_only and not args.out:
+        parser.error("--lookup-only needs --out")
+
+    if args.json:
+        print(json.dumps(lookup_bench(args.out, args.queries, args.dict_sample, args.seed)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="risk-table-bench-") as tmp:
+        out = args.out or os.path.join(tmp, "risk_table")
+        if not args.lookup_only:
+            meta = build(args.rows, out, args.seed)
+            print(f"Built {meta['rows']:,} rows in {meta['build_seconds']:.1f}s, {_dir_size_mb(out):.0f} MB on disk")
+        child = subprocess.run(
+            [sys.executable, "-m", "scripts.benchmark_risk_table", "--json", "--out", out,
+             "--queries", str(args.queries), "--dict-sample", str(args.dict_sample), "--seed", str(args.seed)],
+            check=True, capture_output=True, text=True,
+        )
+        r = json.loads(child.stdout.strip().splitlines()[-1])
+
+    print(f"\n{r['rows']:,} addresses, {args.queries:,} lookups each (fresh process)")
+    for name in ("hit", "miss"):
+        s = r[name]
+        print(f"lookup {name:<5} p50={s['p50_us']:7.1f}µs p99={s['p99_us']:7.1f}µs {s['per_s']:>12,.0f} lookups/s")
+    print(f"find_many (batch)  {r['batch_per_s']:>38,.0f} lookups/s")
+    print(f"RSS: start {r['rss_start_mb']:.0f} MB, after open {r['rss_open_mb']:.0f} MB, "
+          f"after lookups {r['rss_after_mb']:.0f} MB (anon {r['rss_anon_mb']:.0f} MB, "
+          f"file-backed/shared {r['rss_file_mb']:.0f} MB)")
+    if "dict_mb_extrapolated" in r:
+        print(f"In-memory dict baseline: ~{r['dict_mb_extrapolated']:,.0f} MB for {r['rows']:,} addresses")
+
+
+if __name__ == "__main__":
+    main()
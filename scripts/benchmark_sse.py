@@ -0,0 +1,146 @@
+# scripts/benchmark_sse.py
+"""
+Benchmark lớp streaming SSE (app/streaming.py): số stream đồng thời mà MỘT lõi CPU phục vụ được
+("streams per core") theo cửa sổ gộp token SSE_COALESCE_MS, và kiểm tra việc huỷ upstream khi client ngắt.
+
+Backend là một app FastAPI tối giản chạy trong tiến trình con (uvicorn), trả về sse_events(...) bọc một
+upstream giả phát token với tốc độ cố định (như LLM), nên chỉ đo chi phí framing/ghi/ASGI của server.
+CPU của tiến trình server đọc từ /proc/<pid>/stat (chỉ Linux). streams/core = số stream * thời lượng danh nghĩa
+của một stream (tokens / tốc độ) / CPU-giây của server: số stream chạy liên tục mà một lõi gánh được.
+Dùng thời lượng danh nghĩa, không dùng thời gian thực tế: server quá tải thì stream kéo dài hơn, làm chỉ số đẹp giả.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.benchmark_sse --streams 200 --tokens 300 --tokens-per-second 50 --windows 0 30 100
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from scripts.load_test_remote_tools import _free_port
+
+
+def create_app() -> FastAPI:
+    from app.streaming import StatusEvent, sse_events
+
+    app = FastAPI(title="SSE benchmark backend")
+    app.state.counters = {"started": 0, "completed": 0, "cancelled": 0}
+
+    async def upstream(tokens: int, tokens_per_second: float):
+        counters = app.state.counters
+        counters["started"] += 1
+        try:
+            yield StatusEvent("Đang tổng hợp câu trả lời...")
+            for i in range(tokens):
+                await asyncio.sleep(1 / tokens_per_second)
+                yield f" tok{i}"
+            counters["completed"] += 1
+        except (asyncio.CancelledError, GeneratorExit):
+            counters["cancelled"] += 1
+            raise
+
+    @app.post("/stream")
+    async def stream(tokens: int = 300, tokens_per_second: float = 50.0):
+        return StreamingResponse(sse_events(upstream(tokens, tokens_per_second)), media_type="text/event-stream")
+
+    @app.get("/counters")
+    async def counters():
+        return app.state.counters
+
+    return app
+
+
+def _cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime, stime (trường 14, 15 tính từ 1; ở đây đã bỏ pid và comm).
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def _consume(client: httpx.AsyncClient, url: str, params: dict, close_after_events: int | None = None) -> int:
+    events = 0
+    async with client.stream("POST", url, params=params) as response:
+        async for text in response.aiter_text():
+            events += text.count("\n\n")
+            if close_after_events is not None and events >= close_after_events:
+                break
+    return events
+
+
+async def _bench_window(window_ms: float, args) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "SSE_COALESCE_MS": str(window_ms)}
+    process = subprocess.Popen([sys.executable, "-m", "scripts.benchmark_sse", "--serve", "--port", str(port)], env=env)
+    limits = httpx.Limits(max_connections=args.streams + 10, max_keepalive_connections=args.streams + 10)
+    params = {"tokens": args.tokens, "tokens_per_second": args.tokens_per_second}
+    try:
+        async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(120.0)) as client:
+            for _ in range(200):
+                try:
+                    await client.get(f"{base_url}/counters")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+
+            cpu_before, start = _cpu_seconds(process.pid), time.perf_counter()
+            events = await asyncio.gather(*(_consume(client, f"{base_url}/stream", params) for _ in range(args.streams)))
+            wall, cpu = time.perf_counter() - start, _cpu_seconds(process.pid) - cpu_before
+
+            # Ngắt kết nối giữa chừng: upstream phải bị huỷ, không chạy tiếp tới hết.
+            before = (await client.get(f"{base_url}/counters")).json()
+            # Client riêng không giữ kết nối: kết nối bị đóng giữa chừng không được tái sử dụng.
+            async with httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=0)) as dropping:
+                await asyncio.gather(*(_consume(dropping, f"{base_url}/stream", params, close_after_events=3)
+                                       for _ in range(args.disconnects)))
+            await asyncio.sleep(0.5)
+            after = (await client.get(f"{base_url}/counters")).json()
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    return {
+        "window_ms": window_ms,
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "streams_per_core": args.streams * (args.tokens / args.tokens_per_second) / cpu if cpu > 0 else float("inf"),
+        "events_per_stream": sum(events) / len(events),
+        "cancelled": after["cancelled"] - before["cancelled"],
+    }
+
+
+async def run(args):
+    print(f"{args.streams} concurrent streams x {args.tokens} tokens @ {args.tokens_per_second} tok/s; "
+          f"{args.disconnects} early disconnects")
+    print(f"{'window ms':>10}{'wall s':>9}{'cpu s':>8}{'streams/core':>14}{'events/stream':>15}{'cancelled':>11}")
+    for window in args.windows:
+        r = await _bench_window(window, args)
+        print(f"{r['window_ms']:>10.0f}{r['wall_s']:>9.2f}{r['cpu_s']:>8.2f}{r['streams_per_core']:>14.0f}"
+              f"{r['events_per_stream']:>15.1f}{r['cancelled']:>8}/{args.disconnects}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streams/core của lớp SSE theo cửa sổ gộp token.")
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 30, 100])
+    parser.add_argument("--disconnects", type=int, default=20)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=9300, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        uvicorn.run(create_app(), host="127.0.0.1", port=args.port, log_level="warning")
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# scripts/benchmark_startup.py
+"""
+Đo thời gian khởi động nguội và bộ nhớ mỗi worker của backend với N worker, theo từng chế độ chạy:
+  - uvicorn:     `uvicorn app.main:app --workers N` (spawn, mỗi worker tự import và nạp mô hình) — cách chạy cũ;
+  - no-preload:  `python -m app.serve --no-preload` (fork, mỗi worker tự nạp mô hình);
+  - preload:     `python -m app.serve` (nạp mô hình ở tiến trình cha rồi fork, trọng số chia sẻ copy-on-write).
+
+Với mỗi chế độ: thời gian tới khi /api/v1/health trả 200 (cổng mở) và tới khi cả N worker báo /api/v1/ready
+(mô hình đã nạp + warm-up), cùng RSS và PSS của từng worker đọc từ /proc/<pid>/smaps_rollup (chỉ Linux).
+PSS chia phần bộ nhớ dùng chung cho số tiến trình chia sẻ, nên phản ánh đúng mức tiết kiệm của copy-on-write;
+RSS thì đếm trọn trang dùng chung cho mỗi worker.
+
+Backend dùng Qdrant in-memory (QDRANT_LOCATION=:memory:), không cần server Qdrant hay Ollama.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.benchmark_startup --workers 4 --modes uvicorn preload
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from scripts.load_test_remote_tools import _free_port
+
+MODES = ("uvicorn", "no-preload", "preload")
+
+
+def _command(mode: str, port: int, workers: int) -> list[str]:
+    if mode == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers)]
+    command = [sys.executable, "-m", "app.serve", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    return command + (["--no-preload"] if mode == "no-preload" else [])
+
+
+def _memory_kb(pid: int) -> dict:
+    """Rss/Pss (kB) của một tiến trình, từ /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key.lower()] = int(rest.split()[0])
+    return values
+
+
+def _bench_mode(mode: str, workers: int, timeout: float) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "QDRANT_LOCATION": os.getenv("QDRANT_LOCATION", ":memory:")}
+    started_at = time.perf_counter()
+    process = subprocess.Popen(_command(mode, port, workers), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    health_s = None
+    ready_pids: set[int] = set()
+    try:
+        with httpx.Client(timeout=2.0) as client:
+            while len(ready_pids) < workers:
+                if time.perf_counter() - started_at > timeout:
+                    raise SystemExit(f"[{mode}] Only {len(ready_pids)}/{workers} workers ready after {timeout}s")
+                if process.poll() is not None:
+                    raise SystemExit(f"[{mode}] Backend exited during startup with code {process.returncode}")
+                try:
+                    if health_s is None and client.get(f"{base_url}/api/v1/health").status_code == 200:
+                        health_s = time.perf_counter() - started_at
+                    # Kết nối mới mỗi lần để yêu cầu rơi vào các worker khác nhau (socket dùng chung).
+                    response = client.get(f"{base_url}/api/v1/ready", headers={"Connection": "close"})
+                    if response.status_code == 200:
+                        ready_pids.add(response.json()["pid"])
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.05)
+            ready_s = time.perf_counter() - started_at
+        memory = [_memory_kb(pid) for pid in sorted(ready_pids)]
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    return {
+        "mode": mode,
+        "health_s": health_s,
+        "all_ready_s": ready_s,
+        "rss_mb_per_worker": sum(m["rss"] for m in memory) / len(memory) / 1024,
+        "pss_mb_per_worker": sum(m["pss"] for m in memory) / len(memory) / 1024,
+        "pss_mb_total": sum(m["pss"] for m in memory) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold start và bộ nhớ mỗi worker theo chế độ chạy.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<12}{'health s':>10}{'ready s':>10}{'RSS/worker MB':>15}{'PSS/worker MB':>15}{'PSS total MB':>14}")
+    for mode in args.modes:
+        r = _bench_mode(mode, args.workers, args.timeout)
+        health = f"{r['health_s']:.2f}" if r["health_s"] is not None else "-"
+        print(f"{r['mode']:<12}{health:>10}{r['all_ready_s']:>10.2f}{r['rss_mb_per_worker']:>15.0f}"
+              f"{r['pss_mb_per_worker']:>15.0f}{r['pss_mb_total']:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# scripts/build_graph_index.py
+"""
+Xây chỉ mục đồ thị giao dịch cục bộ (CSR, mảng .npy ánh xạ bộ nhớ) cho công cụ graph_handler
+khi chạy với GRAPH_BACKEND=local.
+
+Đầu vào: một hoặc nhiều file danh sách cạnh CSV (đọc theo khối) hoặc Parquet (cần pyarrow),
+mỗi dòng là một giao dịch (from, to, value, timestamp). Timestamp có thể là số (epoch giây) hoặc chuỗi ngày giờ.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.build_graph_index data/edges_*.csv --out app/data/graph
+    python -m scripts.build_graph_index transfers.parquet --from-col from_address --to-col to_address --value-col amount --ts-col block_timestamp
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.graph_engine import GRAPH_INDEX_DIR, build_graph_index, iter_edge_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="Edge list files (.csv or .parquet).")
+    parser.add_argument("--out", default=GRAPH_INDEX_DIR)
+    parser.add_argument("--from-col", default="from")
+    parser.add_argument("--to-col", default="to")
+    parser.add_argument("--value-col", default="value")
+    parser.add_argument("--ts-col", default="timestamp")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    columns = {"from": args.from_col, "to": args.to_col, "value": args.value_col, "timestamp": args.ts_col}
+    start = time.perf_counter()
+    parts = []
+    for path in args.inputs:
+        for chunk in iter_edge_chunks(path, columns, args.chunk_rows):
+            parts.append(chunk)
+        print(f"Read {path}: {sum(len(p[0]) for p in parts):,} edges so far ({time.perf_counter() - start:.1f}s)")
+    if not parts or not sum(len(p[0]) for p in parts):
+        raise SystemExit("No valid edges found in the input files.")
+
+    src, dst, value, ts = (np.concatenate([p[i] for p in parts]) for i in range(4))
+    del parts
+    meta = build_graph_index(src, dst, value, ts, args.out)
+    print(f"Graph index written to {args.out}: {meta['nodes']:,} nodes, {meta['edges']:,} edges "
+          f"(build {meta['build_seconds']:.1f}s, total {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
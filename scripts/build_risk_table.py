@@ -0,0 +1,116 @@
+# scripts/build_risk_table.py
+"""
+Xây bảng điểm rủi ro chấm trước (app/risk_table.py) cho công cụ anomaly_detector: địa chỉ có trong bảng
+(và điểm còn hạn, RISK_TABLE_MAX_AGE_SECONDS) được trả lời ngay mà không gọi Anomaly Detection API.
+
+Nguồn điểm:
+  - file điểm có sẵn: CSV / Parquet (cần pyarrow) / NDJSON (ví dụ: đầu ra của /api/v1/screen), cột
+    address, prediction, probability_fraud và (tuỳ chọn) scored_at;
+  - --score: danh sách địa chỉ (CSV, như /api/v1/screen) được chấm lại qua dịch vụ, bỏ qua bảng cũ và cache.
+--merge giữ các địa chỉ của bảng hiện có; địa chỉ trùng lấy bản chấm mới nhất.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.build_risk_table scores.parquet --out app/data/risk_table
+    python -m scripts.build_risk_table --score watchlist.csv --concurrency 32 --save-scores scores.ndjson --merge
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+
+from app import http_clients, tools
+from app.graph_engine import encode_addresses
+from app.risk_table import RISK_TABLE_DIR, RiskTable, build_risk_table, iter_score_chunks
+from app.router import ADDRESS_PATTERN
+from app.screening import parse_address_csv
+
+
+async def score_addresses(addresses: list[str], concurrency: int, save_path: str | None) -> tuple[np.ndarray, ...]:
+    """Chấm từng địa chỉ qua dịch vụ (trực tiếp, không qua bảng cũ hay cache); địa chỉ lỗi bị bỏ qua."""
+    semaphore = asyncio.Semaphore(concurrency)
+    scored: list[tuple[str, float, str, int]] = []
+    failed = 0
+
+    async def one(address: str):
+        nonlocal failed
+        async with semaphore:
+            try:
+                result = await tools._request_anomaly(address)
+            except Exception as e:
+                failed += 1
+                print(f"  {address}: {type(e).__name__}: {e}")
+                return
+        scored.append((address, float(result["probability_fraud"]), str(result["prediction"]), int(time.time())))
+        if len(scored) % 1000 == 0:
+            print(f"  scored {len(scored):,}/{len(addresses):,}")
+
+    try:
+        await asyncio.gather(*(one(a) for a in addresses))
+    finally:
+        await http_clients.close_http_clients()
+    print(f"Scored {len(scored):,} addresses ({failed:,} failed)")
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            for address, probability, prediction, scored_at in scored:
+                f.write(json.dumps({"address": address, "status": "ok", "prediction": prediction,
+                                    "probability_fraud": probability, "scored_at": scored_at},
+                                   ensure_ascii=False) + "\n")
+    encoded, _ = encode_addresses([s[0] for s in scored])
+    return (encoded, np.array([s[1] for s in scored], dtype=np.float32),
+            np.array([s[2] for s in scored], dtype=str), np.array([s[3] for s in scored], dtype=np.int64))
+
+
+def existing_rows(path: str) -> tuple[np.ndarray, ...]:
+    table = RiskTable.open(path)
+    labels = np.asarray(table.labels, dtype=str)[np.asarray(table.label)]
+    return (np.asarray(table.addresses), np.asarray(table.probability), labels,
+            np.asarray(table.scored_at, dtype=np.int64))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="Score files (.csv, .parquet, .ndjson/.jsonl).")
+    parser.add_argument("--score", help="Address list (CSV) to score through the anomaly service.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--save-scores", help="Also write the freshly scored results as NDJSON.")
+    parser.add_argument("--merge", action="store_true", help="Keep the rows of the existing table at --out.")
+    parser.add_argument("--out", default=RISK_TABLE_DIR)
+    parser.add_argument("--address-col", default="address")
+    parser.add_argument("--prediction-col", default="prediction")
+    parser.add_argument("--probability-col", default="probability_fraud")
+    parser.add_argument("--scored-at-col", default="scored_at")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    if not args.inputs and not args.score:
+        parser.error("give score files and/or --score")
+
+    columns = {"address": args.address_col, "prediction": args.prediction_col,
+               "probability": args.probability_col, "scored_at": args.scored_at_col}
+    start = time.perf_counter()
+    parts = []
+    if args.merge and os.path.exists(os.path.join(args.out, "meta.json")):
+        parts.append(existing_rows(args.out))
+        print(f"Existing table {args.out}: {len(parts[0][0]):,} rows")
+    for path in args.inputs:
+        for chunk in iter_score_chunks(path, columns, args.chunk_rows):
+            parts.append(chunk)
+        print(f"Read {path}: {sum(len(p[0]) for p in parts):,} rows so far ({time.perf_counter() - start:.1f}s)")
+    if args.score:
+        with open(args.score, "r", encoding="utf-8") as f:
+            addresses = [a.strip() for a in parse_address_csv(f.read()) if ADDRESS_PATTERN.fullmatch(a.strip())]
+        parts.append(asyncio.run(score_addresses(addresses, args.concurrency, args.save_scores)))
+    if not sum(len(p[0]) for p in parts):
+        raise SystemExit("No valid scores found.")
+
+    addresses, probability, labels, scored_at = (np.concatenate([p[i] for p in parts]) for i in range(4))
+    del parts
+    meta = build_risk_table(addresses, probability, labels, scored_at, args.out)
+    print(f"Risk table written to {args.out}: {meta['rows']:,} addresses, labels {meta['labels']} "
+          f"(build {meta['build_seconds']:.1f}s, total {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
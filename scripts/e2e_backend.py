@@ -0,0 +1,58 @@
+# scripts/e2e_backend.py
+"""
+Chạy backend (app.main:app) hoàn toàn cục bộ cho benchmark end-to-end:
+Qdrant in-memory được nạp sẵn knowledge_base/ (+ tài liệu nhiễu tuỳ chọn) và chỉ mục BM25 tương ứng.
+Ollama và các dịch vụ phân tích được trỏ tới stub qua biến môi trường
+(OLLAMA_BASE_URL, ANOMALY_SERVICE_URL, GRAPH_SERVICE_URL) — scripts/e2e_benchmark.py tự thiết lập.
+
+Mọi biến cấu hình khác của app (RETRIEVAL_MODE, SPECULATIVE_KB_RETRIEVAL, ...) được giữ nguyên,
+nên có thể so sánh hai cấu hình bằng cách chạy benchmark hai lần với môi trường khác nhau.
+
+Cách chạy (từ thư mục gốc của repo):
+    OLLAMA_BASE_URL=http://localhost:11500 python -m scripts.e2e_backend --port 8100 --distractors 500
+"""
+import os
+import tempfile
+
+# Phải đặt trước khi import app: client Qdrant và đường dẫn chỉ mục BM25 được đọc lúc import.
+os.environ.setdefault("QDRANT_LOCATION", ":memory:")
+os.environ.setdefault("BM25_INDEX_PATH", os.path.join(tempfile.mkdtemp(prefix="e2e-bm25-"), "bm25_index.npz"))
+
+import argparse  # noqa: E402
+
+import uvicorn  # noqa: E402
+
+from app import main as app_main  # noqa: E402
+from app.bm25 import BM25_INDEX_PATH, BM25Index  # noqa: E402
+from app.vector_store_client import get_db_client  # noqa: E402
+from scripts.benchmark_hybrid_retrieval import load_corpus, seed_collection  # noqa: E402
+
+
+def install_seeding(distractors: int, seed: int):
+    """Bọc bước khởi tạo nền của app: sau khi AgentService khởi tạo xong thì nạp dữ liệu, trước khi /ready báo sẵn sàng."""
+    original = app_main.initialize_services
+
+    async def initialize_and_seed():
+        await original()
+        chunks = load_corpus(distractors, seed)
+        # Qdrant cục bộ chỉ có client async (cũng là client của đường truy vấn): nạp dữ liệu qua chính nó.
+        await seed_collection(get_db_client().async_client, app_main.agent_service_instance.embedding_model, chunks)
+        BM25Index.build([(c["id"], c["content"]) for c in chunks]).save(BM25_INDEX_PATH)
+        print(f"Seeded {len(chunks)} chunks into in-memory Qdrant.")
+
+    app_main.initialize_services = initialize_and_seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--distractors", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    install_seeding(args.distractors, args.seed)
+    uvicorn.run(app_main.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
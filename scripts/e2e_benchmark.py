@@ -0,0 +1,281 @@
+# scripts/e2e_benchmark.py
+"""
+Benchmark end-to-end hoàn toàn offline cho /api/v1/chat.
+
+Dựng sẵn các thành phần thay thế cục bộ:
+  - stub Ollama streaming với tốc độ token cấu hình được (scripts/stub_ollama.py);
+  - stub Anomaly/Graph API và search engine giả có tiêm độ trễ (scripts/stub_services.py);
+  - backend thật (app.main:app) với Qdrant in-memory nạp sẵn knowledge_base/ (scripts/e2e_backend.py),
+    chạy trong tiến trình con để không chia sẻ event loop với bộ sinh tải.
+Sau đó phát lại workload hỗn hợp (scripts/data/e2e_workload.jsonl, chọn theo trọng số, địa chỉ lấy từ
+một tập cố định) và báo cáo RPS, TTFT (tới token trả lời đầu tiên) và độ trễ tổng p50/p95/p99,
+tổng hợp và theo từng loại câu hỏi.
+
+Kết quả ghi ra JSON (--output) để so sánh giữa các commit (--compare baseline.json).
+Câu hỏi loại "web" đi qua search engine giả (WEB_SEARCH_BACKEND=http) nhưng mặc định vẫn bị loại
+để giữ số liệu so sánh được với các báo cáo cũ (thêm bằng --kinds kb anomaly graph web).
+Biến môi trường của app (RETRIEVAL_MODE, SPECULATIVE_KB_RETRIEVAL, ...) được truyền nguyên cho backend.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.e2e_benchmark --requests 200 --concurrency 16 --output bench/e2e.json
+    python -m scripts.e2e_benchmark --requests 200 --concurrency 16 --compare bench/e2e.json
+    python -m scripts.e2e_benchmark --backend-url http://localhost:8000   # backend đang chạy sẵn
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+import uvicorn
+
+from scripts.load_test_remote_tools import _free_port
+from scripts.stub_ollama import OllamaStubConfig, create_app as create_ollama_app
+from scripts.stub_services import StubConfig, create_app as create_services_app
+
+WORKLOAD_PATH = "scripts/data/e2e_workload.jsonl"
+PERCENTILES = (50, 95, 99)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def load_workload(path: str, kinds: list[str], requests: int, address_pool: int, seed: int) -> list[dict]:
+    """Sinh danh sách câu hỏi xác định theo seed, để các lần chạy phát lại đúng cùng một chuỗi yêu cầu."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = [e for e in (json.loads(line) for line in f if line.strip()) if e["kind"] in kinds]
+    if not entries:
+        raise SystemExit(f"No workload entries for kinds {kinds} in {path}")
+    rng = random.Random(seed)
+    addresses = ["0x" + rng.getrandbits(160).to_bytes(20, "big").hex() for _ in range(address_pool)]
+    picks = rng.choices(entries, weights=[e.get("weight", 1) for e in entries], k=requests)
+    return [{"kind": e["kind"], "question": e["question"].replace("{address}", rng.choice(addresses))} for e in picks]
+
+
+async def _start_server(app, port: int) -> tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def _wait_ready(client: httpx.AsyncClient, base_url: str, process: subprocess.Popen | None, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Backend exited during startup with code {process.returncode}")
+        try:
+            # /ready trả 503 cho tới khi mô hình đã nạp, warm-up và seed dữ liệu xong.
+            if (await client.get(f"{base_url}/api/v1/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit(f"Backend at {base_url} not ready after {timeout:.0f}s")
+
+
+def parse_sse(buffer: str) -> tuple[list[tuple[str, dict]], str]:
+    """Tách các sự kiện SSE hoàn chỉnh khỏi bộ đệm; trả về (các sự kiện (tên, data), phần còn dở)."""
+    *blocks, rest = buffer.split("\n\n")
+    events = []
+    for block in blocks:
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if line and not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields.get("data", "{}"))))
+    return events, rest
+
+
+async def _one(client: httpx.AsyncClient, base_url: str, item: dict) -> dict:
+    result = {"kind": item["kind"], "ok": False, "ttft": None, "latency": None, "chars": 0}
+    start = time.perf_counter()
+    buffer = ""
+    done = False
+    try:
+        async with client.stream("POST", f"{base_url}/api/v1/chat", json={"question": item["question"]}) as response:
+            result["status"] = response.status_code
+            async for text in response.aiter_text():
+                events, buffer = parse_sse(buffer + text)
+                for event, data in events:
+                    if event == "token":
+                        result["chars"] += len(data["text"])
+                        if result["ttft"] is None:
+                            result["ttft"] = time.perf_counter() - start
+                    elif event == "error":
+                        result["error"] = "stream_error"
+                    elif event == "done":
+                        done = True
+            result["ok"] = response.status_code == 200 and done and result["ttft"] is not None
+    except httpx.HTTPError as e:
+        result["error"] = type(e).__name__
+    result["latency"] = time.perf_counter() - start
+    return result
+
+
+async def drive(base_url: str, workload: list[dict], concurrency: int, rate: float) -> tuple[list[dict], float]:
+    """Closed-loop với `concurrency` yêu cầu đồng thời; nếu `rate` > 0 thì open-loop (Poisson) với tốc độ đó."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    timeout = httpx.Timeout(120.0, connect=10.0)
+    results: list[dict] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(0)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def run(item: dict):
+            async with semaphore:
+                results.append(await _one(client, base_url, item))
+
+        start = time.perf_counter()
+        tasks = []
+        for item in workload:
+            tasks.append(asyncio.create_task(run(item)))
+            if rate > 0:
+                await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+        return results, time.perf_counter() - start
+
+
+def summarize(results: list[dict], elapsed: float) -> dict:
+    def block(rows: list[dict]) -> dict:
+        ok = [r for r in rows if r["ok"]]
+        ttft = [r["ttft"] for r in ok]
+        latency = [r["latency"] for r in ok]
+        rejected = sum(1 for r in rows if r.get("status") in (429, 503))
+        out = {"requests": len(rows), "errors": len(rows) - len(ok) - rejected, "rejected": rejected}
+        out.update({f"ttft_p{p}_ms": round(_percentile(ttft, p) * 1000, 2) for p in PERCENTILES})
+        out.update({f"latency_p{p}_ms": round(_percentile(latency, p) * 1000, 2) for p in PERCENTILES})
+        return out
+
+    overall = {"elapsed_s": round(elapsed, 3), "rps": round(sum(r["ok"] for r in results) / elapsed, 3) if elapsed else 0.0,
+               **block(results)}
+    by_kind = {kind: block([r for r in results if r["kind"] == kind]) for kind in sorted({r["kind"] for r in results})}
+    return {"overall": overall, "by_kind": by_kind}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_report(report: dict, baseline: dict | None):
+    columns = ["requests", "errors", "rejected", *(f"ttft_p{p}_ms" for p in PERCENTILES), *(f"latency_p{p}_ms" for p in PERCENTILES)]
+    overall = report["overall"]
+    print(f"\nrps={overall['rps']:.2f} elapsed={overall['elapsed_s']:.1f}s commit={report['meta']['commit']}")
+    print(f"{'kind':<10}" + "".join(f"{c:>17}" for c in columns))
+    rows = [("overall", overall), *report["by_kind"].items()]
+    for kind, values in rows:
+        print(f"{kind:<10}" + "".join(f"{values[c]:>17}" for c in columns))
+        if baseline is not None:
+            base = baseline["overall"] if kind == "overall" else baseline["by_kind"].get(kind)
+            if base:
+                deltas = [f"{(values[c] - base[c]) / base[c] * 100:+.1f}%" if base.get(c) else "-" for c in columns]
+                print(f"{'  vs base':<10}" + "".join(f"{d:>17}" for d in deltas))
+    if baseline is not None:
+        base_rps = baseline["overall"]["rps"]
+        change = f"{(overall['rps'] - base_rps) / base_rps * 100:+.1f}%" if base_rps else "-"
+        print(f"rps vs baseline ({baseline['meta'].get('commit')}): {base_rps:.2f} -> {overall['rps']:.2f} ({change})")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=0.0, help="Open-loop arrival rate (req/s); 0 = closed-loop.")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--workload", default=WORKLOAD_PATH)
+    parser.add_argument("--kinds", nargs="+", default=["kb", "anomaly", "graph"])
+    parser.add_argument("--address-pool", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--distractors", type=int, default=0)
+    # Stub Ollama
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--first-token-ms", type=float, default=300.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--llm-parallel", type=int, default=4)
+    # Stub Anomaly/Graph API
+    parser.add_argument("--service-latency-ms", type=float, default=80.0)
+    parser.add_argument("--service-slow-rate", type=float, default=0.0)
+    parser.add_argument("--service-error-rate", type=float, default=0.0)
+    parser.add_argument("--backend-url", help="Use an already running backend instead of starting one.")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Write the JSON report to this path.")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against.")
+    args = parser.parse_args()
+
+    ollama_config = OllamaStubConfig(tokens_per_second=args.tokens_per_second, first_token_ms=args.first_token_ms,
+                                     answer_tokens=args.answer_tokens, num_parallel=args.llm_parallel)
+    services_config = StubConfig(latency_ms=args.service_latency_ms, slow_rate=args.service_slow_rate,
+                                 error_rate=args.service_error_rate, seed=args.seed)
+    ollama_port, services_port = _free_port(), _free_port()
+    servers = [await _start_server(create_ollama_app(ollama_config), ollama_port),
+               await _start_server(create_services_app(services_config), services_port)]
+
+    process = None
+    base_url = args.backend_url
+    if base_url is None:
+        backend_port = _free_port()
+        base_url = f"http://127.0.0.1:{backend_port}"
+        env = {**os.environ,
+               "OLLAMA_BASE_URL": f"http://127.0.0.1:{ollama_port}",
+               "ANOMALY_SERVICE_URL": f"http://127.0.0.1:{services_port}/analyze",
+               "GRAPH_SERVICE_URL": f"http://127.0.0.1:{services_port}/graph",
+               "WEB_SEARCH_BACKEND": "http",
+               "WEB_SEARCH_URL": f"http://127.0.0.1:{services_port}/search"}
+        process = subprocess.Popen([sys.executable, "-m", "scripts.e2e_backend", "--port", str(backend_port),
+                                    "--distractors", str(args.distractors), "--seed", str(args.seed)], env=env)
+    else:
+        print(f"Using running backend at {base_url}; point its OLLAMA_BASE_URL to http://127.0.0.1:{ollama_port} "
+              f"and ANOMALY_SERVICE_URL to http://127.0.0.1:{services_port}/analyze to use the stubs.")
+
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            await _wait_ready(client, base_url, process, args.startup_timeout)
+        workload = load_workload(args.workload, args.kinds, args.requests, args.address_pool, args.seed)
+        if args.warmup:
+            await drive(base_url, workload[:args.warmup], min(args.concurrency, args.warmup), 0.0)
+        results, elapsed = await drive(base_url, workload, args.concurrency, args.rate)
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            server_stats = (await client.get(f"{base_url}/api/v1/stats")).json()
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for server, task in servers:
+            server.should_exit = True
+            await task
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        **summarize(results, elapsed),
+        "server_stats": server_stats,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print_report(report, baseline)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+# scripts/eval_adaptive_rerank.py
+"""
+Đánh giá re-rank thích ứng (app/reranking.py) trên tập truy vấn held-out (scripts/data/kb_eval_queries.jsonl).
+
+Tham chiếu: re-rank đầy đủ mọi ứng viên bằng cross-encoder. Với mỗi cấu hình ngưỡng (--gaps x --windows):
+  - tỉ lệ bỏ qua / thu nhỏ re-rank và số cặp cross-encoder thực sự phải chấm;
+  - tác động chất lượng ước tính: recall@k theo nhãn, độ trùng top-k và top-1 so với re-rank đầy đủ;
+  - thời gian re-rank trung bình mỗi truy vấn.
+Cuối cùng đo hiệu quả cache điểm khi các câu hỏi được hỏi lại.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.eval_adaptive_rerank --distractors 2000 --gaps 0.05 0.1 0.15 0.2 --windows 0.1 0.2
+"""
+import argparse
+import asyncio
+import time
+
+from qdrant_client import AsyncQdrantClient
+
+from app.agent_service import AgentService, FINAL_CONTEXT_COUNT
+from app.reranking import AdaptiveReranker
+from scripts.benchmark_hybrid_retrieval import (QUERIES_PATH, is_relevant, load_corpus, load_queries,
+                                                seed_collection)
+
+
+async def _run(service: AgentService, queries: list[dict], candidates: dict[str, list]) -> dict:
+    final, elapsed = {}, 0.0
+    for query in queries:
+        start = time.perf_counter()
+        docs = await service._rerank_documents(query["query"], candidates[query["query"]])
+        elapsed += time.perf_counter() - start
+        final[query["query"]] = docs[:FINAL_CONTEXT_COUNT]
+    return {"final": final, "rerank_ms": elapsed / len(queries) * 1000, "stats": service.reranker.stats()}
+
+
+def _quality(run: dict, reference: dict, queries: list[dict]) -> dict:
+    recall = overlap = top1 = 0.0
+    for query in queries:
+        docs, ref = run["final"][query["query"]], reference["final"][query["query"]]
+        recall += any(is_relevant(d, query) for d in docs)
+        overlap += len(set(docs) & set(ref)) / max(len(ref), 1)
+        top1 += bool(docs and ref and docs[0] == ref[0])
+    n = len(queries)
+    return {f"recall@{FINAL_CONTEXT_COUNT}": recall / n, f"overlap@{FINAL_CONTEXT_COUNT}": overlap / n, "top1_agree": top1 / n}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--distractors", type=int, default=2000)
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--gaps", type=float, nargs="+", default=[0.05, 0.1, 0.15, 0.2])
+    parser.add_argument("--windows", type=float, nargs="+", default=[0.1, 0.2])
+    parser.add_argument("--min-score", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    client = AsyncQdrantClient(location=":memory:")
+    service = AgentService(qdrant_client=client)
+    service.bm25_index = None  # Chính sách dựa trên điểm dense.
+    await seed_collection(client, service.embedding_model, load_corpus(args.distractors, args.seed))
+    queries = load_queries(args.queries)
+    candidates = {}
+    for query in queries:
+        vector = (await service.embedding_batcher.submit(query["query"])).tolist()
+        candidates[query["query"]] = await service._retrieve_candidates(query["query"], vector)
+
+    service.reranker = AdaptiveReranker(FINAL_CONTEXT_COUNT, enabled=False, cache_max_entries=0)
+    reference = await _run(service, queries, candidates)
+    rows = [("full", "-", "-", reference, _quality(reference, reference, queries))]
+    for gap in args.gaps:
+        for window in args.windows:
+            service.reranker = AdaptiveReranker(FINAL_CONTEXT_COUNT, enabled=True, skip_gap=gap, skip_min_score=args.min_score,
+                                                shrink_window=window, cache_max_entries=0)
+            run = await _run(service, queries, candidates)
+            rows.append(("adaptive", gap, window, run, _quality(run, reference, queries)))
+
+    baseline_pairs = reference["stats"]["pairs_scored"]
+    print(f"\nqueries={len(queries)} candidates/query={len(next(iter(candidates.values())))} final k={FINAL_CONTEXT_COUNT}")
+    print(f"{'policy':<9}{'gap':>6}{'window':>8}{'skip%':>8}{'shrink%':>9}{'pairs%':>8}{'rerank ms':>11}"
+          f"{'recall':>8}{'overlap':>9}{'top1':>7}")
+    for policy, gap, window, run, quality in rows:
+        stats = run["stats"]
+        pairs = stats["pairs_scored"] / baseline_pairs * 100 if baseline_pairs else 0.0
+        print(f"{policy:<9}{gap:>6}{window:>8}{stats['skip_rate'] * 100:>8.1f}{stats['shrink_rate'] * 100:>9.1f}"
+              f"{pairs:>8.1f}{run['rerank_ms']:>11.2f}" + "".join(f"{v:>{w}.3f}" for v, w in zip(quality.values(), (8, 9, 7))))
+
+    # Hiệu quả cache điểm cross-encoder khi câu hỏi lặp lại.
+    service.reranker = AdaptiveReranker(FINAL_CONTEXT_COUNT, enabled=False)
+    first = await _run(service, queries, candidates)
+    second = await _run(service, queries, candidates)
+    print(f"\nscore cache: first pass {first['rerank_ms']:.2f} ms/query, repeated pass {second['rerank_ms']:.2f} ms/query, "
+          f"cached pairs={second['stats']['pairs_cached']}")
+    service.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+# scripts/export_models.py
+"""
+Export (một lần) mô hình embedding và cross-encoder sang ONNX / ONNX int8 vào MODEL_EXPORT_DIR,
+rồi kiểm tra "parity" với PyTorch:
+  - embedding: cosine giữa vector của backend và vector PyTorch, và thứ hạng tài liệu theo cosine;
+  - cross-encoder: thứ hạng các tài liệu cho cùng một câu hỏi (top-1, overlap@3, Spearman).
+
+Trả về mã thoát khác 0 nếu một backend không đạt ngưỡng, để có thể dùng trong CI / trước khi triển khai.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.export_models --backends onnx onnx-int8
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from app.agent_service import CROSS_ENCODER_MODEL_NAME, EMBEDDING_MODEL_NAME
+from app.model_backends import load_cross_encoder, load_embedding_model
+from scripts.benchmark_hybrid_retrieval import QUERIES_PATH, load_corpus, load_queries
+
+TOP_K = 3
+
+
+def _ranks(scores: np.ndarray) -> np.ndarray:
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[np.argsort(-scores, kind="stable")] = np.arange(len(scores))
+    return ranks
+
+
+def _compare_rankings(reference: list[np.ndarray], candidate: list[np.ndarray]) -> dict:
+    top1, overlap, spearman = [], [], []
+    for ref, cand in zip(reference, candidate):
+        ref_order, cand_order = np.argsort(-ref, kind="stable"), np.argsort(-cand, kind="stable")
+        top1.append(ref_order[0] == cand_order[0])
+        overlap.append(len(set(ref_order[:TOP_K]) & set(cand_order[:TOP_K])) / TOP_K)
+        spearman.append(np.corrcoef(_ranks(ref), _ranks(cand))[0, 1])
+    return {"top1_agreement": float(np.mean(top1)), f"overlap@{TOP_K}": float(np.mean(overlap)),
+            "spearman_mean": float(np.mean(spearman))}
+
+
+def _embedding_scores(model, queries: list[str], docs: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    query_vectors = model.encode(queries, normalize_embeddings=True)
+    doc_vectors = model.encode(docs, normalize_embeddings=True, batch_size=64)
+    return query_vectors, doc_vectors
+
+
+def _cross_encoder_scores(model, queries: list[str], docs: list[str]) -> list[np.ndarray]:
+    return [np.asarray(model.predict([[q, d] for d in docs], batch_size=64)) for q in queries]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"], choices=["onnx", "onnx-int8"])
+    parser.add_argument("--distractors", type=int, default=200, help="Số tài liệu nhiễu thêm vào tập kiểm tra.")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Cosine tối thiểu giữa vector backend và PyTorch.")
+    parser.add_argument("--min-top1", type=float, default=0.9, help="Tỉ lệ tối thiểu truy vấn có cùng tài liệu top-1.")
+    parser.add_argument("--no-check", action="store_true", help="Chỉ export, bỏ qua kiểm tra parity.")
+    args = parser.parse_args()
+
+    # Export + nạp thử: các lần chạy server sau chỉ đọc từ cache.
+    models = {}
+    for backend in args.backends:
+        print(f"Preparing backend '{backend}'...")
+        models[backend] = (load_embedding_model(EMBEDDING_MODEL_NAME, backend=backend),
+                           load_cross_encoder(CROSS_ENCODER_MODEL_NAME, backend=backend))
+    if args.no_check:
+        return
+
+    queries = [q["query"] for q in load_queries(QUERIES_PATH)]
+    docs = [c["content"] for c in load_corpus(args.distractors, seed=7)]
+    print(f"Parity check on {len(queries)} queries x {len(docs)} documents")
+
+    ref_q, ref_d = _embedding_scores(load_embedding_model(EMBEDDING_MODEL_NAME, backend="torch"), queries, docs)
+    ref_ce = _cross_encoder_scores(load_cross_encoder(CROSS_ENCODER_MODEL_NAME, backend="torch"), queries, docs)
+
+    failed = False
+    for backend, (embedding_model, cross_encoder) in models.items():
+        q, d = _embedding_scores(embedding_model, queries, docs)
+        cosines = np.concatenate([(q * ref_q).sum(axis=1), (d * ref_d).sum(axis=1)])
+        embedding_ranking = _compare_rankings(list(ref_q @ ref_d.T), list(q @ d.T))
+        ce_ranking = _compare_rankings(ref_ce, _cross_encoder_scores(cross_encoder, queries, docs))
+
+        ok = (cosines.min() >= args.min_cosine
+              and embedding_ranking["top1_agreement"] >= args.min_top1
+              and ce_ranking["top1_agreement"] >= args.min_top1)
+        failed |= not ok
+        print(f"\n[{backend}] {'PASS' if ok else 'FAIL'}")
+        print(f"  embedding cosine vs torch: min={cosines.min():.4f} mean={cosines.mean():.4f}")
+        print("  embedding ranking:     " + ", ".join(f"{k}={v:.3f}" for k, v in embedding_ranking.items()))
+        print("  cross-encoder ranking: " + ", ".join(f"{k}={v:.3f}" for k, v in ce_ranking.items()))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
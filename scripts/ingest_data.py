@@ -1,11 +1,24 @@
 # scripts/ingest_data.py
 import os
 import glob
+import json
+import time
 import uuid
+import queue
+import hashlib
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 from qdrant_client import QdrantClient, models
 from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from app.bm25 import BM25_INDEX_PATH, BM25Index
+from app.model_backends import BACKENDS, EMBEDDING_BACKEND, load_embedding_model
+from app.qdrant_profiles import (PROFILES, QDRANT_COLLECTION_PROFILE, CollectionProfile, apply_profile,
+                                 create_collection, get_profile, profile_matches)
+from app.semantic_cache import KB_VERSION_FILE
 
 # --- CẤU HÌNH ---
 KNOWLEDGE_BASE_DIR = "knowledge_base"
@@ -13,82 +26,495 @@ COLLECTION_NAME = "blockchain_knowledge"
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 # Kích thước vector của mô hình 'all-MiniLM-L6-v2' là 384. Đây là thông số BẮT BUỘC.
 VECTOR_SIZE = 384
+# Manifest ghi lại hash của từng file nguồn và ID các điểm đã upsert, phục vụ ingest tăng dần.
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", ".ingest_manifest.json")
+# Namespace cố định để sinh ID điểm xác định (uuid5) từ nguồn + hash nội dung chunk.
+POINT_ID_NAMESPACE = uuid.UUID("6f1c2a8e-3d4b-5e6f-8a9b-0c1d2e3f4a5b")
+
+# Pipeline dạng luồng: mọi hàng đợi đều có giới hạn nên bộ nhớ không phụ thuộc kích thước corpus.
+# Số dòng CSV đọc mỗi lần (pd.read_csv(chunksize=...)).
+INGEST_CSV_CHUNK_ROWS = int(os.getenv("INGEST_CSV_CHUNK_ROWS", "5000"))
+# File .md được đọc theo từng khối (ký tự) và cắt ở ranh giới đoạn văn.
+INGEST_MD_BLOCK_CHARS = int(os.getenv("INGEST_MD_BLOCK_CHARS", "1000000"))
+# Số tiến trình chia nhỏ văn bản (0 = chạy ngay trong tiến trình chính).
+INGEST_SPLIT_WORKERS = int(os.getenv("INGEST_SPLIT_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Số chunk mỗi batch embed / upsert.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+# Số batch tối đa chờ embed trong hàng đợi.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+INGEST_UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "4"))
+INGEST_UPSERT_RETRIES = int(os.getenv("INGEST_UPSERT_RETRIES", "3"))
+INGEST_RETRY_BACKOFF_SECONDS = float(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", "0.5"))
 
 # --- KHỞI TẠO CLIENT VÀ MODEL ---
-# Script này chạy trên host, kết nối qua localhost và cổng đã map
-client = QdrantClient(host="localhost", port=6333)
-# Tải mô hình embedding một lần và tái sử dụng
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-
-def setup_collection():
-    """Kiểm tra và tạo collection nếu chưa tồn tại."""
-    print(f"Setting up collection: '{COLLECTION_NAME}'")
-    try:
-        client.get_collection(collection_name=COLLECTION_NAME)
-        print("Collection already exists.")
-    except Exception:
-        print("Collection not found. Creating a new one...")
-        client.recreate_collection(
+# Script này chạy trên host, kết nối qua localhost và cổng đã map (6333 REST, 6334 gRPC).
+client = QdrantClient(host="localhost", port=6333,
+                      prefer_grpc=os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true")
+# Mô hình embedding chỉ được tải khi thực sự có chunk cần embed
+# (ingest lại một corpus không đổi gần như không tốn gì).
+_embedding_model: SentenceTransformer | None = None
+# Backend suy luận của mô hình embedding (xem app/model_backends.py); nên trùng với backend của server.
+_embedding_backend = EMBEDDING_BACKEND
+# Text splitter của từng tiến trình con (tạo một lần cho mỗi tiến trình).
+_text_splitter: RecursiveCharacterTextSplitter | None = None
+
+def get_embedding_model() -> SentenceTransformer:
+    global _embedding_model
+    if _embedding_model is None:
+        _embedding_model = load_embedding_model(EMBEDDING_MODEL_NAME, backend=_embedding_backend)
+    return _embedding_model
+
+def setup_collection(recreate: bool = False, profile: CollectionProfile | None = None) -> bool:
+    """
+    Kiểm tra và tạo collection nếu chưa tồn tại (hoặc tạo lại từ đầu khi `recreate`) theo profile
+    (app/qdrant_profiles.py). Collection đã tồn tại nhưng khác profile thì được cập nhật tại chỗ.
+    Trả về True nếu collection vừa được tạo (rỗng).
+    """
+    profile = profile or get_profile()
+    print(f"Setting up collection: '{COLLECTION_NAME}' (profile: {profile.name})")
+    if not recreate:
+        try:
+            client.get_collection(collection_name=COLLECTION_NAME)
+        except Exception:
+            print("Collection not found. Creating a new one...")
+        else:
+            if profile_matches(client, COLLECTION_NAME, profile):
+                print("Collection already exists.")
+            else:
+                print("Collection already exists. Applying profile (Qdrant re-indexes in the background)...")
+                apply_profile(client, COLLECTION_NAME, profile)
+            return False
+    else:
+        print("Full rebuild requested. Recreating collection...")
+    create_collection(client, COLLECTION_NAME, VECTOR_SIZE, profile)
+    print("Collection created successfully.")
+    return True
+
+def file_sha256(file_path: str) -> str:
+    """Hash nội dung file theo từng khối để không phải đọc cả file vào bộ nhớ."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_point_id(source: str, content: str) -> str:
+    """ID điểm xác định: cùng nguồn + cùng nội dung chunk luôn cho cùng một ID."""
+    content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{source}:{content_hash}"))
+
+def list_source_files(directory: str) -> list[str]:
+    return sorted(glob.glob(os.path.join(directory, "*.md")) + glob.glob(os.path.join(directory, "*.csv")))
+
+# ==============================================================================
+# Đọc dữ liệu dạng luồng
+# ==============================================================================
+def iter_markdown_sections(file_path: str, block_chars: int = INGEST_MD_BLOCK_CHARS):
+    """Đọc file .md theo từng khối, cắt ở ranh giới đoạn văn gần nhất (không đọc cả file vào bộ nhớ)."""
+    source = os.path.basename(file_path)
+    buffer = ""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        while block := f.read(block_chars):
+            buffer += block
+            cut = buffer.rfind("\n\n")
+            if cut <= 0:
+                # Không có ranh giới đoạn văn: gom thêm, nhưng không quá hai khối.
+                if len(buffer) < 2 * block_chars:
+                    continue
+                cut = len(buffer)
+            yield [{"content": buffer[:cut], "source": source}]
+            buffer = buffer[cut:]
+    if buffer.strip():
+        yield [{"content": buffer, "source": source}]
+
+def rows_to_text(df: pd.DataFrame) -> list[str]:
+    """Ghép "cột: giá trị" cho cả khung dữ liệu theo cột (vector hoá) thay vì lặp từng dòng bằng iterrows()."""
+    if df.empty:
+        return []
+    text = None
+    for column in df.columns:
+        part = f"{column}: " + df[column].astype(str)
+        text = part if text is None else text + ", " + part
+    return text.tolist()
+
+def iter_csv_documents(file_path: str, chunk_rows: int = INGEST_CSV_CHUNK_ROWS):
+    """Đọc file .csv theo từng khối dòng; mỗi dòng là một tài liệu."""
+    source = os.path.basename(file_path)
+    with pd.read_csv(file_path, chunksize=chunk_rows) as reader:
+        for df in reader:
+            yield [{"content": content, "source": source} for content in rows_to_text(df)]
+
+def iter_document_batches(file_path: str):
+    if file_path.endswith(".md"):
+        return iter_markdown_sections(file_path)
+    return iter_csv_documents(file_path)
+
+def chunk_documents(documents: list[dict]) -> list[dict]:
+    """Chia nhỏ tài liệu và gán ID xác định cho từng chunk (chạy trong tiến trình con)."""
+    global _text_splitter
+    if _text_splitter is None:
+        _text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    return [
+        {"id": chunk_point_id(doc["source"], split), "content": split, "source": doc["source"]}
+        for doc in documents
+        for split in _text_splitter.split_text(doc["content"])
+    ]
+
+# ==============================================================================
+# Đo throughput từng giai đoạn
+# ==============================================================================
+class StageMeter:
+    """Đếm số phần tử của một giai đoạn và khoảng thời gian giai đoạn đó hoạt động."""
+
+    def __init__(self, name: str, unit: str = "chunks"):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self._first_start: float | None = None
+        self._last_end: float | None = None
+        self._lock = threading.Lock()
+
+    def record(self, items: int, started_at: float):
+        now = time.perf_counter()
+        with self._lock:
+            self.items += items
+            if self._first_start is None or started_at < self._first_start:
+                self._first_start = started_at
+            self._last_end = now
+
+    def report(self) -> str:
+        span = (self._last_end - self._first_start) if self._first_start is not None else 0.0
+        rate = self.items / span if span > 0 else 0.0
+        return f"  {self.name:<7} {self.items:>9} {self.unit:<9} in {span:8.2f}s  ->  {rate:10.1f} {self.unit}/s"
+
+def iter_chunk_batches(file_paths: list[str], pool: ProcessPoolExecutor | None, meters: dict[str, StageMeter],
+                       max_pending: int):
+    """
+    Đọc tài liệu dạng luồng và chia nhỏ song song trong pool tiến trình.
+    Số batch đang xử lý bị giới hạn và kết quả được trả theo đúng thứ tự đọc.
+    Trả về các cặp (source, chunks).
+    """
+    pending: deque[tuple[str, float, Future]] = deque()
+
+    def collect():
+        source, submitted_at, future = pending.popleft()
+        chunks = future.result()
+        meters["split"].record(len(chunks), submitted_at)
+        return source, chunks
+
+    for file_path in file_paths:
+        source = os.path.basename(file_path)
+        batches = iter_document_batches(file_path)
+        while True:
+            started_at = time.perf_counter()
+            documents = next(batches, None)
+            if documents is None:
+                break
+            meters["read"].record(len(documents), started_at)
+            if pool is not None:
+                future = pool.submit(chunk_documents, documents)
+            else:
+                future = Future()
+                future.set_result(chunk_documents(documents))
+            pending.append((source, time.perf_counter(), future))
+            while len(pending) >= max_pending:
+                yield collect()
+    while pending:
+        yield collect()
+
+# ==============================================================================
+# Embed + upsert
+# ==============================================================================
+def upsert_points(points: list[models.PointStruct], retries: int = INGEST_UPSERT_RETRIES):
+    """Upsert một batch, thử lại với backoff luỹ tiến khi Qdrant lỗi tạm thời."""
+    for attempt in range(retries + 1):
+        try:
+            client.upsert(collection_name=COLLECTION_NAME, points=points, wait=True)
+            return
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = INGEST_RETRY_BACKOFF_SECONDS * 2 ** attempt
+            print(f"Upsert of {len(points)} points failed ({e}). Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+class EmbedUpsertPipeline:
+    """
+    Gom chunk thành batch và đưa vào một hàng đợi có giới hạn; một luồng embed lấy batch ra,
+    mã hoá, rồi chuyển sang pool upsert song song. Số batch đang upsert cũng bị giới hạn,
+    nên tiến trình đọc/chia nhỏ tự chậm lại (backpressure) khi embed hoặc Qdrant là nút thắt.
+    """
+
+    def __init__(self, meters: dict[str, StageMeter], batch_size: int = INGEST_BATCH_SIZE,
+                 queue_size: int = INGEST_QUEUE_SIZE, upsert_workers: int = INGEST_UPSERT_WORKERS):
+        self.meters = meters
+        self.batch_size = batch_size
+        self._buffer: list[dict] = []
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._upsert_pool = ThreadPoolExecutor(max_workers=upsert_workers, thread_name_prefix="qdrant-upsert")
+        self._upsert_slots = threading.BoundedSemaphore(2 * upsert_workers)
+        self._error: BaseException | None = None
+        self._abort = False
+        self._thread = threading.Thread(target=self._embed_loop, name="embedder", daemon=True)
+        self._thread.start()
+
+    def add(self, chunks: list[dict]):
+        self._buffer.extend(chunks)
+        while len(self._buffer) >= self.batch_size:
+            self._put(self._buffer[:self.batch_size])
+            self._buffer = self._buffer[self.batch_size:]
+
+    def _put(self, item):
+        while True:
+            if self._error is not None:
+                raise self._error
+            if not self._thread.is_alive():
+                return
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _embed_loop(self):
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is None or self._abort or self._error is not None:
+                    return
+                started_at = time.perf_counter()
+                vectors = get_embedding_model().encode(
+                    [chunk["content"] for chunk in batch], batch_size=min(len(batch), 64), show_progress_bar=False
+                )
+                self.meters["embed"].record(len(batch), started_at)
+                points = [
+                    models.PointStruct(
+                        id=chunk["id"],  # ID xác định: upsert lại cùng chunk sẽ ghi đè thay vì nhân bản
+                        vector=vector.tolist(), # Chuyển vector numpy thành list
+                        payload={"content": chunk["content"], "source": chunk["source"]}, # Payload chứa nội dung gốc và nguồn
+                    )
+                    for vector, chunk in zip(vectors, batch)
+                ]
+                self._upsert_slots.acquire()
+                future = self._upsert_pool.submit(self._upsert, points, time.perf_counter())
+                future.add_done_callback(self._on_upsert_done)
+        except BaseException as e:
+            self._error = e
+
+    def _upsert(self, points: list[models.PointStruct], submitted_at: float):
+        upsert_points(points)
+        self.meters["upsert"].record(len(points), submitted_at)
+
+    def _on_upsert_done(self, future: Future):
+        self._upsert_slots.release()
+        if future.exception() is not None and self._error is None:
+            self._error = future.exception()
+
+    def close(self, abort: bool = False):
+        """Đẩy nốt phần còn lại, chờ mọi upsert hoàn tất và báo lỗi nếu có."""
+        if abort:
+            self._abort = True
+        elif self._buffer:
+            self._put(self._buffer)
+            self._buffer = []
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        self._upsert_pool.shutdown(wait=True)
+        if self._error is not None and not abort:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(abort=exc_type is not None)
+
+# ==============================================================================
+# Manifest và đồng bộ
+# ==============================================================================
+def load_manifest() -> dict:
+    if not os.path.exists(INGEST_MANIFEST_PATH):
+        return {"collection": COLLECTION_NAME, "files": {}}
+    with open(INGEST_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("collection") != COLLECTION_NAME:
+        print("Manifest belongs to a different collection. Ignoring it.")
+        return {"collection": COLLECTION_NAME, "files": {}}
+    return manifest
+
+def save_manifest(manifest: dict):
+    tmp_path = INGEST_MANIFEST_PATH + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, INGEST_MANIFEST_PATH)
+
+def delete_points(point_ids: list[str], batch_size: int = INGEST_BATCH_SIZE):
+    """Xoá các điểm không còn tồn tại trong nguồn."""
+    print(f"Deleting {len(point_ids)} stale points...")
+    for i in range(0, len(point_ids), batch_size):
+        client.delete(
             collection_name=COLLECTION_NAME,
-            vectors_config=models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE),
+            points_selector=models.PointIdsList(points=point_ids[i:i + batch_size]),
+            wait=True,
         )
-        print("Collection created successfully.")
-
-def load_and_chunk_documents(directory: str) -> list[dict]:
-    """Tải và chia nhỏ tài liệu."""
-    documents = []
-    # Tải file .md và .csv
-    for file_path in glob.glob(os.path.join(directory, "*.md")):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            documents.append({"content": f.read(), "source": os.path.basename(file_path)})
-    for file_path in glob.glob(os.path.join(directory, "*.csv")):
-        df = pd.read_csv(file_path)
-        for _, row in df.iterrows():
-            documents.append({"content": ", ".join(f"{k}: {v}" for k, v in row.items()), "source": os.path.basename(file_path)})
-
-    # Chia nhỏ tài liệu
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    chunks = []
-    for doc in documents:
-        split_contents = text_splitter.split_text(doc["content"])
-        for split in split_contents:
-            chunks.append({"content": split, "source": doc["source"]})
-    print(f"Loaded and chunked {len(documents)} documents into {len(chunks)} chunks.")
-    return chunks
-
-def embed_and_store_chunks(chunks: list[dict]):
-    """Tạo embedding và lưu trữ các chunk vào Qdrant."""
-    print(f"Embedding {len(chunks)} chunks...")
-    
-    # Lấy nội dung của tất cả các chunk để tạo embedding hàng loạt (rất hiệu quả)
-    contents_to_embed = [chunk["content"] for chunk in chunks]
-    vectors = embedding_model.encode(contents_to_embed, show_progress_bar=True)
-    
-    print("Storing points in Qdrant...")
-    client.upsert(
-        collection_name=COLLECTION_NAME,
-        points=[
-            models.PointStruct(
-                id=str(uuid.uuid4()),  # Tạo ID ngẫu nhiên cho mỗi điểm
-                vector=vector.tolist(), # Chuyển vector numpy thành list
-                payload=chunk, # Payload chứa nội dung gốc và nguồn
+
+def write_kb_version():
+    """Ghi một phiên bản mới cho cơ sở tri thức để các cache phía backend tự vô hiệu hoá."""
+    version = uuid.uuid4().hex
+    os.makedirs(os.path.dirname(os.path.abspath(KB_VERSION_FILE)), exist_ok=True)
+    with open(KB_VERSION_FILE, "w", encoding="utf-8") as f:
+        f.write(version)
+    print(f"Knowledge base version updated: {version}")
+
+def build_bm25_index(path: str = BM25_INDEX_PATH, page_size: int = 1024):
+    """Xây lại chỉ mục BM25 (truy xuất hybrid) từ toàn bộ collection, để luôn khớp với Qdrant sau ingest tăng dần."""
+    def iter_points():
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=COLLECTION_NAME, limit=page_size, offset=offset,
+                with_payload=["content"], with_vectors=False,
             )
-            for vector, chunk in zip(vectors, chunks)
-        ],
-        wait=True, # Chờ cho đến khi quá trình upsert hoàn tất
-    )
-    print("Successfully stored chunks in Qdrant.")
+            for point in points:
+                yield str(point.id), (point.payload or {}).get("content") or ""
+            if offset is None:
+                return
+
+    started_at = time.perf_counter()
+    index = BM25Index.build(iter_points())
+    index.save(path)
+    print(f"BM25 index built: {len(index)} documents, {len(index.vocabulary)} terms "
+          f"in {time.perf_counter() - started_at:.2f}s -> {path}")
+
+def manifest_matches_collection(manifest: dict) -> bool:
+    """
+    Collection có còn chứa các điểm mà manifest ghi nhận không. Volume Qdrant bị xoá hay collection bị drop
+    trong khi manifest vẫn còn thì mọi file trông như "không đổi" và KB rỗng mà không báo lỗi.
+    """
+    recorded = sum(len(entry["point_ids"]) for entry in manifest["files"].values())
+    stored = client.count(collection_name=COLLECTION_NAME, exact=True).count
+    if stored < recorded or (manifest["files"] and stored == 0):
+        print(f"Collection holds {stored} points but the manifest records {recorded}. Ignoring the manifest.")
+        return False
+    return True
+
+def ingest(directory: str, full: bool = False, split_workers: int = INGEST_SPLIT_WORKERS,
+           batch_size: int = INGEST_BATCH_SIZE) -> bool:
+    """
+    Ingest tăng dần: chỉ embed/upsert các chunk mới của file mới hoặc đã thay đổi,
+    và xoá các chunk của file đã thay đổi hoặc đã bị xoá. Trả về True nếu có thay đổi.
+    Ngoài danh sách ID của manifest, bộ nhớ dùng không phụ thuộc kích thước corpus.
+    Manifest không khớp với collection thì mọi file được ingest lại như `full`.
+    """
+    manifest = {"collection": COLLECTION_NAME, "files": {}} if full else load_manifest()
+    # ID của manifest không còn tin được: ingest lại mọi file, nhưng vẫn xoá các điểm cũ không còn trong nguồn.
+    untracked_ids: set[str] = set()
+    if manifest["files"] and not manifest_matches_collection(manifest):
+        for entry in manifest["files"].values():
+            untracked_ids |= set(entry["point_ids"])
+        manifest["files"] = {}
+    previous_files: dict = manifest["files"]
+    current_files: dict = {}
+    changed_paths: list[str] = []
+
+    for file_path in list_source_files(directory):
+        source = os.path.basename(file_path)
+        file_hash = file_sha256(file_path)
+        previous = previous_files.get(source)
+        if previous is not None and previous["sha256"] == file_hash:
+            current_files[source] = previous
+            continue
+        print(f"{'Changed' if previous else 'New'} file: {source}")
+        current_files[source] = {"sha256": file_hash, "point_ids": []}
+        changed_paths.append(file_path)
+
+    removed = previous_files.keys() - current_files.keys()
+    for source in sorted(removed):
+        print(f"Removed file: {source}")
+    print(f"Files: {len(current_files) - len(changed_paths)} unchanged, {len(changed_paths)} new/changed, {len(removed)} removed.")
+
+    meters = {
+        "read": StageMeter("read", unit="docs"),
+        "split": StageMeter("split"),
+        "embed": StageMeter("embed"),
+        "upsert": StageMeter("upsert"),
+    }
+    new_ids: dict[str, set[str]] = {os.path.basename(p): set() for p in changed_paths}
+    started_at = time.perf_counter()
+    upserted = 0
+    if changed_paths:
+        pool = ProcessPoolExecutor(max_workers=split_workers) if split_workers > 0 else None
+        try:
+            with EmbedUpsertPipeline(meters, batch_size=batch_size) as pipeline:
+                for source, chunks in iter_chunk_batches(changed_paths, pool, meters, 2 * max(1, split_workers)):
+                    seen = new_ids[source]
+                    previous = previous_files.get(source)
+                    old_ids = set(previous["point_ids"]) if previous else ()
+                    fresh = []
+                    for chunk in chunks:
+                        # Các chunk trùng nội dung trong cùng một nguồn gộp lại thành một điểm.
+                        if chunk["id"] in seen:
+                            continue
+                        seen.add(chunk["id"])
+                        if chunk["id"] not in old_ids:
+                            fresh.append(chunk)
+                    upserted += len(fresh)
+                    pipeline.add(fresh)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+    ids_to_delete: set[str] = untracked_ids.difference(*new_ids.values())
+    for source in removed:
+        ids_to_delete |= set(previous_files[source]["point_ids"])
+    for source, ids in new_ids.items():
+        previous = previous_files.get(source)
+        if previous:
+            ids_to_delete |= set(previous["point_ids"]) - ids
+        current_files[source]["point_ids"] = sorted(ids)
+    if ids_to_delete:
+        delete_points(sorted(ids_to_delete), batch_size=batch_size)
+
+    print(f"Chunks: {upserted} upserted, {len(ids_to_delete)} deleted in {time.perf_counter() - started_at:.2f}s.")
+    if changed_paths:
+        print("Throughput per stage:")
+        for meter in meters.values():
+            print(meter.report())
+
+    manifest["files"] = current_files
+    save_manifest(manifest)
+    return bool(upserted or ids_to_delete)
 
 def main():
     """Hàm chính điều phối toàn bộ quá trình."""
+    parser = argparse.ArgumentParser(description="Ingest the knowledge base into Qdrant.")
+    parser.add_argument("--full", action="store_true", help="Xoá collection và ingest lại toàn bộ, bỏ qua manifest.")
+    parser.add_argument("--workers", type=int, default=INGEST_SPLIT_WORKERS, help="Số tiến trình chia nhỏ văn bản (0 = không dùng pool).")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Số chunk mỗi batch embed/upsert.")
+    parser.add_argument("--backend", choices=BACKENDS, default=EMBEDDING_BACKEND, help="Backend suy luận của mô hình embedding.")
+    parser.add_argument("--profile", choices=list(PROFILES), default=QDRANT_COLLECTION_PROFILE,
+                        help="Profile của collection (lượng tử hoá, on-disk, HNSW); backend phải dùng cùng profile.")
+    args = parser.parse_args()
+    global _embedding_backend
+    _embedding_backend = args.backend
+
     print("--- Starting Data Ingestion Pipeline for Qdrant ---")
-    setup_collection()
-    chunks = load_and_chunk_documents(KNOWLEDGE_BASE_DIR)
-    if not chunks:
-        print("No chunks to process. Exiting.")
-        return
-    embed_and_store_chunks(chunks)
+    created = setup_collection(recreate=args.full, profile=get_profile(args.profile))
+    # Collection vừa tạo thì rỗng: manifest (nếu còn) mô tả một collection cũ đã mất.
+    changed = ingest(KNOWLEDGE_BASE_DIR, full=args.full or created, split_workers=args.workers,
+                     batch_size=args.batch_size)
+    if changed or not os.path.exists(BM25_INDEX_PATH):
+        build_bm25_index()
+    if changed:
+        write_kb_version()
+    else:
+        print("Knowledge base is up to date. Nothing to do.")
     print("--- Data Ingestion Pipeline Finished ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
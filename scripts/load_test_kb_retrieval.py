@@ -0,0 +1,157 @@
+# scripts/load_test_kb_retrieval.py
+"""
+Load test: đo độ trễ giữa các token (inter-token latency) của các stream khác
+trong khi các truy vấn cơ sở tri thức (embed -> search -> rerank) đang chạy.
+
+So sánh ba kịch bản trên cùng một event loop:
+  - baseline: chỉ có các stream giả lập, không có truy vấn KB.
+  - blocking: truy vấn KB gọi encode/predict trực tiếp trên event loop (hành vi cũ).
+  - async:    truy vấn KB đi qua AgentService._get_context_from_kb (executor + AsyncQdrantClient).
+
+Không cần Ollama hay Qdrant server: Qdrant chạy ở chế độ in-memory của qdrant-client.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.load_test_kb_retrieval --streams 50 --kb-workers 4 --duration 10
+"""
+import argparse
+import asyncio
+import glob
+import os
+import statistics
+import time
+import uuid
+
+import pandas as pd
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from qdrant_client import AsyncQdrantClient, models
+
+from app.agent_service import AgentService, COLLECTION_NAME, RETRIEVAL_CANDIDATE_COUNT
+
+KNOWLEDGE_BASE_DIR = "knowledge_base"
+VECTOR_SIZE = 384
+TOKEN_INTERVAL_S = 0.02  # Tốc độ "phát token" giả lập của mỗi stream (50 token/s).
+SAMPLE_QUESTIONS = [
+    "tấn công Sybil là gì?",
+    "làm thế nào để phát hiện wash trading?",
+    "phishing attack hoạt động như thế nào?",
+    "blockchain là gì?",
+]
+
+
+def _load_chunks() -> list[dict]:
+    documents = []
+    for file_path in glob.glob(os.path.join(KNOWLEDGE_BASE_DIR, "*.md")):
+        with open(file_path, "r", encoding="utf-8") as f:
+            documents.append({"content": f.read(), "source": os.path.basename(file_path)})
+    for file_path in glob.glob(os.path.join(KNOWLEDGE_BASE_DIR, "*.csv")):
+        for _, row in pd.read_csv(file_path).iterrows():
+            documents.append({"content": ", ".join(f"{k}: {v}" for k, v in row.items()), "source": os.path.basename(file_path)})
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    return [{"content": split, "source": doc["source"]} for doc in documents for split in splitter.split_text(doc["content"])]
+
+
+async def _seed_collection(client: AsyncQdrantClient, service: AgentService):
+    chunks = _load_chunks()
+    # Nhân bản dữ liệu để mỗi truy vấn luôn có đủ ứng viên cho bước re-ranking.
+    while len(chunks) < RETRIEVAL_CANDIDATE_COUNT * 2:
+        chunks = chunks + chunks
+    vectors = service.embedding_model.encode([c["content"] for c in chunks])
+    await client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE),
+    )
+    await client.upsert(
+        collection_name=COLLECTION_NAME,
+        points=[
+            models.PointStruct(id=str(uuid.uuid4()), vector=v.tolist(), payload=c)
+            for v, c in zip(vectors, chunks)
+        ],
+    )
+
+
+async def _blocking_kb_query(service: AgentService, question: str):
+    """Tái hiện đường truy vấn cũ: mô hình chạy đồng bộ ngay trên event loop."""
+    query_vector = service.embedding_model.encode(question).tolist()
+    results = await service.qdrant_client.search(
+        collection_name=COLLECTION_NAME, query_vector=query_vector,
+        limit=RETRIEVAL_CANDIDATE_COUNT, with_payload=True,
+    )
+    service.cross_encoder.predict([[question, r.payload["content"]] for r in results])
+
+
+async def _token_stream(stop: asyncio.Event, gaps: list[float]):
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(TOKEN_INTERVAL_S)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+
+async def _kb_worker(stop: asyncio.Event, query_fn, latencies: list[float], worker_id: int):
+    i = worker_id
+    while not stop.is_set():
+        start = time.perf_counter()
+        await query_fn(SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)])
+        latencies.append(time.perf_counter() - start)
+        i += 1
+        # Qdrant in-memory không thực sự nhường event loop; nhường một lần giữa các truy vấn
+        # như khi gọi tới một Qdrant server thật.
+        await asyncio.sleep(0)
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _run_scenario(name: str, query_fn, args) -> dict:
+    stop = asyncio.Event()
+    gaps: list[float] = []
+    kb_latencies: list[float] = []
+    tasks = [asyncio.create_task(_token_stream(stop, gaps)) for _ in range(args.streams)]
+    if query_fn is not None:
+        tasks += [asyncio.create_task(_kb_worker(stop, query_fn, kb_latencies, i)) for i in range(args.kb_workers)]
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return {
+        "scenario": name,
+        "itl_p50_ms": _percentile(gaps, 50) * 1000,
+        "itl_p99_ms": _percentile(gaps, 99) * 1000,
+        "itl_max_ms": max(gaps, default=0.0) * 1000,
+        "kb_queries": len(kb_latencies),
+        "kb_latency_mean_ms": (statistics.mean(kb_latencies) * 1000) if kb_latencies else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50, help="Số stream token giả lập chạy song song.")
+    parser.add_argument("--kb-workers", type=int, default=4, help="Số truy vấn KB chạy đồng thời.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Thời gian chạy mỗi kịch bản (giây).")
+    args = parser.parse_args()
+
+    client = AsyncQdrantClient(location=":memory:")
+    service = AgentService(qdrant_client=client)
+    await _seed_collection(client, service)
+
+    scenarios = [
+        ("baseline", None),
+        ("blocking", lambda q: _blocking_kb_query(service, q)),
+        ("async", service._get_context_from_kb),
+    ]
+    results = [await _run_scenario(name, fn, args) for name, fn in scenarios]
+    service.shutdown()
+
+    print(f"\nstreams={args.streams} kb_workers={args.kb_workers} token_interval={TOKEN_INTERVAL_S * 1000:.0f}ms")
+    print(f"{'scenario':<10} {'ITL p50 (ms)':>13} {'ITL p99 (ms)':>13} {'ITL max (ms)':>13} {'KB queries':>11} {'KB mean (ms)':>13}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['itl_p50_ms']:>13.1f} {r['itl_p99_ms']:>13.1f} {r['itl_max_ms']:>13.1f} "
+              f"{r['kb_queries']:>11} {r['kb_latency_mean_ms']:>13.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+# scripts/load_test_remote_tools.py
+"""
+Kiểm thử connection pool, circuit breaker và hedged requests của các công cụ
+anomaly_detector / graph_handler trên một stub cục bộ (scripts/stub_services.py).
+
+Các kịch bản:
+  - tail-latency: 5% yêu cầu chậm; so sánh p50/p95/p99 khi tắt và bật hedging.
+  - outage:       backend trả 500 cho mọi yêu cầu; đo thời gian fail-fast khi circuit mở.
+
+Cách chạy (từ thư mục gốc của repo):
+    python -m scripts.load_test_remote_tools --requests 400 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import time
+
+import uvicorn
+
+from app import http_clients, tools
+from scripts.stub_services import StubConfig, create_app
+
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+async def _drive(n_requests: int, concurrency: int) -> tuple[list[float], list[str]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    outputs: list[str] = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            # Mỗi yêu cầu dùng một địa chỉ mới để không bị cache kết quả của tools che mất.
+            outputs.append(await tools.check_address_anomaly("0x" + os.urandom(20).hex()))
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return latencies, outputs
+
+
+def _report(name: str, latencies: list[float], outputs: list[str]):
+    errors = sum(1 for o in outputs if o.startswith("Lỗi"))
+    stats = http_clients.get_stats().get("anomaly", {})
+    print(f"{name:<22} p50={_percentile(latencies, 50) * 1000:8.1f}ms p95={_percentile(latencies, 95) * 1000:8.1f}ms "
+          f"p99={_percentile(latencies, 99) * 1000:8.1f}ms errors={errors:<4} hedged={stats.get('hedged', 0):<4} "
+          f"hedge_wins={stats.get('hedge_wins', 0):<4} rejected={stats.get('rejected', 0):<4} circuit={stats.get('circuit_state')}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency-ms", type=float, default=1500.0)
+    args = parser.parse_args()
+
+    config = StubConfig(latency_ms=args.latency_ms, slow_rate=args.slow_rate, slow_latency_ms=args.slow_latency_ms)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    tools.ANOMALY_SERVICE_URL = f"http://127.0.0.1:{port}/analyze"
+
+    try:
+        for hedging in (False, True):
+            http_clients.reset_endpoints()
+            http_clients.get_endpoint("anomaly").hedging_enabled = hedging
+            latencies, outputs = await _drive(args.requests, args.concurrency)
+            _report(f"tail-latency hedge={'on' if hedging else 'off'}", latencies, outputs)
+
+        http_clients.reset_endpoints()
+        config.error_rate, config.slow_rate = 1.0, 0.0
+        latencies, outputs = await _drive(args.requests // 4, args.concurrency)
+        _report("outage (500s)", latencies, outputs)
+    finally:
+        await http_clients.close_http_clients()
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+# scripts/stub_ollama.py
+"""
+Stub cục bộ tương thích Ollama (/api/chat, /api/generate, /api/tags) dùng cho benchmark offline.
+
+Trả lời dạng NDJSON streaming như Ollama thật, với tốc độ sinh token và độ trễ token đầu (prompt eval)
+cấu hình được. Nội dung trả lời xác định theo prompt nên các lần chạy benchmark có thể so sánh với nhau.
+Prompt của router (kết thúc bằng "JSON Output:") nhận về một chuỗi JSON chọn công cụ theo luật đơn giản.
+
+Cách chạy độc lập (từ thư mục gốc của repo):
+    python -m scripts.stub_ollama --port 11500 --tokens-per-second 40 --first-token-ms 300 --answer-tokens 120
+
+Sau đó trỏ backend vào stub:
+    OLLAMA_BASE_URL=http://localhost:11500 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+ADDRESS_PATTERN = re.compile(r"0x[a-fA-F0-9]{40}")
+_WORDS = ("blockchain", "giao", "dịch", "địa", "chỉ", "hợp", "đồng", "thông", "minh", "rủi", "ro", "mạng",
+          "lưới", "phí", "gas", "ví", "token", "xác", "thực", "khối", "nút", "đồng", "thuận", "bảo", "mật")
+
+
+@dataclass
+class OllamaStubConfig:
+    # Tốc độ sinh token của câu trả lời (token/giây); 0 = không giới hạn.
+    tokens_per_second: float = 40.0
+    # Độ trễ trước token đầu tiên (mô phỏng prompt eval), cộng thêm theo độ dài prompt.
+    first_token_ms: float = 300.0
+    prompt_ms_per_kchar: float = 20.0
+    answer_tokens: int = 120
+    # Số "luồng" sinh song song tối đa, như OLLAMA_NUM_PARALLEL; yêu cầu vượt quá phải xếp hàng.
+    num_parallel: int = 4
+
+
+def _route(prompt: str) -> dict:
+    """Quyết định công cụ cho prompt của router, chỉ dựa trên phần câu hỏi cuối prompt."""
+    question = prompt.rsplit("Câu hỏi của người dùng:", 1)[-1]
+    address = ADDRESS_PATTERN.search(question)
+    lowered = question.lower()
+    if address and "giao dịch với" in lowered:
+        return {"tool": "graph_handler", "query": address.group(0)}
+    if address:
+        return {"tool": "anomaly_detector", "query": address.group(0)}
+    if any(word in lowered for word in ("tin tức", "mới nhất", "hôm nay", "giá")):
+        return {"tool": "web_searcher", "query": question.strip()}
+    return {"tool": "knowledge_base_retriever", "query": question.strip()}
+
+
+def _answer_tokens(prompt: str, count: int) -> list[str]:
+    rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+    return [rng.choice(_WORDS) + " " for _ in range(count)]
+
+
+def create_app(config: OllamaStubConfig) -> FastAPI:
+    app = FastAPI(title="Ollama stub")
+    app.state.config = config
+    app.state.requests = 0
+    slots = asyncio.Semaphore(config.num_parallel)
+
+    async def _stream(model: str, prompt: str, chat: bool):
+        cfg: OllamaStubConfig = app.state.config
+        is_router = prompt.rstrip().endswith("JSON Output:")
+        tokens = [json.dumps(_route(prompt), ensure_ascii=False)] if is_router else _answer_tokens(prompt, cfg.answer_tokens)
+        async with slots:
+            start = time.perf_counter()
+            await asyncio.sleep((cfg.first_token_ms + cfg.prompt_ms_per_kchar * len(prompt) / 1000) / 1000)
+            for i, token in enumerate(tokens):
+                if cfg.tokens_per_second > 0 and i:
+                    await asyncio.sleep(1 / cfg.tokens_per_second)
+                body = {"message": {"role": "assistant", "content": token}} if chat else {"response": token}
+                yield json.dumps({"model": model, "created_at": datetime.now(timezone.utc).isoformat(),
+                                  **body, "done": False}, ensure_ascii=False) + "\n"
+            body = {"message": {"role": "assistant", "content": ""}} if chat else {"response": ""}
+            yield json.dumps({"model": model, "created_at": datetime.now(timezone.utc).isoformat(), **body,
+                              "done": True, "eval_count": len(tokens),
+                              "total_duration": int((time.perf_counter() - start) * 1e9)}) + "\n"
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        app.state.requests += 1
+        payload = await request.json()
+        prompt = "\n".join(m.get("content", "") for m in payload.get("messages", []) if isinstance(m.get("content"), str))
+        return StreamingResponse(_stream(payload.get("model", ""), prompt, chat=True), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        app.state.requests += 1
+        payload = await request.json()
+        return StreamingResponse(_stream(payload.get("model", ""), payload.get("prompt", ""), chat=False),
+                                 media_type="application/x-ndjson")
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": []}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--first-token-ms", type=float, default=300.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--num-parallel", type=int, default=4)
+    args = parser.parse_args()
+    config = OllamaStubConfig(tokens_per_second=args.tokens_per_second, first_token_ms=args.first_token_ms,
+                              answer_tokens=args.answer_tokens, num_parallel=args.num_parallel)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
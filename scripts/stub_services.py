@@ -0,0 +1,128 @@
+# scripts/stub_services.py
+"""
+Stub cục bộ cho Anomaly Detection API (/analyze), Graph Handling API (/graph) và một search engine
+giả (/search, dùng với WEB_SEARCH_BACKEND=http), có khả năng "tiêm" độ trễ và lỗi để kiểm thử connection pool, circuit breaker và hedging.
+
+Cách chạy độc lập (từ thư mục gốc của repo):
+    python -m scripts.stub_services --port 9100 --latency-ms 80 --slow-rate 0.05 --slow-latency-ms 2000 --error-rate 0.02
+
+Sau đó trỏ backend vào stub:
+    ANOMALY_SERVICE_URL=http://localhost:9100/analyze GRAPH_SERVICE_URL=http://localhost:9100/graph \
+    WEB_SEARCH_BACKEND=http WEB_SEARCH_URL=http://localhost:9100/search uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    # Tỉ lệ yêu cầu rơi vào "đuôi chậm" (mô phỏng GC, cold start, ...).
+    slow_rate: float = 0.0
+    slow_latency_ms: float = 2000.0
+    # Tỉ lệ yêu cầu trả về HTTP 500.
+    error_rate: float = 0.0
+    seed: int = 42
+
+
+class AnalyzeRequest(BaseModel):
+    address: str
+
+
+def _score(address: str) -> float:
+    """Điểm "xác suất lừa đảo" giả lập, xác định theo địa chỉ."""
+    digest = hashlib.sha256(address.lower().encode()).digest()
+    return int.from_bytes(digest[:4], "big") / 2**32
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="FraudGraphML stub")
+    rng = random.Random(config.seed)
+    app.state.config = config
+    app.state.requests = 0
+
+    async def _inject() -> JSONResponse | None:
+        app.state.requests += 1
+        cfg: StubConfig = app.state.config
+        delay = cfg.latency_ms + rng.uniform(-cfg.jitter_ms, cfg.jitter_ms)
+        if rng.random() < cfg.slow_rate:
+            delay = cfg.slow_latency_ms
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        if rng.random() < cfg.error_rate:
+            return JSONResponse(status_code=500, content={"error": "injected failure"})
+        return None
+
+    @app.post("/analyze")
+    async def analyze(request: AnalyzeRequest):
+        if (error := await _inject()) is not None:
+            return error
+        probability = _score(request.address)
+        return {"prediction": "Fraud" if probability >= 0.5 else "Normal", "probability_fraud": probability}
+
+    @app.get("/graph")
+    async def graph(address: str = Query(...)):
+        if (error := await _inject()) is not None:
+            return error
+        seed = int(_score(address) * 1_000_000)
+        local = random.Random(seed)
+        interactions = [
+            {"type": local.choice(["send", "receive"]),
+             "counterparty": "0x" + hashlib.sha1(f"{address}{i}".encode()).hexdigest(),
+             "count": local.randint(1, 50)}
+            for i in range(3)
+        ]
+        return {
+            "total_transactions": local.randint(10, 5000),
+            "top_interactions": interactions,
+            "behavior_summary": "Stub: hành vi giao dịch được sinh ngẫu nhiên.",
+        }
+
+    @app.get("/search")
+    async def search(q: str = Query(...), max_results: int = Query(5)):
+        if (error := await _inject()) is not None:
+            return error
+        # Một phần URL chỉ phụ thuộc vào từ khoá đầu tiên, nên các biến thể của cùng một câu hỏi
+        # trả về kết quả trùng nhau (kiểm tra việc loại trùng theo URL).
+        words = q.lower().split() or ["empty"]
+        results = []
+        for i in range(max_results):
+            topic = words[0] if i % 2 == 0 else "-".join(words)
+            results.append({
+                "title": f"Stub result {i} for {q}",
+                "href": f"https://news.example.com/{topic}/{i // 2}",
+                "body": f"Stub: nội dung giả lập số {i} cho truy vấn '{q}'.",
+            })
+        return {"results": results}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency-ms", type=float, default=2000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    config = StubConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, slow_rate=args.slow_rate,
+        slow_latency_ms=args.slow_latency_ms, error_rate=args.error_rate, seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()